@@ -1,12 +1,65 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import numpy as np
 from datetime import datetime, timedelta
-import io
 import json
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
 from typing import Dict, List
 
+from finanzas.ingesta import (
+    COLUMNAS_REQUERIDAS,
+    VERSION_PARSER,
+    a_categorica,
+    concatenar_transacciones,
+    filtrar_transacciones_nuevas,
+    reporte_memoria,
+)
+from finanzas.lote import procesar_lote
+from finanzas.almacen import (
+    almacen_activo,
+    anexar_almacen,
+    borrar_almacen,
+    cargar_almacen,
+    directorio_usuario,
+    escribir_almacen,
+)
+from finanzas.agregados import (
+    actualizar_agregados,
+    calcular_agregados,
+    calcular_columnas_derivadas,
+    construir_indice_temporal,
+    filas_filtradas,
+)
+from finanzas.categorizacion import RUTA_REGLAS, categorizador_por_defecto, unificar_categorias
+from finanzas.deteccion import detectar_anomalias, detectar_recurrentes
+from finanzas.exportacion import FORMATOS_EXPORTACION, crear_plantilla_excel
+from finanzas.insights import calcular_insights
+from finanzas.metas import agregar_meta, calcular_progreso_metas, quitar_meta, tabla_metas
+from finanzas.series import (
+    construir_series,
+    gasto_movil,
+    pronostico_gasto_mes,
+    pronostico_metas,
+    referencia,
+    variaciones_por_categoria,
+)
+from finanzas.instrumentacion import (
+    MODO_ENTORNO,
+    finalizar_captura,
+    iniciar_captura,
+    medido,
+    tramo,
+)
+from finanzas.sesiones import GestorMemoria, memoria_objeto
+
+# Con Copy-on-Write las selecciones y los assign comparten memoria con el
+# DataFrame original en lugar de copiarlo (en pandas 3 ya es el comportamiento)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
 # Configuración de la página
 st.set_page_config(
     page_title="📊 Mi Dashboard Financiero",
@@ -16,395 +69,670 @@ st.set_page_config(
 
 # Inicializar session state
 if 'metas' not in st.session_state:
-    st.session_state.metas = []
-if 'df_transacciones' not in st.session_state:
-    st.session_state.df_transacciones = pd.DataFrame()
+    st.session_state.metas = tabla_metas()
 if 'archivo_cargado' not in st.session_state:
     st.session_state.archivo_cargado = False
+if 'version_datos' not in st.session_state:
+    st.session_state.version_datos = 0
+
+@st.cache_resource
+def obtener_gestor_memoria():
+    """Gestor compartido por todas las sesiones del proceso"""
+    return GestorMemoria.desde_entorno()
+
+# Transacciones y cachés de la sesión (con contabilidad de memoria)
+if 'datos_sesion' not in st.session_state:
+    st.session_state.datos_sesion = obtener_gestor_memoria().nueva_sesion()
+
+def obtener_transacciones():
+    """Transacciones de la sesión (se recargan solas si se derramaron a disco)"""
+    return st.session_state.datos_sesion.transacciones()
 
-def parsear_fecha_flexible(fecha_valor):
+# Las versiones recientes de Streamlit aceptan un callable en st.download_button
+# y solo lo ejecutan cuando el usuario hace clic
+try:
+    from streamlit.elements.widgets.button import DownloadButtonDataType
+    DESCARGA_DIFERIDA = 'Callable' in str(DownloadButtonDataType)
+except ImportError:
+    DESCARGA_DIFERIDA = False
+
+@st.cache_resource
+def obtener_plantilla_excel():
+    """Plantilla de Excel (es constante: se genera una sola vez por proceso)"""
+    return crear_plantilla_excel()
+
+def _firma_metas(metas):
+    return metas.to_json(date_format='iso')
+
+def _clave_exportacion():
+    return (st.session_state.version_datos, _firma_metas(st.session_state.metas))
+
+def exportacion_preparada(formato):
+    """Bytes ya generados para el estado actual de los datos, o None"""
+    preparada = (st.session_state.datos_sesion.cache('exportaciones') or {}).get(formato)
+    if preparada is None or preparada[0] != _clave_exportacion():
+        return None
+    return preparada[1]
+
+@medido()
+def obtener_exportacion(formato):
+    """Bytes del archivo exportado, regenerados solo si cambian las transacciones o las metas"""
+    datos = exportacion_preparada(formato)
+    if datos is None:
+        datos = FORMATOS_EXPORTACION[formato][0](obtener_transacciones(), st.session_state.metas)
+        exportaciones = st.session_state.datos_sesion.cache('exportaciones') or {}
+        exportaciones[formato] = (_clave_exportacion(), datos)
+        st.session_state.datos_sesion.guardar_cache('exportaciones', exportaciones)
+    return datos
+
+TAMANO_CACHE_CARGAS = 8
+MAX_BYTES_CACHE_CARGAS = 256 * 1024 ** 2
+
+class CacheCargas:
     """
-    Función para parsear fechas de manera más flexible
-    Maneja múltiples formatos y valores problemáticos
+    Caché LRU de archivos ya procesados, indexada por el hash de su contenido
+    Limitada en entradas y en bytes; el GestorMemoria la cuenta en el consumo
+    del proceso y la vacía antes de derramar sesiones
     """
-    if pd.isna(fecha_valor):
-        return None
     
-    # Si ya es datetime, convertir a date
-    if isinstance(fecha_valor, pd.Timestamp) or isinstance(fecha_valor, datetime):
-        return fecha_valor
+    def __init__(self, capacidad, max_bytes=None):
+        self.capacidad = capacidad
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._bytes = {}
+        self._lock = threading.Lock()
     
-    # Si es un número (timestamp de Excel), convertir
-    if isinstance(fecha_valor, (int, float)):
-        try:
-            # Excel cuenta desde 1900-01-01, pero Python desde 1970-01-01
-            # Verificar si es un timestamp de Excel válido
-            if fecha_valor > 25569:  # Fecha mínima aproximada de Excel (1970)
-                return pd.to_datetime(fecha_valor, origin='1899-12-30', unit='D')
-            else:
+    @property
+    def bytes(self):
+        return sum(self._bytes.values())
+    
+    def obtener(self, clave):
+        with self._lock:
+            if clave not in self._entradas:
                 return None
-        except:
-            return None
+            self._entradas.move_to_end(clave)
+            return self._entradas[clave]
+    
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._entradas[clave] = valor
+            self._bytes[clave] = memoria_objeto(valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._descartar_mas_antigua()
+        if self.max_bytes is not None:
+            self.liberar(self.max_bytes)
+    
+    def _descartar_mas_antigua(self):
+        clave, _ = self._entradas.popitem(last=False)
+        return self._bytes.pop(clave)
+    
+    def liberar(self, objetivo_bytes):
+        """Descartar las entradas menos usadas hasta bajar de objetivo_bytes; devuelve los bytes liberados"""
+        liberados = 0
+        with self._lock:
+            while self._entradas and self.bytes > objetivo_bytes:
+                liberados += self._descartar_mas_antigua()
+        return liberados
+
+@st.cache_resource
+def obtener_cache_cargas():
+    """Caché compartida entre reruns y sesiones (el contenido define la clave)"""
+    cache = CacheCargas(TAMANO_CACHE_CARGAS, MAX_BYTES_CACHE_CARGAS)
+    obtener_gestor_memoria().registrar_compartida(cache)
+    return cache
+
+def mostrar_resumen_carga(resultado):
+    """Mostrar advertencias y resumen de los archivos procesados"""
+    for error in resultado['errores']:
+        st.error(f"Error al procesar el archivo {error}")
+    
+    if resultado['omitidas']:
+        st.warning(f"⚠️ Se omitieron {resultado['omitidas']} filas con fechas inválidas")
+    
+    if resultado['formato_anterior']:
+        st.info("📋 Detectado archivo en formato anterior. Todas las transacciones se tratarán como históricas.")
+    
+    # Mostrar advertencias sobre fechas problemáticas
+    fechas_problematicas = resultado['fechas_problematicas']
+    if fechas_problematicas:
+        st.error("🚨 **Fechas problemáticas encontradas:**")
+        for fecha_prob in fechas_problematicas[:5]:  # Mostrar solo las primeras 5
+            st.write(f"• {fecha_prob}")
+        if len(fechas_problematicas) > 5:
+            st.write(f"• ... y {len(fechas_problematicas) - 5} más")
+        st.info("💡 **Solución:** Asegúrate de usar formato DD/MM/YYYY (ejemplo: 15/01/2024)")
+    
+    # Montos que no se pudieron interpretar como número (solo CSV y extractos)
+    montos_problematicos = resultado['montos_problematicos']
+    if montos_problematicos:
+        st.warning(f"⚠️ Se omitieron {resultado['montos_omitidos']} filas con montos inválidos")
+        for monto_prob in montos_problematicos[:5]:
+            st.write(f"• {monto_prob}")
+        if len(montos_problematicos) > 5:
+            st.write(f"• ... y {len(montos_problematicos) - 5} más")
     
-    # Si es string, intentar múltiples formatos
-    if isinstance(fecha_valor, str):
-        fecha_str = str(fecha_valor).strip()
+    # Filas con más o menos columnas que los encabezados (solo CSV)
+    filas_problematicas = resultado['filas_problematicas']
+    if filas_problematicas:
+        st.warning(f"⚠️ Se omitieron {resultado['filas_malformadas']} filas con un número de columnas distinto al de los encabezados")
+        for fila_prob in filas_problematicas[:5]:
+            st.write(f"• {fila_prob}")
+        if len(filas_problematicas) > 5:
+            st.write(f"• ... y {len(filas_problematicas) - 5} más")
+    
+    # Mostrar resumen de lo procesado
+    if resultado['transacciones'] is not None or resultado['metas']:
+        st.success("✅ Archivo procesado correctamente:")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("📊 Nuevas", resultado['nuevas'])
+        with col2:
+            st.metric("📚 Históricas", resultado['historicas'])
+        with col3:
+            st.metric("🎯 Metas", len(resultado['metas']))
         
-        # Lista de formatos comunes
-        formatos = [
-            '%d/%m/%Y',     # 15/01/2024
-            '%d-%m-%Y',     # 15-01-2024
-            '%Y-%m-%d',     # 2024-01-15
-            '%Y/%m/%d',     # 2024/01/15
-            '%d/%m/%y',     # 15/01/24
-            '%d-%m-%y',     # 15-01-24
-            '%m/%d/%Y',     # 01/15/2024
-            '%m-%d-%Y',     # 01-15-2024
-        ]
+        if len(resultado['archivos']) > 1:
+            st.caption(f"📂 {len(resultado['archivos'])} archivos combinados · "
+                       f"{resultado['duplicadas_entre_archivos']} transacciones repetidas entre archivos omitidas")
+
+@medido()
+def procesar_archivos(uploaded_files):
+    """
+    Procesar uno o varios archivos subidos (combinando histórico + nuevas transacciones)
+    Con varios archivos cada uno se lee en un proceso distinto y las
+    transacciones repetidas entre archivos se descartan. Devuelve el resultado
+    combinado junto con la clave del contenido, o None si no se pudo leer
+    """
+    try:
+        archivos = [(archivo.name, archivo.getvalue()) for archivo in uploaded_files]
+        clave = (tuple(hashlib.sha256(contenido).hexdigest() for _, contenido in archivos), VERSION_PARSER)
         
-        for formato in formatos:
-            try:
-                return datetime.strptime(fecha_str, formato)
-            except:
-                continue
+        # En cada rerun los mismos archivos se sirven desde la caché
+        cache = obtener_cache_cargas()
+        resultado = cache.obtener(clave)
+        if resultado is None:
+            resultado = procesar_lote(archivos, contexto='spawn')
+            cache.guardar(clave, resultado)
         
-        # Si no funciona ningún formato específico, usar pandas
-        try:
-            return pd.to_datetime(fecha_str, dayfirst=True, errors='coerce')
-        except:
-            return None
-    
-    return None
-
-def crear_plantilla_excel():
-    """Crear plantilla de Excel para descargar"""
-    datos_ejemplo = {
-        'Fecha': ['15/01/2024', '16/01/2024', '17/01/2024'],
-        'Categoria': ['Alimentación', 'Transporte', 'Entretenimiento'],
-        'Tipo': ['Gasto', 'Gasto', 'Gasto'],
-        'Monto': [-150, -80, -200]
-    }
-    df_transacciones = pd.DataFrame(datos_ejemplo)
-    
-    # Crear DataFrame de metas vacío para la plantilla
-    df_metas = pd.DataFrame({
-        'Nombre_Meta': [],
-        'Monto_Objetivo': [],
-        'Fecha_Limite': [],
-        'Fecha_Creacion': []
+        if not resultado['archivos']:
+            raise ValueError("; ".join(resultado['errores']))
+        mostrar_resumen_carga(resultado)
+        
+        # Con Copy-on-Write la sesión puede compartir el DataFrame cacheado sin
+        # riesgo de modificarlo; solo las metas (diccionarios) se copian
+        carga = dict(resultado, clave=clave)
+        carga['metas'] = [dict(meta) for meta in resultado['metas']]
+        return carga
+    
+    except Exception as e:
+        st.error(f"Error al procesar el archivo: {str(e)}")
+        st.info("💡 Verifica que el archivo tenga el formato correcto y las fechas estén en formato DD/MM/YYYY")
+        return None
+
+def directorio_almacen():
+    """
+    Subcarpeta del almacén local de quien usa la sesión: el usuario autenticado
+    si la app tiene inicio de sesión configurado; si no, una clave aleatoria
+    que se guarda en la URL (?almacen=...) para volver al mismo histórico al
+    recargar o desde un marcador. Quien tenga la URL puede ver ese histórico
+    """
+    if 'directorio_almacen' not in st.session_state:
+        # st.user no existe en las versiones de Streamlit anteriores a 1.42
+        cuenta = getattr(st, 'user', None)
+        if cuenta is not None and cuenta.get('is_logged_in'):
+            usuario = f"usuario:{cuenta.get('email') or cuenta.get('sub')}"
+        else:
+            if not st.query_params.get('almacen'):
+                st.query_params['almacen'] = uuid.uuid4().hex
+            usuario = f"clave:{st.query_params['almacen']}"
+        st.session_state.directorio_almacen = directorio_usuario(usuario)
+    return st.session_state.directorio_almacen
+
+@medido()
+def inicializar_desde_almacen():
+    """Cargar el histórico del almacén local una vez por sesión"""
+    if not almacen_activo() or st.session_state.get('almacen_leido'):
+        return
+    st.session_state.almacen_leido = True
+    try:
+        df = cargar_almacen(directorio_almacen())
+    except Exception as e:
+        st.sidebar.error(f"No se pudo leer el almacén local: {str(e)}")
+        return
+    if not df.empty:
+        # Las particiones anexadas pueden traer otra grafía de una misma categoría
+        df['Categoria'] = unificar_categorias(df['Categoria'], categorizador_por_defecto().categorias)
+        establecer_transacciones(df)
+        st.session_state.archivo_cargado = True
+
+@medido()
+def aplicar_transacciones_cargadas(carga, incremental=True):
+    """
+    Actualizar la sesión (y el almacén local si está activo) con un archivo cargado
+    En modo incremental solo se agregan las filas que la sesión aún no tiene;
+    si no, el archivo reemplaza todo el histórico
+    """
+    df_cargado = carga['transacciones']
+    if df_cargado is None:
+        st.session_state.reporte_carga = None
+        return
+    
+    df_existente = obtener_transacciones()
+    anexar = incremental and not df_existente.empty
+    if anexar:
+        # Las filas que llegan toman la grafía de las categorías que la sesión
+        # ya tiene: las transacciones cargadas no se renombran al anexar
+        df_cargado = df_cargado.assign(Categoria=unificar_categorias(
+            df_cargado['Categoria'],
+            [*categorizador_por_defecto().categorias, *df_existente['Categoria'].dropna().unique()]
+        ))
+        df_nuevas, duplicadas = filtrar_transacciones_nuevas(df_existente, df_cargado)
+        partes = [df_existente, df_nuevas]
+    else:
+        df_nuevas, duplicadas = df_cargado, 0
+        partes = [df_cargado]
+    
+    # El presupuesto se compara con lo que quedaría en la sesión, no solo con el archivo
+    gestor = obtener_gestor_memoria()
+    if not gestor.cabe_en_sesion(*partes):
+        st.session_state.reporte_carga = None
+        st.error(f"Los datos ocupan {sum(memoria_objeto(df) for df in partes) / 1e6:,.1f} MB en memoria y el límite "
+                 f"por sesión es de {gestor.presupuesto_sesion / 1e6:,.1f} MB. Sube menos archivos o un período más corto")
+        return
+    
+    if anexar:
+        if not df_nuevas.empty:
+            if almacen_activo():
+                anexar_almacen(df_nuevas, directorio_almacen())
+            anexar_transacciones(df_nuevas)
+    else:
+        if almacen_activo():
+            escribir_almacen(df_cargado, directorio_almacen())
+        establecer_transacciones(df_cargado)
+    
+    st.session_state.reporte_carga = {'nuevas': len(df_nuevas), 'duplicadas': duplicadas}
+
+def establecer_transacciones(df):
+    """Reemplazar las transacciones de la sesión e invalidar lo derivado de ellas"""
+    st.session_state.datos_sesion.establecer(df)
+    st.session_state.version_datos += 1
+
+def anexar_transacciones(df_nuevas):
+    """
+    Agregar filas al final de las transacciones de la sesión
+    Las columnas derivadas y los agregados ya calculados se actualizan solo con
+    las filas nuevas en lugar de recalcularse sobre todo el histórico
+    """
+    datos = st.session_state.datos_sesion
+    anterior = st.session_state.version_datos
+    derivadas = datos.cache('columnas_derivadas')
+    agregados = datos.cache('agregados')
+    establecer_transacciones(concatenar_transacciones([obtener_transacciones(), df_nuevas]))
+    
+    if derivadas is None or derivadas[0] != anterior:
+        return
+    version = st.session_state.version_datos
+    derivadas_nuevas = calcular_columnas_derivadas(df_nuevas)
+    datos.guardar_cache(
+        'columnas_derivadas',
+        (version, pd.concat([derivadas[1], derivadas_nuevas], ignore_index=True))
+    )
+    if agregados is not None and agregados[0] == anterior:
+        datos.guardar_cache(
+            'agregados',
+            (version, actualizar_agregados(agregados[1], df_nuevas, derivadas_nuevas))
+        )
+
+def _cacheado_por_version(nombre, calcular):
+    """Resultado de calcular() guardado en la sesión mientras no cambien las transacciones"""
+    version = st.session_state.version_datos
+    datos = st.session_state.datos_sesion
+    cacheado = datos.cache(nombre)
+    if cacheado is None or cacheado[0] != version:
+        with tramo(nombre):
+            cacheado = (version, calcular())
+        datos.guardar_cache(nombre, cacheado)
+    return cacheado[1]
+
+def obtener_columnas_derivadas():
+    """Columnas derivadas de la sesión, calculadas una vez por versión de los datos"""
+    def calcular():
+        df = obtener_transacciones()
+        return calcular_columnas_derivadas(df) if not df.empty else pd.DataFrame()
+    return _cacheado_por_version('columnas_derivadas', calcular)
+
+def obtener_agregados():
+    """Agregados de las transacciones de la sesión, recalculados solo si cambiaron"""
+    return _cacheado_por_version(
+        'agregados',
+        lambda: calcular_agregados(obtener_transacciones(), obtener_columnas_derivadas())
+    )
+
+def obtener_indice_temporal():
+    return _cacheado_por_version('indice_temporal', lambda: construir_indice_temporal(obtener_transacciones()))
+
+def filtro_activo(filtro, agregados):
+    """Indicar si el filtro de la barra lateral restringe algo"""
+    if not filtro or agregados is None:
+        return False
+    return bool(
+        filtro['categorias'] or filtro['tipos']
+        or filtro['desde'] > agregados['fecha_min'].date()
+        or filtro['hasta'] < agregados['fecha_max'].date()
+    )
+
+@medido()
+def obtener_vista():
+    """
+    Transacciones, columnas derivadas y agregados que deben mostrar las páginas
+    Con filtro activo se calculan sobre las filas filtradas (cacheado por filtro)
+    """
+    df = obtener_transacciones()
+    agregados = obtener_agregados()
+    filtro = st.session_state.get('filtro')
+    if not filtro_activo(filtro, agregados):
+        return df, obtener_columnas_derivadas(), agregados
+    
+    clave = (st.session_state.version_datos, filtro['desde'], filtro['hasta'],
+             tuple(filtro['categorias']), tuple(filtro['tipos']))
+    cacheada = st.session_state.datos_sesion.cache('vista_filtrada')
+    if cacheada is None or cacheada[0] != clave:
+        filas = filas_filtradas(obtener_indice_temporal(), **filtro)
+        df_filtrado = df.iloc[filas]
+        derivadas = obtener_columnas_derivadas().iloc[filas]
+        cacheada = (clave, (df_filtrado, derivadas, calcular_agregados(df_filtrado, derivadas)))
+        st.session_state.datos_sesion.guardar_cache('vista_filtrada', cacheada)
+    return cacheada[1]
+
+def _cacheado_por_vista(nombre, calcular):
+    """
+    calcular(df, derivadas) sobre la vista actual, cacheado por versión de los
+    datos y, con filtro activo, también por filtro (se guarda solo el último)
+    """
+    df, derivadas, _ = obtener_vista()
+    filtro = st.session_state.get('filtro')
+    if not filtro_activo(filtro, obtener_agregados()):
+        return _cacheado_por_version(nombre, lambda: calcular(df, derivadas))
+    
+    clave = (st.session_state.version_datos, repr(filtro))
+    datos = st.session_state.datos_sesion
+    cacheado = datos.cache(f'{nombre}_filtrado')
+    if cacheado is None or cacheado[0] != clave:
+        with tramo(nombre, filtrado=True):
+            cacheado = (clave, calcular(df, derivadas))
+        datos.guardar_cache(f'{nombre}_filtrado', cacheado)
+    return cacheado[1]
+
+def obtener_series():
+    """Series diarias acumuladas de la vista actual"""
+    return _cacheado_por_vista('series', construir_series)
+
+def obtener_detecciones():
+    """Transacciones inusuales y pagos recurrentes de la vista actual"""
+    return _cacheado_por_vista('detecciones', lambda df, derivadas: {
+        'anomalias': detectar_anomalias(df),
+        'recurrentes': detectar_recurrentes(df, derivadas)
     })
+
+@medido()
+def mostrar_filtros_sidebar():
+    """Filtro global de fechas, categorías y tipo en la barra lateral"""
+    agregados = obtener_agregados()
+    if agregados is None:
+        st.session_state.filtro = None
+        return
     
-    # Convertir a Excel en memoria
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl', mode='w') as writer:
-        df_transacciones.to_excel(writer, index=False, sheet_name='Transacciones')
-        df_metas.to_excel(writer, index=False, sheet_name='Metas')
-        
-        # Agregar instrucciones como DataFrame simple
-        instrucciones = pd.DataFrame({
-            'INSTRUCCIONES': [
-                '=== HOJA TRANSACCIONES ===',
-                '1. Llena la columna Fecha con formato DD/MM/YYYY',
-                '2. Categoria: Alimentación, Transporte, Entretenimiento, Salario, etc.',
-                '3. Tipo: Gasto (negativo) o Ingreso (positivo)',
-                '4. Monto: Usa números negativos para gastos, positivos para ingresos',
-                '5. Elimina estas filas de ejemplo antes de subir tu archivo',
-                '',
-                '=== HOJA METAS ===',
-                '6. Las metas se guardan automáticamente en esta hoja',
-                '7. NO modifiques manualmente la hoja de Metas',
-                '8. Usa la aplicación para agregar/eliminar metas',
-                '',
-                '=== IMPORTANTE ===',
-                '9. Siempre descarga tu archivo actualizado después de hacer cambios',
-                '10. Usa ese archivo actualizado para futuras cargas',
-                '11. FORMATO DE FECHA: DD/MM/YYYY (ejemplo: 15/01/2024)'
-            ]
-        })
-        instrucciones.to_excel(writer, index=False, sheet_name='Instrucciones')
+    indice = obtener_indice_temporal()
+    version = st.session_state.version_datos  # Los filtros se reinician si cambian los datos
+    fecha_min = agregados['fecha_min'].date()
+    fecha_max = agregados['fecha_max'].date()
+    
+    st.sidebar.markdown("---")
+    st.sidebar.subheader("🔎 Filtros")
+    rango = st.sidebar.date_input(
+        "Rango de fechas", value=(fecha_min, fecha_max),
+        min_value=fecha_min, max_value=fecha_max, key=f"filtro_fechas_{version}"
+    )
+    if not isinstance(rango, (list, tuple)):
+        rango = (rango, rango)
+    desde = rango[0] if len(rango) > 0 else fecha_min
+    hasta = rango[1] if len(rango) > 1 else desde
     
-    return output.getvalue()
+    categorias = st.sidebar.multiselect(
+        "Categorías (vacío = todas)", sorted(indice['por_categoria']), key=f"filtro_categorias_{version}"
+    )
+    tipos = st.sidebar.multiselect(
+        "Tipo (vacío = todos)", sorted(indice['por_tipo']), key=f"filtro_tipos_{version}"
+    )
+    st.session_state.filtro = {'desde': desde, 'hasta': hasta, 'categorias': categorias, 'tipos': tipos}
+    
+    if filtro_activo(st.session_state.filtro, agregados):
+        df_filtrado, _, _ = obtener_vista()
+        st.sidebar.caption(f"Mostrando {len(df_filtrado):,} de {agregados['num_transacciones']:,} transacciones")
+
+TAMANOS_PAGINA = [25, 50, 100]
+
+# Filas máximas de las tablas de detección en Insights
+MAX_FILAS_DETECCION = 50
+COLUMNAS_ORDENABLES = ['Fecha', 'Monto', 'Categoria', 'Tipo']
+
+def _claves_orden(df, columna):
+    """Valores numéricos equivalentes a ordenar por columna (texto en orden alfabético)"""
+    if columna == 'Monto':
+        return df['Monto'].to_numpy()
+    categorica = a_categorica(df[columna])
+    rangos = np.argsort(np.argsort(np.asarray(categorica.cat.categories, dtype=object)))
+    return rangos[categorica.cat.codes.to_numpy()]
+
+def obtener_orden_columna(columna):
+    """Posiciones de todas las filas ordenadas por columna (cacheado por versión)"""
+    if columna == 'Fecha':
+        return obtener_indice_temporal()['orden']
+    return _cacheado_por_version(
+        f'orden_{columna}',
+        lambda: np.argsort(_claves_orden(obtener_transacciones(), columna), kind='stable')
+    )
+
+def _codigos_coincidentes(serie, texto):
+    """Códigos de las categorías cuyo texto contiene la búsqueda"""
+    categorias = pd.Series(a_categorica(serie).cat.categories.astype(str))
+    return np.flatnonzero(categorias.str.contains(texto, case=False, regex=False).to_numpy())
 
-def crear_excel_con_datos_actuales():
-    """Crear Excel con histórico y hoja de transacciones vacía para nuevos datos"""
-    output = io.BytesIO()
+@medido()
+def filas_explorador(busqueda='', columna='Fecha', descendente=True):
+    """
+    Posiciones de las filas a mostrar en el explorador, en orden de visualización
+    Respeta el filtro global; sin filtro ni búsqueda usa directamente el orden
+    precalculado, así que pasar de página solo cuesta el tamaño de la página
+    """
+    df = obtener_transacciones()
+    filtro = st.session_state.get('filtro')
+    clave = (st.session_state.version_datos, repr(filtro), busqueda, columna, descendente)
+    cacheadas = st.session_state.datos_sesion.cache('filas_explorador')
+    if cacheadas is not None and cacheadas[0] == clave:
+        return cacheadas[1]
     
-    with pd.ExcelWriter(output, engine='openpyxl', mode='w') as writer:
-        # Hoja de TRANSACCIONES - SIEMPRE VACÍA para nuevos registros
-        df_transacciones_vacia = pd.DataFrame({
-            'Fecha': ['17/04/2024'],  # Ejemplo con formato DD/MM/YYYY
-            'Categoria': ['Vivienda'],
-            'Tipo': ['Gasto'],
-            'Monto': [-900]
-        })
-        df_transacciones_vacia.to_excel(writer, index=False, sheet_name='Transacciones')
-        
-        # Hoja de HISTORICO - Todas las transacciones previas
-        if not st.session_state.df_transacciones.empty:
-            # Formatear fechas antes de guardar
-            df_historico = st.session_state.df_transacciones.copy()
-            df_historico['Fecha'] = df_historico['Fecha'].dt.strftime('%d/%m/%Y')
-            df_historico.to_excel(writer, index=False, sheet_name='Historico')
+    if not filtro_activo(filtro, obtener_agregados()) and not busqueda:
+        filas = obtener_orden_columna(columna)
+    else:
+        if filtro_activo(filtro, obtener_agregados()):
+            filas = filas_filtradas(obtener_indice_temporal(), **filtro)
         else:
-            # Si no hay histórico, crear hoja vacía con headers
-            df_historico_vacio = pd.DataFrame(columns=['Fecha', 'Categoria', 'Tipo', 'Monto'])
-            df_historico_vacio.to_excel(writer, index=False, sheet_name='Historico')
+            filas = obtener_indice_temporal()['orden']
         
-        # Guardar metas
-        if st.session_state.metas:
-            df_metas = pd.DataFrame(st.session_state.metas)
-            # Renombrar columnas para el Excel
-            df_metas_excel = df_metas.rename(columns={
-                'nombre': 'Nombre_Meta',
-                'monto': 'Monto_Objetivo',
-                'fecha_limite': 'Fecha_Limite',
-                'fecha_creacion': 'Fecha_Creacion'
-            })
-            
-            # Formatear fechas en las metas
-            if 'Fecha_Limite' in df_metas_excel.columns:
-                df_metas_excel['Fecha_Limite'] = df_metas_excel['Fecha_Limite'].apply(
-                    lambda x: x.strftime('%d/%m/%Y') if pd.notna(x) and x is not None else ''
-                )
-            if 'Fecha_Creacion' in df_metas_excel.columns:
-                df_metas_excel['Fecha_Creacion'] = df_metas_excel['Fecha_Creacion'].apply(
-                    lambda x: x.strftime('%d/%m/%Y') if pd.notna(x) and x is not None else ''
-                )
-            
-            df_metas_excel.to_excel(writer, index=False, sheet_name='Metas')
-        else:
-            # Crear hoja de metas vacía con headers
-            df_metas_vacio = pd.DataFrame(columns=['Nombre_Meta', 'Monto_Objetivo', 'Fecha_Limite', 'Fecha_Creacion'])
-            df_metas_vacio.to_excel(writer, index=False, sheet_name='Metas')
+        if busqueda:
+            coincide = np.zeros(len(filas), dtype=bool)
+            for col in ['Categoria', 'Tipo']:
+                codigos = a_categorica(df[col]).cat.codes.to_numpy()[filas]
+                coincide |= np.isin(codigos, _codigos_coincidentes(df[col], busqueda))
+            filas = filas[coincide]
         
-        # Agregar instrucciones actualizadas como DataFrame simple
-        instrucciones = pd.DataFrame({
-            'INSTRUCCIONES_ACTUALIZADAS': [
-                '=== TU ARCHIVO PERSONAL ===',
-                f'Archivo generado el: {datetime.now().strftime("%d/%m/%Y %H:%M")}',
-                f'Transacciones en histórico: {len(st.session_state.df_transacciones)}',
-                f'Metas activas: {len(st.session_state.metas)}',
-                '',
-                '=== CÓMO USAR ===',
-                '1. Agrega NUEVAS transacciones SOLO en la hoja "Transacciones"',
-                '2. ELIMINA el ejemplo antes de agregar tus datos',
-                '3. NO modifiques las hojas "Historico" ni "Metas"',
-                '4. La app combinará histórico + nuevos datos automáticamente',
-                '',
-                '=== FORMATO TRANSACCIONES ===',
-                'Fecha: DD/MM/YYYY (ej: 17/04/2024) - ¡MUY IMPORTANTE!',
-                'Categoria: Vivienda, Alimentación, Transporte, etc.',
-                'Tipo: Gasto o Ingreso',
-                'Monto: Negativo para gastos (-900), positivo para ingresos',
-                '',
-                '=== EJEMPLO CORRECTO ===',
-                '17/04/2024    Vivienda    Gasto    -900',
-                '18/04/2024    Salario     Ingreso   3000',
-                '',
-                '=== IMPORTANTE FECHAS ===',
-                'Excel puede cambiar formato automáticamente.',
-                'Si ves fechas raras, verifica que estén en DD/MM/YYYY'
-            ]
-        })
-        instrucciones.to_excel(writer, index=False, sheet_name='Instrucciones')
+        if columna != 'Fecha':
+            claves = _claves_orden(df, columna)[filas]
+            filas = filas[np.argsort(claves, kind='stable')]
     
-    return output.getvalue()
+    if descendente:
+        filas = filas[::-1]
+    st.session_state.datos_sesion.guardar_cache('filas_explorador', (clave, filas))
+    return filas
 
-def procesar_archivo(uploaded_file):
-    """Procesar archivo Excel subido (combinando histórico + nuevas transacciones)"""
+def filas_recientes(cantidad):
+    """
+    Posiciones de las transacciones más recientes (respetando el filtro global),
+    tomadas del final del índice temporal; no usa la caché del explorador, que
+    guarda un solo orden y se reconstruiría al alternar entre páginas
+    """
+    filtro = st.session_state.get('filtro')
+    if filtro_activo(filtro, obtener_agregados()):
+        filas = filas_filtradas(obtener_indice_temporal(), **filtro)
+    else:
+        filas = obtener_indice_temporal()['orden']
+    return filas[::-1][:cantidad]
+
+def mostrar_tabla_transacciones(df_pagina):
+    """Mostrar solo las filas de una página (con AgGrid si está instalado)"""
+    df_pagina = df_pagina[COLUMNAS_REQUERIDAS].assign(Fecha=df_pagina['Fecha'].dt.strftime('%d/%m/%Y'))
     try:
-        # Leer todas las hojas disponibles
-        excel_sheets = pd.read_excel(uploaded_file, sheet_name=None)
-        
-        df_todas_transacciones = pd.DataFrame()
-        metas_cargadas = []
-        nuevas_transacciones = 0
-        historicas_transacciones = 0
-        fechas_problematicas = []
-        
-        # Procesar hoja de NUEVAS transacciones
-        if 'Transacciones' in excel_sheets:
-            df_nuevas = excel_sheets['Transacciones']
-            
-            # Validar columnas requeridas
-            required_columns = ['Fecha', 'Categoria', 'Tipo', 'Monto']
-            if all(col in df_nuevas.columns for col in required_columns):
-                # Limpiar y procesar nuevas transacciones
-                df_nuevas = df_nuevas.dropna()
-                if not df_nuevas.empty:
-                    # Procesar fechas con función mejorada
-                    fechas_procesadas = []
-                    for idx, fecha_valor in enumerate(df_nuevas['Fecha']):
-                        fecha_procesada = parsear_fecha_flexible(fecha_valor)
-                        if fecha_procesada is None:
-                            fechas_problematicas.append(f"Fila {idx+2}: {fecha_valor}")
-                        fechas_procesadas.append(fecha_procesada)
-                    
-                    df_nuevas['Fecha'] = fechas_procesadas
-                    # Eliminar filas con fechas inválidas
-                    df_nuevas_validas = df_nuevas.dropna(subset=['Fecha'])
-                    
-                    if len(df_nuevas_validas) < len(df_nuevas):
-                        st.warning(f"⚠️ Se omitieron {len(df_nuevas) - len(df_nuevas_validas)} filas con fechas inválidas")
-                    
-                    if not df_nuevas_validas.empty:
-                        nuevas_transacciones = len(df_nuevas_validas)
-                        df_todas_transacciones = pd.concat([df_todas_transacciones, df_nuevas_validas], ignore_index=True)
-        
-        # Procesar hoja de HISTORICO
-        if 'Historico' in excel_sheets:
-            df_historico = excel_sheets['Historico']
-            
-            if not df_historico.empty:
-                required_columns = ['Fecha', 'Categoria', 'Tipo', 'Monto']
-                if all(col in df_historico.columns for col in required_columns):
-                    df_historico = df_historico.dropna()
-                    if not df_historico.empty:
-                        # Procesar fechas del histórico con función mejorada
-                        fechas_procesadas = []
-                        for fecha_valor in df_historico['Fecha']:
-                            fecha_procesada = parsear_fecha_flexible(fecha_valor)
-                            fechas_procesadas.append(fecha_procesada)
-                        
-                        df_historico['Fecha'] = fechas_procesadas
-                        df_historico = df_historico.dropna(subset=['Fecha'])
-                        
-                        if not df_historico.empty:
-                            historicas_transacciones = len(df_historico)
-                            df_todas_transacciones = pd.concat([df_historico, df_todas_transacciones], ignore_index=True)
-        
-        # Si no hay hoja de histórico pero sí de transacciones (archivo viejo)
-        elif 'Transacciones' in excel_sheets and df_todas_transacciones.empty:
-            st.info("📋 Detectado archivo en formato anterior. Todas las transacciones se tratarán como históricas.")
-            df_transacciones_viejas = excel_sheets['Transacciones']
-            if not df_transacciones_viejas.empty:
-                required_columns = ['Fecha', 'Categoria', 'Tipo', 'Monto']
-                if all(col in df_transacciones_viejas.columns for col in required_columns):
-                    df_transacciones_viejas = df_transacciones_viejas.dropna()
-                    if not df_transacciones_viejas.empty:
-                        # Procesar fechas con función mejorada
-                        fechas_procesadas = []
-                        for fecha_valor in df_transacciones_viejas['Fecha']:
-                            fecha_procesada = parsear_fecha_flexible(fecha_valor)
-                            fechas_procesadas.append(fecha_procesada)
-                        
-                        df_transacciones_viejas['Fecha'] = fechas_procesadas
-                        df_transacciones_viejas = df_transacciones_viejas.dropna(subset=['Fecha'])
-                        
-                        if not df_transacciones_viejas.empty:
-                            historicas_transacciones = len(df_transacciones_viejas)
-                            df_todas_transacciones = df_transacciones_viejas
-        
-        # Procesar hoja de metas
-        if 'Metas' in excel_sheets:
-            df_metas = excel_sheets['Metas']
-            
-            if not df_metas.empty and 'Nombre_Meta' in df_metas.columns:
-                for _, row in df_metas.iterrows():
-                    if pd.notna(row['Nombre_Meta']) and pd.notna(row['Monto_Objetivo']):
-                        meta = {
-                            'nombre': str(row['Nombre_Meta']),
-                            'monto': float(row['Monto_Objetivo']),
-                            'fecha_creacion': datetime.now().date()
-                        }
-                        
-                        # Procesar fecha de creación
-                        if pd.notna(row.get('Fecha_Creacion')):
-                            fecha_creacion = parsear_fecha_flexible(row['Fecha_Creacion'])
-                            if fecha_creacion:
-                                meta['fecha_creacion'] = fecha_creacion.date() if hasattr(fecha_creacion, 'date') else fecha_creacion
-                        
-                        # Procesar fecha límite opcional
-                        if pd.notna(row.get('Fecha_Limite')):
-                            fecha_limite = parsear_fecha_flexible(row['Fecha_Limite'])
-                            if fecha_limite:
-                                meta['fecha_limite'] = fecha_limite.date() if hasattr(fecha_limite, 'date') else fecha_limite
-                            else:
-                                meta['fecha_limite'] = None
-                        else:
-                            meta['fecha_limite'] = None
-                        
-                        metas_cargadas.append(meta)
-        
-        # Mostrar advertencias sobre fechas problemáticas
-        if fechas_problematicas:
-            st.error("🚨 **Fechas problemáticas encontradas:**")
-            for fecha_prob in fechas_problematicas[:5]:  # Mostrar solo las primeras 5
-                st.write(f"• {fecha_prob}")
-            if len(fechas_problematicas) > 5:
-                st.write(f"• ... y {len(fechas_problematicas) - 5} más")
-            st.info("💡 **Solución:** Asegúrate de usar formato DD/MM/YYYY (ejemplo: 15/01/2024)")
-        
-        # Mostrar resumen de lo procesado
-        if not df_todas_transacciones.empty or metas_cargadas:
-            st.success("✅ Archivo procesado correctamente:")
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("📊 Nuevas", nuevas_transacciones)
-            with col2:
-                st.metric("📚 Históricas", historicas_transacciones)
-            with col3:
-                st.metric("🎯 Metas", len(metas_cargadas))
-        
-        return df_todas_transacciones if not df_todas_transacciones.empty else None, metas_cargadas
-        
-    except Exception as e:
-        st.error(f"Error al procesar el archivo: {str(e)}")
-        st.info("💡 Verifica que el archivo tenga el formato correcto y las fechas estén en formato DD/MM/YYYY")
-        return None, []
+        from st_aggrid import AgGrid
+    except ImportError:
+        st.dataframe(df_pagina, use_container_width=True, hide_index=True)
+        return
+    AgGrid(df_pagina.astype({'Categoria': str, 'Tipo': str}), height=min(600, 35 * (len(df_pagina) + 1) + 10))
+
+# Límites de puntos enviados al navegador por gráfico
+MAX_PUNTOS_LINEA = 500
+MAX_BARRAS = 120
+TOP_CATEGORIAS_GRAFICO = 8
+
+# Resolución -> (tabla de agregados, nombre del periodo)
+RESOLUCIONES = {
+    'Diaria': ('por_dia', 'Día'),
+    'Semanal': ('por_semana', 'Semana'),
+    'Mensual': ('por_mes', 'Mes'),
+    'Anual': ('por_anio', 'Año'),
+}
 
-def calcular_insights(df, metas):
-    """Calcular insights financieros"""
-    insights = []
+def indices_lttb(x, y, max_puntos):
+    """
+    Índices de los puntos a conservar con Largest-Triangle-Three-Buckets
+    Mantiene el primer y el último punto y, en cada cubeta intermedia, el que
+    forma el triángulo de mayor área con el punto anterior y la media de la siguiente
+    """
+    n = len(y)
+    if max_puntos >= n or max_puntos < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
     
-    if not df.empty:
-        # Insights básicos
-        total_ingresos = df[df['Monto'] > 0]['Monto'].sum()
-        total_gastos = abs(df[df['Monto'] < 0]['Monto'].sum())
-        balance = total_ingresos - total_gastos
+    bordes = np.linspace(1, n - 1, max_puntos - 1).astype('int64')
+    seleccion = np.empty(max_puntos, dtype='int64')
+    seleccion[0] = 0
+    seleccion[-1] = n - 1
+    anterior = 0
+    for i in range(max_puntos - 2):
+        inicio, fin = bordes[i], max(bordes[i + 1], bordes[i] + 1)
+        siguiente_inicio = fin
+        siguiente_fin = bordes[i + 2] if i + 2 < len(bordes) else n
+        siguiente_fin = max(siguiente_fin, siguiente_inicio + 1)
+        media_x = x[siguiente_inicio:siguiente_fin].mean()
+        media_y = y[siguiente_inicio:siguiente_fin].mean()
         
-        insights.append(f"💰 Balance total: ${balance:,.2f}")
-        insights.append(f"📈 Ingresos totales: ${total_ingresos:,.2f}")
-        insights.append(f"📉 Gastos totales: ${total_gastos:,.2f}")
+        areas = np.abs(
+            (x[anterior] - media_x) * (y[inicio:fin] - y[anterior])
+            - (x[anterior] - x[inicio:fin]) * (media_y - y[anterior])
+        )
+        anterior = inicio + int(np.argmax(areas))
+        seleccion[i + 1] = anterior
+    return seleccion
+
+def reducir_serie_linea(serie, max_puntos=MAX_PUNTOS_LINEA):
+    """Reducir una serie a como mucho max_puntos conservando su forma (LTTB)"""
+    if len(serie) <= max_puntos:
+        return serie
+    indice = serie.index
+    if isinstance(indice, pd.DatetimeIndex):
+        x = indice.asi8
+    else:
+        x = np.arange(len(serie))
+    return serie.iloc[indices_lttb(x, serie.to_numpy(), max_puntos)]
+
+def agrupar_top_categorias(serie, top=TOP_CATEGORIAS_GRAFICO):
+    """Conservar las top categorías de mayor valor y sumar el resto en 'Otros'"""
+    serie = serie.sort_values(ascending=False)
+    if len(serie) <= top:
+        return serie
+    principales = serie.iloc[:top - 1]
+    principales.index = principales.index.astype(str)
+    otros = pd.Series([serie.iloc[top - 1:].sum()], index=['Otros'])
+    return pd.concat([principales, otros])
+
+def tabla_por_resolucion(agregados, resolucion, max_puntos=None):
+    """
+    Tabla de agregados para la resolución pedida
+    Si supera max_puntos pasa a la siguiente resolución más gruesa;
+    devuelve (tabla, resolución efectivamente usada)
+    """
+    nombres = list(RESOLUCIONES)
+    for nombre in nombres[nombres.index(resolucion):]:
+        tabla = agregados[RESOLUCIONES[nombre][0]]
+        if max_puntos is None or len(tabla) <= max_puntos or nombre == nombres[-1]:
+            return tabla, nombre
+
+def modo_depuracion():
+    """
+    Modo del panel de depuración oculto: None, 'tiempos' o 'memoria'
+    Se activa con ?depurar=1 (o ?depurar=memoria) en la URL o con FINANZAS_INSTRUMENTACION
+    """
+    valor = (st.query_params.get('depurar') or MODO_ENTORNO).strip().lower()
+    if valor in ('', '0', 'no'):
+        return None
+    return 'memoria' if valor == 'memoria' else 'tiempos'
+
+def mostrar_panel_depuracion(tramos, modo):
+    """Tabla con los tramos medidos en la última ejecución de la página"""
+    with st.sidebar.expander("🛠️ Depuración: tiempos por etapa"):
+        if not tramos:
+            st.caption("No se midió ninguna etapa")
+            return
         
-        # Categoría con más gastos
-        gastos_por_categoria = df[df['Monto'] < 0].groupby('Categoria')['Monto'].sum().abs()
-        if not gastos_por_categoria.empty:
-            categoria_mayor_gasto = gastos_por_categoria.idxmax()
-            monto_mayor_gasto = gastos_por_categoria.max()
-            insights.append(f"🔍 Mayor gasto por categoría: {categoria_mayor_gasto} (${monto_mayor_gasto:,.2f})")
+        campos_fijos = {'nombre', 'nivel', 'inicio_ms', 'ms', 'memoria_mb'}
+        tabla = pd.DataFrame({
+            'etapa': ['· ' * t['nivel'] + t['nombre'] for t in tramos],
+            'detalle': [', '.join(f"{k}={v}" for k, v in t.items() if k not in campos_fijos) for t in tramos],
+            'ms': [t['ms'] for t in tramos],
+            'memoria_mb': [t['memoria_mb'] for t in tramos]
+        })
+        columnas = ['etapa', 'detalle', 'ms'] + (['memoria_mb'] if modo == 'memoria' else [])
+        st.dataframe(tabla[columnas], hide_index=True, use_container_width=True)
         
-        # Promedio de gastos diarios
-        if len(df[df['Monto'] < 0]) > 0:
-            dias_unicos = df['Fecha'].dt.date.nunique()
-            promedio_diario = total_gastos / dias_unicos if dias_unicos > 0 else 0
-            insights.append(f"📅 Promedio de gasto diario: ${promedio_diario:,.2f}")
-    
-    # Insights de metas
-    for meta in metas:
-        if df.empty:
-            insights.append(f"🎯 {meta['nombre']}: Te faltan ${meta['monto']:,.2f} para tu meta")
-        else:
-            ahorro_actual = max(0, df['Monto'].sum())  # Solo contar balance positivo como ahorro
-            faltante = meta['monto'] - ahorro_actual
-            
-            if faltante <= 0:
-                insights.append(f"🎉 ¡Meta '{meta['nombre']}' alcanzada!")
-            else:
-                # Calcular tiempo estimado
-                if meta.get('fecha_limite'):
-                    dias_restantes = (meta['fecha_limite'] - datetime.now().date()).days
-                    if dias_restantes > 0:
-                        ahorro_diario_necesario = faltante / dias_restantes
-                        insights.append(f"🎯 {meta['nombre']}: Te faltan ${faltante:,.2f}. Necesitas ahorrar ${ahorro_diario_necesario:,.2f} diarios")
-                    else:
-                        insights.append(f"⏰ {meta['nombre']}: Meta vencida. Te faltan ${faltante:,.2f}")
-                else:
-                    insights.append(f"🎯 {meta['nombre']}: Te faltan ${faltante:,.2f} para tu meta")
-    
-    return insights
+        st.download_button(
+            label="⬇️ Descargar JSON",
+            data=json.dumps(tramos, ensure_ascii=False, default=str, indent=2),
+            file_name=f"tramos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+            mime="application/json"
+        )
 
 def main():
+    modo = modo_depuracion()
+    if modo is None:
+        mostrar_app()
+    else:
+        # Medir esta ejecución completa y mostrar el desglose en la barra lateral
+        iniciar_captura(memoria=(modo == 'memoria'))
+        try:
+            with tramo('ejecucion'):
+                mostrar_app()
+        finally:
+            tramos = finalizar_captura()
+        mostrar_panel_depuracion(tramos, modo)
+    
+    # Aplicar los presupuestos de memoria del proceso con esta sesión ya atendida
+    obtener_gestor_memoria().equilibrar(st.session_state.datos_sesion)
+
+def mostrar_app():
+    inicializar_desde_almacen()
+    
     st.title("📊 Mi Dashboard Financiero Personal")
     st.markdown("---")
     
@@ -412,303 +740,467 @@ def main():
     st.sidebar.title("🧭 Navegación")
     pagina = st.sidebar.selectbox(
         "Selecciona una sección:",
-        ["📥 Cargar Datos", "📊 Dashboard", "🎯 Metas Financieras", "💡 Insights", "💾 Descargar Datos"]
+        ["📥 Cargar Datos", "📊 Dashboard", "🔍 Explorador", "🎯 Metas Financieras", "💡 Insights", "💾 Descargar Datos"]
     )
     
-    if pagina == "📥 Cargar Datos":
-        st.header("📥 Gestión de Datos Financieros")
-        
-        # Información importante sobre fechas
-        st.info("🗓️ **¡IMPORTANTE SOBRE FECHAS!** Usa formato DD/MM/YYYY (ejemplo: 15/01/2024) para evitar errores")
+    mostrar_filtros_sidebar()
+    
+    with tramo('pagina', pagina=pagina):
+        if pagina == "📥 Cargar Datos":
+            st.header("📥 Gestión de Datos Financieros")
+            
+            # Información importante sobre fechas
+            st.info("🗓️ **¡IMPORTANTE SOBRE FECHAS!** Usa formato DD/MM/YYYY (ejemplo: 15/01/2024) para evitar errores")
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.subheader("1️⃣ Primera vez - Descargar Plantilla")
+                st.write("Si es tu primera vez, descarga la plantilla inicial:")
+                
+                # La plantilla se genera al hacer clic, no al abrir la página
+                st.download_button(
+                    label="📁 Descargar Plantilla Nueva",
+                    data=obtener_plantilla_excel if DESCARGA_DIFERIDA else obtener_plantilla_excel(),
+                    file_name="plantilla_finanzas_inicial.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                )
+                
+                st.info("💡 Esta plantilla incluye ejemplos e instrucciones")
+            
+            with col2:
+                st.subheader("2️⃣ Subir Archivo")
+                uploaded_files = st.file_uploader(
+                    "Sube tu archivo Excel (con transacciones y metas):",
+                    type=['xlsx', 'xls', 'csv', 'ofx', 'qfx'],
+                    accept_multiple_files=True,
+                    help="Puede ser la plantilla inicial, tu archivo personal actualizado o el extracto "
+                         "CSV/OFX de tu banco. Puedes subir varios a la vez (por ejemplo, uno por año o por cuenta)"
+                )
+                if RUTA_REGLAS:
+                    try:
+                        reglas = categorizador_por_defecto().reglas
+                        st.caption(f"🏷️ {len(reglas)} reglas de categorización automática activas")
+                    except (OSError, ValueError) as e:
+                        st.warning(f"No se pudieron leer las reglas de categorización: {str(e)}")
+                modo_carga = st.radio(
+                    "Modo de carga:",
+                    ["➕ Incremental (solo transacciones nuevas)", "🔄 Reemplazar todo"],
+                    help="El modo incremental ignora las transacciones que ya están cargadas, "
+                         "así subir el mismo archivo dos veces no duplica nada"
+                )
+                
+                if not uploaded_files:
+                    st.session_state.ultima_carga = None
+                else:
+                    carga = procesar_archivos(uploaded_files)
+                    
+                    if carga is not None and (carga['transacciones'] is not None or carga['metas']):
+                        # Aplicar cada archivo una sola vez aunque la página se vuelva a ejecutar
+                        if st.session_state.get('ultima_carga') != carga['clave']:
+                            aplicar_transacciones_cargadas(carga, incremental=modo_carga.startswith("➕"))
+                            
+                            if carga['metas']:
+                                st.session_state.metas = tabla_metas(carga['metas'])
+                            
+                            st.session_state.ultima_carga = carga['clave']
+                        
+                        st.session_state.archivo_cargado = True
+                        
+                        reporte = st.session_state.get('reporte_carga')
+                        if reporte:
+                            st.info(f"➕ {reporte['nuevas']} transacciones nuevas agregadas · "
+                                    f"🔁 {reporte['duplicadas']} duplicadas omitidas")
+                        
+                        # Mostrar resumen de lo cargado
+                        if not obtener_transacciones().empty:
+                            st.write("**Vista previa de todas las transacciones (histórico + nuevas):**")
+                            # Mostrar fechas formateadas correctamente
+                            preview_df = obtener_transacciones().tail(10)
+                            st.dataframe(preview_df.assign(Fecha=preview_df['Fecha'].dt.strftime('%d/%m/%Y')))
+                            
+                            with st.expander("🧠 Uso de memoria de tus datos"):
+                                memoria = reporte_memoria(obtener_transacciones())
+                                st.dataframe(memoria)
+                                st.caption(f"Total: {memoria['MB'].sum():,.2f} MB · "
+                                           f"con cálculos cacheados: {st.session_state.datos_sesion.bytes / 1e6:,.2f} MB")
+                                
+                                proceso = obtener_gestor_memoria().resumen()
+                                st.caption(f"Servidor: {proceso['sesiones']} sesiones · {proceso['bytes'] / 1e6:,.1f} MB en memoria "
+                                           f"({proceso['bytes_compartidos'] / 1e6:,.1f} MB de archivos en caché) · "
+                                           f"{proceso['derramadas']} guardadas en disco por inactividad")
+                        
+                        if not st.session_state.metas.empty:
+                            st.write("**Metas cargadas:**")
+                            metas = st.session_state.metas
+                            for nombre, monto in zip(metas['Nombre_Meta'], metas['Monto_Objetivo']):
+                                st.write(f"- {nombre}: ${monto:,.2f}")
         
-        col1, col2 = st.columns(2)
+        elif pagina == "📊 Dashboard":
+            # Plotly se importa solo en las páginas con gráficos
+            import plotly.express as px
+            import plotly.graph_objects as go
+            
+            st.header("📊 Dashboard Financiero")
+            
+            if obtener_transacciones().empty:
+                st.warning("⚠️ No hay datos cargados. Ve a la sección 'Cargar Datos' primero.")
+                return
+            
+            df, _, agregados = obtener_vista()
+            if agregados is None:
+                st.warning("⚠️ Ninguna transacción coincide con los filtros seleccionados.")
+                return
+            
+            # Métricas principales
+            col1, col2, col3, col4 = st.columns(4)
+            
+            total_ingresos = agregados['total_ingresos']
+            total_gastos = agregados['total_gastos']
+            balance = total_ingresos - total_gastos
+            num_transacciones = agregados['num_transacciones']
+            
+            with col1:
+                st.metric("💰 Balance Total", f"${balance:,.2f}")
+            with col2:
+                st.metric("📈 Ingresos", f"${total_ingresos:,.2f}")
+            with col3:
+                st.metric("📉 Gastos", f"${total_gastos:,.2f}")
+            with col4:
+                st.metric("📝 Transacciones", num_transacciones)
+            
+            st.markdown("---")
+            
+            # Gráficos
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.subheader("📊 Gastos por Categoría")
+                por_categoria = agregados['por_categoria']
+                gastos_categoria = por_categoria.loc[por_categoria['n_gastos'] > 0, 'gastos']
+                if not gastos_categoria.empty:
+                    gastos_categoria = agrupar_top_categorias(gastos_categoria)
+                    with tramo('grafico', tipo='pie', puntos=len(gastos_categoria)):
+                        fig_pie = px.pie(
+                            values=gastos_categoria.values,
+                            names=gastos_categoria.index,
+                            title="Distribución de Gastos"
+                        )
+                        st.plotly_chart(fig_pie, use_container_width=True)
+            
+            with col2:
+                st.subheader("📈 Ingresos vs Gastos por Periodo")
+                resolucion = st.radio("Resolución:", list(RESOLUCIONES), index=2, horizontal=True, key="resolucion_dashboard")
+                por_periodo, resolucion_usada = tabla_por_resolucion(agregados, resolucion, MAX_BARRAS)
+                if resolucion_usada != resolucion:
+                    st.caption(f"Demasiados periodos para mostrar: se agrupó con resolución {resolucion_usada.lower()}")
+                
+                # Aun con resolución anual, como mucho MAX_BARRAS periodos (los más recientes)
+                if len(por_periodo) > MAX_BARRAS:
+                    por_periodo = por_periodo.iloc[-MAX_BARRAS:]
+                    st.caption(f"Se muestran los últimos {MAX_BARRAS} periodos, desde {por_periodo.index[0]}")
+                ingresos_periodo = por_periodo.loc[por_periodo['n_ingresos'] > 0, 'ingresos']
+                gastos_periodo = por_periodo.loc[por_periodo['n_gastos'] > 0, 'gastos']
+                
+                with tramo('grafico', tipo='barras', puntos=len(por_periodo)):
+                    fig_bar = go.Figure()
+                    fig_bar.add_trace(go.Bar(name='Ingresos', x=ingresos_periodo.index, y=ingresos_periodo.values))
+                    fig_bar.add_trace(go.Bar(name='Gastos', x=gastos_periodo.index, y=gastos_periodo.values))
+                    fig_bar.update_layout(title=f"Ingresos vs Gastos ({resolucion_usada})", barmode='group')
+                    st.plotly_chart(fig_bar, use_container_width=True)
+            
+            # Tabla de transacciones recientes (desde el índice temporal, sin ordenar todo)
+            st.subheader("📋 Transacciones Recientes")
+            df_display = obtener_transacciones().iloc[filas_recientes(10)]
+            df_display = df_display.assign(Fecha=df_display['Fecha'].dt.strftime('%d/%m/%Y'))
+            st.dataframe(df_display, use_container_width=True)
         
-        with col1:
-            st.subheader("1️⃣ Primera vez - Descargar Plantilla")
-            st.write("Si es tu primera vez, descarga la plantilla inicial:")
-            
-            plantilla = crear_plantilla_excel()
-            st.download_button(
-                label="📁 Descargar Plantilla Nueva",
-                data=plantilla,
-                file_name="plantilla_finanzas_inicial.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+        elif pagina == "🔍 Explorador":
+            st.header("🔍 Explorador de Transacciones")
             
-            st.info("💡 Esta plantilla incluye ejemplos e instrucciones")
+            if obtener_transacciones().empty:
+                st.warning("⚠️ No hay datos cargados. Ve a la sección 'Cargar Datos' primero.")
+                return
+            
+            col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+            with col1:
+                busqueda = st.text_input("Buscar en categoría o tipo", placeholder="Ej: Alimentación").strip()
+            with col2:
+                columna = st.selectbox("Ordenar por", COLUMNAS_ORDENABLES)
+            with col3:
+                descendente = st.checkbox("Descendente", value=True)
+            with col4:
+                tamano_pagina = st.selectbox("Filas", TAMANOS_PAGINA)
+            
+            filas = filas_explorador(busqueda, columna, descendente)
+            total_paginas = max(1, -(-len(filas) // tamano_pagina))
+            pagina_actual = st.number_input("Página", min_value=1, max_value=total_paginas, value=1, step=1)
+            
+            inicio = (pagina_actual - 1) * tamano_pagina
+            mostrar_tabla_transacciones(obtener_transacciones().iloc[filas[inicio:inicio + tamano_pagina]])
+            st.caption(f"Página {pagina_actual} de {total_paginas} · {len(filas):,} transacciones")
         
-        with col2:
-            st.subheader("2️⃣ Subir Archivo")
-            uploaded_file = st.file_uploader(
-                "Sube tu archivo Excel (con transacciones y metas):",
-                type=['xlsx', 'xls'],
-                help="Puede ser la plantilla inicial o tu archivo personal actualizado"
-            )
+        elif pagina == "🎯 Metas Financieras":
+            st.header("🎯 Gestión de Metas Financieras")
             
-            if uploaded_file is not None:
-                df_transacciones, metas_cargadas = procesar_archivo(uploaded_file)
+            col1, col2 = st.columns([1, 2])
+            
+            with col1:
+                st.subheader("➕ Agregar Nueva Meta")
                 
-                if df_transacciones is not None or metas_cargadas:
-                    # Actualizar session state
-                    if df_transacciones is not None:
-                        st.session_state.df_transacciones = df_transacciones
+                with st.form("nueva_meta"):
+                    nombre_meta = st.text_input("Nombre de la meta", placeholder="Ej: Comprar un carro")
+                    monto_meta = st.number_input("Monto objetivo ($)", min_value=0.0, step=100.0)
+                    fecha_limite = st.date_input("Fecha límite (opcional)")
+                    usar_fecha = st.checkbox("Usar fecha límite")
                     
-                    if metas_cargadas:
-                        st.session_state.metas = metas_cargadas
+                    submitted = st.form_submit_button("🎯 Agregar Meta")
                     
-                    st.session_state.archivo_cargado = True
-                    
-                    # Mostrar resumen de lo cargado
-                    if not st.session_state.df_transacciones.empty:
-                        st.write("**Vista previa de todas las transacciones (histórico + nuevas):**")
-                        # Mostrar fechas formateadas correctamente
-                        preview_df = st.session_state.df_transacciones.tail(10).copy()
-                        preview_df['Fecha'] = preview_df['Fecha'].dt.strftime('%d/%m/%Y')
-                        st.dataframe(preview_df)
-                    
-                    if st.session_state.metas:
-                        st.write("**Metas cargadas:**")
-                        for meta in st.session_state.metas:
-                            st.write(f"- {meta['nombre']}: ${meta['monto']:,.2f}")
-    
-    elif pagina == "📊 Dashboard":
-        st.header("📊 Dashboard Financiero")
-        
-        if st.session_state.df_transacciones.empty:
-            st.warning("⚠️ No hay datos cargados. Ve a la sección 'Cargar Datos' primero.")
-            return
-        
-        df = st.session_state.df_transacciones
-        
-        # Métricas principales
-        col1, col2, col3, col4 = st.columns(4)
-        
-        total_ingresos = df[df['Monto'] > 0]['Monto'].sum()
-        total_gastos = abs(df[df['Monto'] < 0]['Monto'].sum())
-        balance = total_ingresos - total_gastos
-        num_transacciones = len(df)
-        
-        with col1:
-            st.metric("💰 Balance Total", f"${balance:,.2f}")
-        with col2:
-            st.metric("📈 Ingresos", f"${total_ingresos:,.2f}")
-        with col3:
-            st.metric("📉 Gastos", f"${total_gastos:,.2f}")
-        with col4:
-            st.metric("📝 Transacciones", num_transacciones)
-        
-        st.markdown("---")
-        
-        # Gráficos
-        col1, col2 = st.columns(2)
+                    if submitted and nombre_meta and monto_meta > 0:
+                        st.session_state.metas = agregar_meta(
+                            st.session_state.metas, nombre_meta, monto_meta,
+                            fecha_limite=fecha_limite if usar_fecha else None
+                        )
+                        st.success(f"✅ Meta '{nombre_meta}' agregada correctamente!")
+                        st.info("💡 No olvides descargar tu archivo actualizado en la sección 'Descargar Datos'")
+            
+            with col2:
+                st.subheader("📋 Mis Metas Actuales")
+                
+                metas = st.session_state.metas
+                if metas.empty:
+                    st.info("No tienes metas configuradas aún. ¡Agrega tu primera meta!")
+                else:
+                    # Progreso de todas las metas de una vez (ahorro desde la creación de cada una)
+                    _, _, agregados = obtener_vista()
+                    progreso_metas = calcular_progreso_metas(metas, agregados)
+                    for i, (nombre, monto, meta) in enumerate(zip(
+                        metas['Nombre_Meta'], metas['Monto_Objetivo'], progreso_metas.itertuples()
+                    )):
+                        with st.expander(f"🎯 {nombre} - ${monto:,.2f}"):
+                            st.progress(meta.progreso / 100)
+                            st.write(f"Progreso: {meta.progreso:.1f}% (${meta.ahorro:,.2f} de ${monto:,.2f})")
+                            
+                            # Información adicional
+                            if meta.vencida:
+                                st.error("⏰ Meta vencida")
+                            elif meta.dias_restantes > 0:
+                                st.write(f"⏰ Días restantes: {meta.dias_restantes:.0f}")
+                                if not meta.alcanzada:
+                                    st.write(f"💪 Ahorro diario necesario: ${meta.ahorro_diario:.2f}")
+                            
+                            # Botón para eliminar
+                            if st.button(f"🗑️ Eliminar", key=f"eliminar_{i}"):
+                                st.session_state.metas = quitar_meta(metas, i)
+                                st.rerun()
         
-        with col1:
-            st.subheader("📊 Gastos por Categoría")
-            gastos_categoria = df[df['Monto'] < 0].groupby('Categoria')['Monto'].sum().abs()
-            if not gastos_categoria.empty:
-                fig_pie = px.pie(
-                    values=gastos_categoria.values,
-                    names=gastos_categoria.index,
-                    title="Distribución de Gastos"
+        elif pagina == "💡 Insights":
+            import plotly.express as px
+            
+            st.header("💡 Insights Financieros")
+            
+            if obtener_transacciones().empty:
+                st.warning("⚠️ No hay datos cargados. Ve a la sección 'Cargar Datos' primero.")
+                return
+            
+            df, _, agregados = obtener_vista()
+            if agregados is None:
+                st.warning("⚠️ Ninguna transacción coincide con los filtros seleccionados.")
+                return
+            insights = calcular_insights(df, st.session_state.metas, agregados)
+            
+            st.subheader("📊 Análisis Automático de tus Finanzas")
+            
+            for insight in insights:
+                st.write(f"• {insight}")
+            
+            # Análisis de tendencias
+            st.markdown("---")
+            st.subheader("📈 Tendencias Mensuales")
+            
+            # Tendencia de gastos
+            por_mes = agregados['por_mes']
+            gastos_mensuales = por_mes.loc[por_mes['n_gastos'] > 0, 'gastos']
+            if len(gastos_mensuales) > 1:
+                tendencia_gastos = gastos_mensuales.iloc[-1] - gastos_mensuales.iloc[-2]
+                if tendencia_gastos > 0:
+                    st.warning(f"📈 Tus gastos aumentaron ${tendencia_gastos:.2f} el último mes")
+                else:
+                    st.success(f"📉 Tus gastos disminuyeron ${abs(tendencia_gastos):.2f} el último mes")
+            
+            # Gráfico de tendencia (reducido a MAX_PUNTOS_LINEA puntos)
+            resolucion = st.radio("Resolución:", list(RESOLUCIONES), index=2, horizontal=True, key="resolucion_insights")
+            por_periodo, _ = tabla_por_resolucion(agregados, resolucion)
+            gastos_periodo = reducir_serie_linea(por_periodo.loc[por_periodo['n_gastos'] > 0, 'gastos'])
+            with tramo('grafico', tipo='linea', puntos=len(gastos_periodo)):
+                fig_line = px.line(
+                    x=gastos_periodo.index,
+                    y=gastos_periodo.values,
+                    title=f"Evolución de Gastos ({resolucion})",
+                    labels={'x': RESOLUCIONES[resolucion][1], 'y': 'Gastos ($)'}
                 )
-                st.plotly_chart(fig_pie, use_container_width=True)
-        
-        with col2:
-            st.subheader("📈 Ingresos vs Gastos por Mes")
-            df['Mes'] = df['Fecha'].dt.to_period('M').astype(str)
+                st.plotly_chart(fig_line, use_container_width=True)
             
-            ingresos_mes = df[df['Monto'] > 0].groupby('Mes')['Monto'].sum()
-            gastos_mes = df[df['Monto'] < 0].groupby('Mes')['Monto'].sum().abs()
+            # Ventanas y pronósticos sobre la serie diaria acumulada
+            st.markdown("---")
+            st.subheader("📆 Ventanas Móviles y Pronósticos")
             
-            fig_bar = go.Figure()
-            fig_bar.add_trace(go.Bar(name='Ingresos', x=ingresos_mes.index, y=ingresos_mes.values))
-            fig_bar.add_trace(go.Bar(name='Gastos', x=gastos_mes.index, y=gastos_mes.values))
-            fig_bar.update_layout(title="Ingresos vs Gastos Mensuales", barmode='group')
-            st.plotly_chart(fig_bar, use_container_width=True)
-        
-        # Tabla de transacciones recientes
-        st.subheader("📋 Transacciones Recientes")
-        df_display = df.sort_values('Fecha', ascending=False).head(10).copy()
-        df_display['Fecha'] = df_display['Fecha'].dt.strftime('%d/%m/%Y')
-        st.dataframe(df_display, use_container_width=True)
-    
-    elif pagina == "🎯 Metas Financieras":
-        st.header("🎯 Gestión de Metas Financieras")
-        
-        col1, col2 = st.columns([1, 2])
+            series = obtener_series()
+            moviles = gasto_movil(series)
+            pronostico = pronostico_gasto_mes(series)
+            st.caption(f"Calculado hasta el {referencia(series):%d/%m/%Y} (último día con transacciones)")
+            
+            columnas = st.columns(len(moviles.columns) + 1)
+            for columna, ventana in zip(columnas, moviles.columns):
+                columna.metric(f"💸 Gasto últimos {ventana}", f"${moviles.loc['Total', ventana]:,.2f}")
+            columnas[-1].metric(
+                f"🔮 Pronóstico cierre {pronostico['mes']}", f"${pronostico['pronostico']:,.2f}",
+                help=f"${pronostico['gastado']:,.2f} gastados en {pronostico['dias_transcurridos']} de "
+                     f"{pronostico['dias_mes']} días, más ${pronostico['ritmo_diario']:,.2f} diarios hasta fin de mes"
+            )
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                st.write("**Gasto por categoría en ventanas móviles:**")
+                st.dataframe(moviles.round(2))
+            with col2:
+                st.write("**Mes actual frente al mes y el año anteriores (mismos días):**")
+                st.dataframe(variaciones_por_categoria(series).round(1))
+            
+            metas = st.session_state.metas
+            if not metas.empty:
+                st.write("**Fecha estimada para completar tus metas** (al ritmo de ahorro de los últimos 90 días):")
+                estimaciones = pronostico_metas(series, metas, agregados)
+                for nombre, limite, meta in zip(metas['Nombre_Meta'], metas['Fecha_Limite'], estimaciones.itertuples()):
+                    if pd.isna(meta.fecha_estimada):
+                        st.write(f"• ⚠️ {nombre}: con el ritmo actual (${meta.ritmo_diario:,.2f} diarios) no se completa")
+                    elif pd.isna(limite) or meta.a_tiempo:
+                        st.write(f"• ✅ {nombre}: hacia el {meta.fecha_estimada:%d/%m/%Y}")
+                    else:
+                        st.write(f"• ⏰ {nombre}: hacia el {meta.fecha_estimada:%d/%m/%Y}, después de la fecha límite ({limite:%d/%m/%Y})")
+            
+            # Detección sobre todo el histórico de la vista
+            st.markdown("---")
+            st.subheader("🔎 Movimientos Inusuales y Pagos Recurrentes")
+            
+            detecciones = obtener_detecciones()
+            anomalias = detecciones['anomalias']
+            recurrentes = detecciones['recurrentes']
+            
+            col1, col2 = st.columns(2)
+            with col1:
+                st.write(f"**🚨 {len(anomalias):,} transacciones inusuales para su categoría**")
+                if not anomalias.empty:
+                    st.dataframe(
+                        anomalias.head(MAX_FILAS_DETECCION).assign(
+                            Fecha=lambda tabla: tabla['Fecha'].dt.strftime('%d/%m/%Y'), Z=lambda tabla: tabla['Z'].round(1)
+                        ),
+                        hide_index=True
+                    )
+                    st.caption("Z: cuántas desviaciones (robustas) se aleja el monto de la mediana de la categoría")
+            with col2:
+                st.write(f"**🔁 {len(recurrentes):,} pagos recurrentes detectados**")
+                if not recurrentes.empty:
+                    st.dataframe(
+                        recurrentes.head(MAX_FILAS_DETECCION).assign(
+                            Ultima=lambda tabla: tabla['Ultima'].dt.strftime('%d/%m/%Y'),
+                            Proxima=lambda tabla: tabla['Proxima'].dt.strftime('%d/%m/%Y')
+                        ),
+                        hide_index=True
+                    )
         
-        with col1:
-            st.subheader("➕ Agregar Nueva Meta")
+        elif pagina == "💾 Descargar Datos":
+            st.header("💾 Descargar y Gestionar Datos")
             
-            with st.form("nueva_meta"):
-                nombre_meta = st.text_input("Nombre de la meta", placeholder="Ej: Comprar un carro")
-                monto_meta = st.number_input("Monto objetivo ($)", min_value=0.0, step=100.0)
-                fecha_limite = st.date_input("Fecha límite (opcional)")
-                usar_fecha = st.checkbox("Usar fecha límite")
-                
-                submitted = st.form_submit_button("🎯 Agregar Meta")
+            st.info("🔄 **¡IMPORTANTE!** Siempre descarga tu archivo actualizado después de hacer cambios para mantener tu información sincronizada.")
+            
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                st.subheader("📊 Tu Archivo Personal")
+                st.write("Descarga tu archivo con:")
+                st.write("• 📚 Todo tu histórico de transacciones")
+                st.write("• 🎯 Todas tus metas guardadas")
+                st.write("• 📝 Hoja vacía para nuevas transacciones")
                 
-                if submitted and nombre_meta and monto_meta > 0:
-                    nueva_meta = {
-                        'nombre': nombre_meta,
-                        'monto': monto_meta,
-                        'fecha_limite': fecha_limite if usar_fecha else None,
-                        'fecha_creacion': datetime.now().date()
-                    }
-                    st.session_state.metas.append(nueva_meta)
-                    st.success(f"✅ Meta '{nombre_meta}' agregada correctamente!")
-                    st.info("💡 No olvides descargar tu archivo actualizado en la sección 'Descargar Datos'")
-        
-        with col2:
-            st.subheader("📋 Mis Metas Actuales")
-            
-            if not st.session_state.metas:
-                st.info("No tienes metas configuradas aún. ¡Agrega tu primera meta!")
-            else:
-                for i, meta in enumerate(st.session_state.metas):
-                    with st.expander(f"🎯 {meta['nombre']} - ${meta['monto']:,.2f}"):
-                    # Calcular progreso
-                        if not st.session_state.df_transacciones.empty:
-                            balance_actual = st.session_state.df_transacciones['Monto'].sum()
-                            ahorro_actual = max(0, balance_actual)
-                            progreso = min(100, (ahorro_actual / meta['monto']) * 100)
-                        else:
-                            ahorro_actual = 0
-                            progreso = 0
+                if obtener_transacciones().empty and st.session_state.metas.empty:
+                    st.warning("⚠️ No hay datos para descargar. Carga datos primero.")
+                else:
+                    formato = st.radio(
+                        "Formato:",
+                        list(FORMATOS_EXPORTACION),
+                        help="Para históricos muy grandes CSV o Parquet se generan mucho más rápido"
+                    )
+                    _, extension, mime = FORMATOS_EXPORTACION[formato]
                     
-                    # Mostrar progreso
-                    st.progress(progreso / 100)
-                    st.write(f"Progreso: {progreso:.1f}% (${ahorro_actual:,.2f} de ${meta['monto']:,.2f})")
+                    # El archivo solo se genera cuando el usuario lo pide
+                    archivo_personal = exportacion_preparada(formato)
+                    if archivo_personal is None and st.button("⚙️ Preparar archivo"):
+                        with st.spinner("Generando archivo..."):
+                            archivo_personal = obtener_exportacion(formato)
                     
-                    # Información adicional
-                    if meta.get('fecha_limite'):
-                        dias_restantes = (meta['fecha_limite'] - datetime.now().date()).days
-                        if dias_restantes > 0:
-                            st.write(f"⏰ Días restantes: {dias_restantes}")
-                            if ahorro_actual < meta['monto']:
-                                faltante = meta['monto'] - ahorro_actual
-                                ahorro_diario = faltante / dias_restantes
-                                st.write(f"💪 Ahorro diario necesario: ${ahorro_diario:.2f}")
-                        else:
-                            st.error("⏰ Meta vencida")
+                    if archivo_personal is not None:
+                        fecha_actual = datetime.now().strftime("%Y%m%d_%H%M")
+                        
+                        st.download_button(
+                            label="📥 Descargar Mi Archivo Personal",
+                            data=archivo_personal,
+                            file_name=f"mis_finanzas_{fecha_actual}.{extension}",
+                            mime=mime
+                        )
+                        
+                        st.success("✅ Este archivo incluye tu histórico completo")
+                    else:
+                        st.caption("Prepara el archivo para descargar tus datos actuales")
+            
+            with col2:
+                st.subheader("📋 Resumen de Datos")
+                
+                # Estadísticas de transacciones
+                if not obtener_transacciones().empty:
+                    agregados = obtener_agregados()
+                    st.metric("📊 Total Transacciones", agregados['num_transacciones'])
                     
-                    # Botón para eliminar
-                    if st.button(f"🗑️ Eliminar", key=f"eliminar_{i}"):
-                        st.session_state.metas.pop(i)
-                        st.rerun()
-    
-    elif pagina == "💡 Insights":
-        st.header("💡 Insights Financieros")
-        
-        if st.session_state.df_transacciones.empty:
-            st.warning("⚠️ No hay datos cargados. Ve a la sección 'Cargar Datos' primero.")
-            return
-        
-        insights = calcular_insights(st.session_state.df_transacciones, st.session_state.metas)
-        
-        st.subheader("📊 Análisis Automático de tus Finanzas")
-        
-        for insight in insights:
-            st.write(f"• {insight}")
-        
-        # Análisis de tendencias
-        st.markdown("---")
-        st.subheader("📈 Tendencias Mensuales")
-        
-        df = st.session_state.df_transacciones
-        df['Mes'] = df['Fecha'].dt.to_period('M').astype(str)
-        
-        # Tendencia de gastos
-        gastos_mensuales = df[df['Monto'] < 0].groupby('Mes')['Monto'].sum().abs()
-        if len(gastos_mensuales) > 1:
-            tendencia_gastos = gastos_mensuales.iloc[-1] - gastos_mensuales.iloc[-2]
-            if tendencia_gastos > 0:
-                st.warning(f"📈 Tus gastos aumentaron ${tendencia_gastos:.2f} el último mes")
-            else:
-                st.success(f"📉 Tus gastos disminuyeron ${abs(tendencia_gastos):.2f} el último mes")
-        
-        # Gráfico de tendencia
-        fig_line = px.line(
-            x=gastos_mensuales.index,
-            y=gastos_mensuales.values,
-            title="Evolución de Gastos Mensuales",
-            labels={'x': 'Mes', 'y': 'Gastos ($)'}
-        )
-        st.plotly_chart(fig_line, use_container_width=True)
-    
-    elif pagina == "💾 Descargar Datos":
-        st.header("💾 Descargar y Gestionar Datos")
-        
-        st.info("🔄 **¡IMPORTANTE!** Siempre descarga tu archivo actualizado después de hacer cambios para mantener tu información sincronizada.")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.subheader("📊 Tu Archivo Personal")
-            st.write("Descarga tu archivo con:")
-            st.write("• 📚 Todo tu histórico de transacciones")
-            st.write("• 🎯 Todas tus metas guardadas")
-            st.write("• 📝 Hoja vacía para nuevas transacciones")
-            
-            if st.session_state.df_transacciones.empty and not st.session_state.metas:
-                st.warning("⚠️ No hay datos para descargar. Carga datos primero.")
-            else:
-                archivo_personal = crear_excel_con_datos_actuales()
-                fecha_actual = datetime.now().strftime("%Y%m%d_%H%M")
+                    fecha_min = agregados['fecha_min'].strftime('%d/%m/%Y')
+                    fecha_max = agregados['fecha_max'].strftime('%d/%m/%Y')
+                    st.write(f"📅 Período: {fecha_min} - {fecha_max}")
+                    
+                    balance = agregados['balance']
+                    st.metric("💰 Balance Total", f"${balance:,.2f}")
+                else:
+                    st.info("Sin transacciones cargadas")
                 
-                st.download_button(
-                    label="📥 Descargar Mi Archivo Personal",
-                    data=archivo_personal,
-                    file_name=f"mis_finanzas_{fecha_actual}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
+                # Estadísticas de metas
+                st.metric("🎯 Metas Activas", len(st.session_state.metas))
                 
-                st.success("✅ Este archivo incluye tu histórico completo")
-        
-        with col2:
-            st.subheader("📋 Resumen de Datos")
+                if not st.session_state.metas.empty:
+                    monto_total_metas = st.session_state.metas['Monto_Objetivo'].sum()
+                    st.metric("🎯 Monto Total Metas", f"${monto_total_metas:,.2f}")
             
-            # Estadísticas de transacciones
-            if not st.session_state.df_transacciones.empty:
-                df = st.session_state.df_transacciones
-                st.metric("📊 Total Transacciones", len(df))
-                
-                fecha_min = df['Fecha'].min().strftime('%d/%m/%Y')
-                fecha_max = df['Fecha'].max().strftime('%d/%m/%Y')
-                st.write(f"📅 Período: {fecha_min} - {fecha_max}")
-                
-                balance = df['Monto'].sum()
-                st.metric("💰 Balance Total", f"${balance:,.2f}")
-            else:
-                st.info("Sin transacciones cargadas")
+            st.markdown("---")
+            st.subheader("🔧 Gestión de Datos")
             
-            # Estadísticas de metas
-            st.metric("🎯 Metas Activas", len(st.session_state.metas))
+            col1, col2 = st.columns(2)
             
-            if st.session_state.metas:
-                monto_total_metas = sum(meta['monto'] for meta in st.session_state.metas)
-                st.metric("🎯 Monto Total Metas", f"${monto_total_metas:,.2f}")
-        
-        st.markdown("---")
-        st.subheader("🔧 Gestión de Datos")
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.write("**🗑️ Limpiar Datos**")
-            if st.button("🗑️ Borrar Todas las Transacciones", type="secondary"):
-                if st.button("⚠️ Confirmar Borrado de Transacciones"):
-                    st.session_state.df_transacciones = pd.DataFrame()
-                    st.success("✅ Transacciones borradas")
-                    st.rerun()
-        
-        with col2:
-            st.write("**🎯 Gestión de Metas**")
-            if st.button("🗑️ Borrar Todas las Metas", type="secondary"):
-                if st.button("⚠️ Confirmar Borrado de Metas"):
-                    st.session_state.metas = []
-                    st.success("✅ Metas borradas")
-                    st.rerun()
+            with col1:
+                st.write("**🗑️ Limpiar Datos**")
+                if st.button("🗑️ Borrar Todas las Transacciones", type="secondary"):
+                    if st.button("⚠️ Confirmar Borrado de Transacciones"):
+                        establecer_transacciones(pd.DataFrame())
+                        st.session_state.ultima_carga = None
+                        # Solo el histórico de este usuario, no el de otras sesiones
+                        if almacen_activo():
+                            borrar_almacen(directorio_almacen())
+                        st.success("✅ Transacciones borradas")
+                        st.rerun()
+            
+            with col2:
+                st.write("**🎯 Gestión de Metas**")
+                if st.button("🗑️ Borrar Todas las Metas", type="secondary"):
+                    if st.button("⚠️ Confirmar Borrado de Metas"):
+                        st.session_state.metas = tabla_metas()
+                        st.success("✅ Metas borradas")
+                        st.rerun()
     
     # Footer
     st.markdown("---")
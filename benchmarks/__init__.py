@@ -0,0 +1,3 @@
+"""
+Benchmarks de la app con datos sintéticos (ver benchmarks/ejecutar.py)
+"""
@@ -0,0 +1,87 @@
+"""
+Presupuesto de arranque de la app
+
+Mide, en procesos nuevos, cuánto tarda el primer render de la página inicial
+(Cargar Datos) y el de una segunda sesión en el mismo proceso, y comprueba
+que no se importaron los módulos que solo necesitan otras páginas. Termina con
+código 1 si se supera el presupuesto, para poder usarlo en integración continua.
+Los tiempos incluyen la sobrecarga fija de AppTest: sirven para comparar
+versiones más que como valor absoluto.
+
+Uso:
+    python -m benchmarks.arranque [--presupuesto 1.0] [--repeticiones 5] [--salida arranque.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RUTA_APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app_principal.py')
+
+# Segundos para el primer render de una sesión nueva en un proceso nuevo
+PRESUPUESTO_PRIMER_RENDER = 1.0
+
+# Módulos que la página inicial no debe cargar (gráficos y motores de Excel)
+MODULOS_DIFERIDOS = ['plotly.express', 'xlsxwriter', 'openpyxl', 'xlrd', 'st_aggrid']
+
+# Se ejecuta en un proceso nuevo; Streamlit se importa antes de medir porque
+# en el servidor ya está cargado cuando llega la primera sesión
+_SCRIPT_MEDICION = '''
+import json, sys, time
+import streamlit
+from streamlit.testing.v1 import AppTest
+
+inicio = time.perf_counter()
+AppTest.from_file(sys.argv[1], default_timeout=120).run()
+primer_render = time.perf_counter() - inicio
+cargados = [m for m in sys.argv[2:] if m in sys.modules]
+
+inicio = time.perf_counter()
+AppTest.from_file(sys.argv[1], default_timeout=120).run()
+segunda_sesion = time.perf_counter() - inicio
+
+print(json.dumps({'primer_render': primer_render, 'segunda_sesion': segunda_sesion, 'modulos_cargados': cargados}))
+'''
+
+def medir_arranque(ruta_app=RUTA_APP):
+    """Medición en un proceso nuevo: tiempos en segundos y módulos diferidos que se cargaron"""
+    salida = subprocess.run(
+        [sys.executable, '-c', _SCRIPT_MEDICION, ruta_app, *MODULOS_DIFERIDOS],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.arranque', description="Medir el arranque de la app frente a un presupuesto")
+    parser.add_argument('--presupuesto', type=float, default=PRESUPUESTO_PRIMER_RENDER,
+                        help="Segundos máximos (mediana) para el primer render")
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--salida', help="Archivo JSON de resultados")
+    args = parser.parse_args(argv)
+    
+    mediciones = [medir_arranque() for _ in range(args.repeticiones)]
+    primer_render = statistics.median(m['primer_render'] for m in mediciones)
+    segunda_sesion = statistics.median(m['segunda_sesion'] for m in mediciones)
+    cargados = sorted({modulo for m in mediciones for modulo in m['modulos_cargados']})
+    
+    print(f"Primer render (mediana de {args.repeticiones}): {primer_render:.3f}s · presupuesto {args.presupuesto:.3f}s")
+    print(f"Segunda sesión en el mismo proceso: {segunda_sesion:.3f}s")
+    if cargados:
+        print(f"Módulos diferidos cargados en la página inicial: {', '.join(cargados)}")
+    
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as destino:
+            json.dump({
+                'presupuesto': args.presupuesto,
+                'primer_render': primer_render,
+                'segunda_sesion': segunda_sesion,
+                'modulos_cargados': cargados,
+                'mediciones': mediciones
+            }, destino, indent=2)
+    
+    return 0 if primer_render <= args.presupuesto and not cargados else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
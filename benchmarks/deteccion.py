@@ -0,0 +1,73 @@
+"""
+Presupuesto de la detección de anomalías y pagos recurrentes
+
+La página de Insights ejecuta la detección en línea, así que sobre el
+histórico completo tiene que tardar bastante menos de un segundo. Genera en
+memoria transacciones con pagos periódicos inyectados, mide las dos
+detecciones y comprueba que se encuentran los pagos inyectados. Termina con
+código 1 si se supera el presupuesto o falta alguno.
+
+Uso:
+    python -m benchmarks.deteccion [--filas 1000000] [--presupuesto 1.0] [--repeticiones 5]
+"""
+import argparse
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generador import CATEGORIAS_INGRESO, pagos_recurrentes, generar_transacciones, nombres_categorias
+from finanzas.agregados import calcular_columnas_derivadas
+from finanzas.deteccion import detectar_anomalias, detectar_recurrentes
+from finanzas.ingesta import normalizar_tipos_transacciones
+
+# Segundos para las dos detecciones juntas sobre --filas transacciones
+PRESUPUESTO_DETECCION = 1.0
+
+def preparar(filas, recurrentes, semilla, categorias=12):
+    """Transacciones normalizadas, sus columnas derivadas y los montos inyectados"""
+    df = generar_transacciones(filas, categorias=categorias, formatos_fecha=['excel'], semilla=semilla, recurrentes=recurrentes)
+    df = normalizar_tipos_transacciones(df.assign(Fecha=pd.to_datetime(df['Fecha'])))
+    es_ingreso = np.isin(np.array(nombres_categorias(categorias), dtype=object), CATEGORIAS_INGRESO)
+    inyectados = np.unique(pagos_recurrentes(recurrentes, es_ingreso, semilla, 4 * 365)[2])
+    return df, calcular_columnas_derivadas(df), inyectados
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.deteccion', description="Medir la detección frente a un presupuesto")
+    parser.add_argument('--filas', type=int, default=1_000_000)
+    parser.add_argument('--recurrentes', type=int, default=12, help="Pagos periódicos inyectados")
+    parser.add_argument('--presupuesto', type=float, default=PRESUPUESTO_DETECCION,
+                        help="Segundos máximos (mediana) para las dos detecciones")
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args(argv)
+    
+    df, derivadas, inyectados = preparar(args.filas, args.recurrentes, args.semilla)
+    
+    tiempos = {'anomalias': [], 'recurrentes': []}
+    for _ in range(args.repeticiones):
+        inicio = time.perf_counter()
+        anomalias = detectar_anomalias(df)
+        tiempos['anomalias'].append(time.perf_counter() - inicio)
+        inicio = time.perf_counter()
+        recurrentes = detectar_recurrentes(df, derivadas)
+        tiempos['recurrentes'].append(time.perf_counter() - inicio)
+    medianas = {nombre: statistics.median(valores) for nombre, valores in tiempos.items()}
+    total = sum(medianas.values())
+    
+    # Los datos sintéticos tienen cientos de montos al azar por día, que tapan
+    # los tramos de montos parecidos: la comprobación usa montos exactos
+    exactos = detectar_recurrentes(df, derivadas, tolerancia_monto=0)
+    encontrados = np.isin(inyectados, exactos['Monto'].round(2).to_numpy())
+    print(f"{args.filas:,} transacciones · mediana de {args.repeticiones} repeticiones")
+    print(f"  anomalías:   {medianas['anomalias']:.3f}s ({len(anomalias):,} marcadas)")
+    print(f"  recurrentes: {medianas['recurrentes']:.3f}s ({len(recurrentes):,} detectados, "
+          f"con montos exactos {encontrados.sum()} de {len(inyectados)} inyectados)")
+    print(f"  total:       {total:.3f}s · presupuesto {args.presupuesto:.3f}s")
+    
+    return 0 if total <= args.presupuesto and encontrados.all() else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
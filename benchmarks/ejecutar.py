@@ -0,0 +1,217 @@
+"""
+Benchmarks de las etapas de cálculo de la app
+
+Para cada tamaño genera (o reutiliza) un libro sintético y mide tiempo y
+memoria pico de cada etapa: lectura, columnas derivadas, agregados del
+Dashboard, insights, índice y filtro, detección de anomalías y pagos
+recurrentes, y exportaciones. Los resultados se guardan como JSON para
+comparar ejecuciones.
+
+Uso:
+    python -m benchmarks.ejecutar [--tamanos 1000 10000] [--salida resultados.json]
+    python -m benchmarks.ejecutar --comparar base.json --salida nuevo.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.generador import FORMATOS_FECHA_POR_DEFECTO, obtener_archivo
+from finanzas.agregados import (
+    calcular_agregados,
+    calcular_columnas_derivadas,
+    construir_indice_temporal,
+    filas_filtradas,
+)
+from finanzas.deteccion import detectar_anomalias, detectar_recurrentes
+from finanzas.exportacion import crear_excel_con_datos_actuales, exportar_historico_csv
+from finanzas.ingesta import leer_archivo_financiero
+from finanzas.insights import calcular_insights
+
+TAMANOS_POR_DEFECTO = [1_000, 10_000, 100_000, 1_000_000]
+DIRECTORIO_DATOS = os.path.join(tempfile.gettempdir(), 'finanzas_benchmarks')
+
+def _ingesta(ctx):
+    resultado = leer_archivo_financiero(ctx['contenido'], ctx['nombre'])
+    ctx['df'] = resultado['transacciones']
+    ctx['metas'] = resultado['metas']
+
+def _derivadas(ctx):
+    ctx['derivadas'] = calcular_columnas_derivadas(ctx['df'])
+
+def _agregados(ctx):
+    ctx['agregados'] = calcular_agregados(ctx['df'], ctx['derivadas'])
+
+def _insights(ctx):
+    calcular_insights(ctx['df'], ctx['metas'], ctx['agregados'])
+
+def _indice(ctx):
+    ctx['indice'] = construir_indice_temporal(ctx['df'])
+
+def _filtro(ctx):
+    hasta = ctx['agregados']['fecha_max']
+    filas = filas_filtradas(ctx['indice'], hasta - pd.Timedelta(days=30), hasta)
+    ctx['df'].iloc[filas]
+
+def _deteccion(ctx):
+    detectar_anomalias(ctx['df'])
+    detectar_recurrentes(ctx['df'], ctx['derivadas'])
+
+def _exportar_excel(ctx):
+    crear_excel_con_datos_actuales(ctx['df'], ctx['metas'])
+
+def _exportar_csv(ctx):
+    exportar_historico_csv(ctx['df'])
+
+# Etapas en orden de ejecución: cada una lee y deja resultados en ctx
+ETAPAS = [
+    ('ingesta', _ingesta),
+    ('columnas_derivadas', _derivadas),
+    ('agregados', _agregados),
+    ('insights', _insights),
+    ('indice_temporal', _indice),
+    ('filtro_30_dias', _filtro),
+    ('deteccion', _deteccion),
+    ('exportar_excel', _exportar_excel),
+    ('exportar_csv', _exportar_csv),
+]
+
+def medir(funcion, ctx, repeticiones=1, memoria=True):
+    """
+    Ejecutar una etapa y devolver (mejor tiempo en segundos, pico de memoria en MB)
+    El tiempo se mide sin tracemalloc (que ralentiza el código Python); la
+    memoria, en una ejecución aparte con tracemalloc activo
+    """
+    tiempos = []
+    for _ in range(repeticiones):
+        gc.collect()
+        inicio = time.perf_counter()
+        funcion(ctx)
+        tiempos.append(time.perf_counter() - inicio)
+    
+    pico_mb = None
+    if memoria:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            base = tracemalloc.get_traced_memory()[0]
+            funcion(ctx)
+            pico_mb = (tracemalloc.get_traced_memory()[1] - base) / 1e6
+        finally:
+            tracemalloc.stop()
+    return min(tiempos), pico_mb
+
+def ejecutar(tamanos, directorio=DIRECTORIO_DATOS, repeticiones=1, memoria=True,
+             etapas=None, formato='xlsx', **parametros):
+    """Medir todas las etapas para cada tamaño; devuelve una lista de registros"""
+    registros = []
+    for filas in tamanos:
+        inicio = time.perf_counter()
+        ruta = obtener_archivo(directorio, filas, formato, **parametros)
+        print(f"[{filas:>9,} filas] datos listos en {time.perf_counter() - inicio:.1f}s ({ruta})", file=sys.stderr)
+        
+        with open(ruta, 'rb') as archivo:
+            ctx = {'contenido': archivo.read(), 'nombre': ruta}
+        for nombre, funcion in ETAPAS:
+            if etapas and nombre not in etapas:
+                continue
+            segundos, pico_mb = medir(funcion, ctx, repeticiones, memoria)
+            registros.append({
+                'filas': filas,
+                'etapa': nombre,
+                'segundos': round(segundos, 6),
+                'pico_mb': None if pico_mb is None else round(pico_mb, 3)
+            })
+            memoria_texto = '' if pico_mb is None else f" · pico {pico_mb:,.1f} MB"
+            print(f"[{filas:>9,} filas] {nombre:<20} {segundos:8.3f}s{memoria_texto}", file=sys.stderr)
+    return registros
+
+def entorno():
+    """Versiones y máquina, para no comparar ejecuciones de entornos distintos sin saberlo"""
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'plataforma': platform.platform(),
+        'procesadores': os.cpu_count()
+    }
+
+def comparar(base, actual):
+    """Tabla de tiempos y memoria de actual frente a base, por tamaño y etapa"""
+    previos = {(r['filas'], r['etapa']): r for r in base['resultados']}
+    lineas = [f"{'filas':>9} {'etapa':<20} {'base s':>9} {'actual s':>9} {'cambio':>8} {'base MB':>9} {'actual MB':>9}"]
+    for registro in actual['resultados']:
+        previo = previos.get((registro['filas'], registro['etapa']))
+        if previo is None:
+            continue
+        cambio = registro['segundos'] / previo['segundos'] if previo['segundos'] else float('nan')
+        lineas.append(
+            f"{registro['filas']:>9,} {registro['etapa']:<20} {previo['segundos']:>9.3f} "
+            f"{registro['segundos']:>9.3f} {cambio:>7.2f}x "
+            f"{previo['pico_mb'] if previo['pico_mb'] is not None else '-':>9} "
+            f"{registro['pico_mb'] if registro['pico_mb'] is not None else '-':>9}"
+        )
+    return '\n'.join(lineas)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.ejecutar', description="Medir las etapas de la app con datos sintéticos")
+    parser.add_argument('--tamanos', type=int, nargs='+', default=TAMANOS_POR_DEFECTO, help="Filas de cada ejecución")
+    parser.add_argument('--categorias', type=int, default=12, help="Número de categorías distintas")
+    parser.add_argument('--formatos-fecha', nargs='+', default=list(FORMATOS_FECHA_POR_DEFECTO),
+                        help="Formatos strftime de las fechas, o 'excel' (fecha nativa) y 'serial' (número de Excel)")
+    parser.add_argument('--sucias', type=float, default=0.0, help="Proporción de filas con celdas vacías o inválidas")
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--recurrentes', type=int, default=0, help="Pagos periódicos incluidos en los datos")
+    parser.add_argument('--formato', choices=['xlsx', 'csv'], default='xlsx', help="Formato del archivo de entrada")
+    parser.add_argument('--etapas', nargs='+', choices=[nombre for nombre, _ in ETAPAS], help="Medir solo estas etapas")
+    parser.add_argument('--repeticiones', type=int, default=1, help="Se guarda el mejor tiempo")
+    parser.add_argument('--sin-memoria', action='store_true', help="No medir memoria pico (más rápido)")
+    parser.add_argument('--datos', default=DIRECTORIO_DATOS, help="Carpeta donde se guardan los archivos generados")
+    parser.add_argument('--salida', help="Archivo JSON de resultados")
+    parser.add_argument('--comparar', help="JSON de una ejecución anterior para comparar")
+    args = parser.parse_args(argv)
+    
+    parametros = {
+        'categorias': args.categorias,
+        'formatos_fecha': args.formatos_fecha,
+        'sucias': args.sucias,
+        'semilla': args.semilla
+    }
+    # Solo se agrega si se pide, para reutilizar los archivos ya generados
+    if args.recurrentes:
+        parametros['recurrentes'] = args.recurrentes
+    resultados = ejecutar(
+        args.tamanos, args.datos, args.repeticiones, not args.sin_memoria,
+        args.etapas, args.formato, **parametros
+    )
+    informe = {
+        'entorno': entorno(),
+        'parametros': dict(parametros, formato=args.formato, repeticiones=args.repeticiones),
+        'resultados': resultados
+    }
+    
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as destino:
+            json.dump(informe, destino, ensure_ascii=False, indent=2)
+        print(f"Resultados guardados en {args.salida}", file=sys.stderr)
+    else:
+        json.dump(informe, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as origen:
+            print(comparar(json.load(origen), informe))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+Generador determinista de archivos de finanzas sintéticos
+
+Produce libros con la misma estructura que la plantilla (hojas Transacciones,
+Historico y Metas) para medir la app con volúmenes arbitrarios. Con la misma
+semilla y los mismos parámetros el resultado es idéntico entre ejecuciones.
+"""
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import xlsxwriter
+except ImportError:  # Sin xlsxwriter se escribe con openpyxl (mucho más lento)
+    xlsxwriter = None
+
+# Categorías realistas; si se piden más se completan con nombres numerados
+CATEGORIAS_INGRESO = ['Salario', 'Freelance', 'Inversiones']
+CATEGORIAS_GASTO = [
+    'Alimentación', 'Transporte', 'Vivienda', 'Entretenimiento', 'Salud',
+    'Educación', 'Ropa', 'Servicios', 'Restaurantes', 'Viajes', 'Mascotas',
+    'Regalos', 'Tecnología', 'Seguros', 'Impuestos'
+]
+
+# Formatos de fecha admitidos: códigos strftime más dos especiales
+# 'excel' = celda de fecha nativa · 'serial' = número de serie de Excel
+FORMATOS_FECHA_POR_DEFECTO = ('%d/%m/%Y',)
+FECHA_BASE_EXCEL = pd.Timestamp('1899-12-30')
+
+# Tipos de celda sucia que se inyectan con la proporción indicada
+TIPOS_SUCIEDAD = ['fecha_vacia', 'fecha_invalida', 'monto_texto', 'categoria_espacios', 'monto_vacio']
+
+def nombres_categorias(cantidad):
+    """Lista de categorías: las de ingreso primero y después las de gasto"""
+    base = CATEGORIAS_INGRESO + CATEGORIAS_GASTO
+    extra = [f"Categoria {i}" for i in range(len(base) + 1, cantidad + 1)]
+    return (base + extra)[:max(cantidad, 2)]
+
+def _formatear_fechas(fechas, formatos, rng):
+    """Fechas como valores de celda, repartiendo las filas entre los formatos"""
+    valores = np.empty(len(fechas), dtype=object)
+    eleccion = rng.integers(0, len(formatos), len(fechas))
+    for i, formato in enumerate(formatos):
+        mascara = eleccion == i
+        if not mascara.any():
+            continue
+        seleccion = fechas[mascara]
+        if formato == 'excel':
+            valores[mascara] = seleccion.to_pydatetime()
+        elif formato == 'serial':
+            valores[mascara] = ((seleccion - FECHA_BASE_EXCEL) / pd.Timedelta(days=1)).to_numpy(dtype='float64')
+        else:
+            valores[mascara] = seleccion.strftime(formato).to_numpy(dtype=object)
+    return valores
+
+def _ensuciar(df, proporcion, rng):
+    """Reemplazar una fracción de las filas por valores que la app debe tolerar"""
+    sucias = np.flatnonzero(rng.random(len(df)) < proporcion)
+    tipos = rng.integers(0, len(TIPOS_SUCIEDAD), len(sucias))
+    fechas = df['Fecha'].to_numpy(dtype=object, copy=True)
+    categorias = df['Categoria'].to_numpy(dtype=object, copy=True)
+    montos = df['Monto'].to_numpy(dtype=object, copy=True)
+    for fila, tipo in zip(sucias, tipos):
+        nombre = TIPOS_SUCIEDAD[tipo]
+        if nombre == 'fecha_vacia':
+            fechas[fila] = None
+        elif nombre == 'fecha_invalida':
+            fechas[fila] = 'pendiente'
+        elif nombre == 'monto_texto':
+            montos[fila] = 'N/A'
+        elif nombre == 'categoria_espacios':
+            categorias[fila] = f"  {categorias[fila].lower()} "
+        else:
+            montos[fila] = None
+    return df.assign(Fecha=fechas, Categoria=categorias, Monto=montos)
+
+# Intervalos (en días) de los pagos recurrentes que se pueden inyectar
+INTERVALOS_RECURRENTES = [7, 14, 30, 91, 365]
+
+def pagos_recurrentes(cantidad, es_ingreso, semilla, dias):
+    """
+    Series de pagos de monto fijo a intervalos regulares (±1 día), con su
+    propio generador para no alterar el resto de los datos de la semilla
+    """
+    rng = np.random.default_rng(semilla + 2)
+    gastos = np.flatnonzero(~es_ingreso)
+    fechas, codigos, montos = [], [], []
+    for _ in range(cantidad):
+        intervalo = rng.choice(INTERVALOS_RECURRENTES)
+        primero = rng.integers(0, intervalo)
+        pasos = np.arange(primero, dias, intervalo) + rng.integers(-1, 2, len(range(primero, dias, intervalo)))
+        pasos = np.clip(pasos, 0, dias - 1)
+        fechas.append(pasos)
+        codigos.append(np.full(len(pasos), rng.choice(gastos)))
+        montos.append(np.full(len(pasos), -np.round(rng.uniform(5, 500), 2)))
+    if not fechas:
+        return np.array([], dtype='int64'), np.array([], dtype='int64'), np.array([])
+    return np.concatenate(fechas), np.concatenate(codigos), np.concatenate(montos)
+
+def generar_transacciones(filas, categorias=12, formatos_fecha=FORMATOS_FECHA_POR_DEFECTO,
+                          sucias=0.0, semilla=0, inicio='2020-01-01', dias=4 * 365, recurrentes=0):
+    """
+    Transacciones sintéticas ordenadas por fecha
+    categorias: número de categorías distintas (con frecuencias tipo Zipf)
+    formatos_fecha: formatos en los que se escriben las fechas, mezclados al azar
+    sucias: proporción de filas con alguna celda vacía o inválida
+    recurrentes: número de pagos periódicos (suscripciones, alquiler...) incluidos
+    en el total de filas
+    """
+    rng = np.random.default_rng(semilla)
+    nombres = np.array(nombres_categorias(categorias), dtype=object)
+    es_ingreso = np.isin(nombres, CATEGORIAS_INGRESO)
+    
+    # Pocas categorías concentran la mayoría de las filas, como en datos reales
+    dias_recurrentes, codigos_recurrentes, montos_recurrentes = pagos_recurrentes(
+        recurrentes, es_ingreso, semilla, dias
+    )
+    dias_recurrentes, codigos_recurrentes, montos_recurrentes = (
+        dias_recurrentes[:filas], codigos_recurrentes[:filas], montos_recurrentes[:filas]
+    )
+    aleatorias = filas - len(dias_recurrentes)
+    
+    pesos = 1.0 / np.arange(1, len(nombres) + 1)
+    pesos[es_ingreso] *= 0.3
+    codigos = rng.choice(len(nombres), size=aleatorias, p=pesos / pesos.sum())
+    ingreso = es_ingreso[codigos]
+    
+    desplazamientos = rng.integers(0, dias, aleatorias)
+    montos = np.round(rng.lognormal(mean=3.5, sigma=1.0, size=aleatorias), 2)
+    montos = np.where(ingreso, montos * 20, -montos)
+    if recurrentes:
+        desplazamientos = np.concatenate([desplazamientos, dias_recurrentes])
+        codigos = np.concatenate([codigos, codigos_recurrentes])
+        montos = np.concatenate([montos, montos_recurrentes])
+        ingreso = es_ingreso[codigos]
+    
+    orden = np.argsort(desplazamientos, kind='stable')
+    if recurrentes:
+        # Las filas recurrentes conservan juntas su fecha, categoría y monto
+        codigos, montos, ingreso = codigos[orden], montos[orden], ingreso[orden]
+    fechas = pd.DatetimeIndex((
+        pd.Timestamp(inicio).to_datetime64().astype('datetime64[D]') + desplazamientos[orden]
+    ).astype('datetime64[ns]'))
+    
+    df = pd.DataFrame({
+        'Fecha': _formatear_fechas(fechas, list(formatos_fecha), rng),
+        'Categoria': nombres[codigos],
+        'Tipo': np.where(ingreso, 'Ingreso', 'Gasto').astype(object),
+        'Monto': montos
+    })
+    if sucias > 0:
+        df = _ensuciar(df, sucias, rng)
+    return df
+
+def generar_metas(cantidad=5, semilla=0, inicio='2020-01-01'):
+    """Metas con montos y fechas límite deterministas"""
+    rng = np.random.default_rng(semilla + 1)
+    creacion = pd.Timestamp(inicio) + pd.to_timedelta(rng.integers(0, 365, cantidad), 'D')
+    limite = creacion + pd.to_timedelta(rng.integers(180, 5 * 365, cantidad), 'D')
+    return pd.DataFrame({
+        'Nombre_Meta': [f"Meta {i + 1}" for i in range(cantidad)],
+        'Monto_Objetivo': np.round(rng.uniform(1000, 50000, cantidad), 2),
+        'Fecha_Limite': limite.to_pydatetime(),
+        'Fecha_Creacion': creacion.to_pydatetime()
+    })
+
+def _escribir_hoja(libro, nombre, df, formato_fecha):
+    """Escribir fila a fila respetando el tipo de cada celda (columnas mixtas)"""
+    hoja = libro.add_worksheet(nombre)
+    hoja.write_row(0, 0, list(df.columns))
+    columnas = [df[col].to_numpy(dtype=object) for col in df.columns]
+    for fila, valores in enumerate(zip(*columnas), start=1):
+        for col, valor in enumerate(valores):
+            if valor is None or valor != valor:
+                continue
+            if isinstance(valor, datetime):
+                hoja.write_datetime(fila, col, valor, formato_fecha)
+            elif isinstance(valor, str):
+                hoja.write_string(fila, col, valor)
+            else:
+                hoja.write_number(fila, col, float(valor))
+
+def escribir_libro(ruta, transacciones, proporcion_historico=0.9, metas=None):
+    """
+    Escribir un .xlsx con el formato de la plantilla
+    Las filas más antiguas van a Historico y el resto a Transacciones
+    """
+    corte = int(len(transacciones) * proporcion_historico)
+    hojas = [
+        ('Transacciones', transacciones.iloc[corte:]),
+        ('Historico', transacciones.iloc[:corte]),
+        ('Metas', metas if metas is not None else generar_metas(0))
+    ]
+    
+    if xlsxwriter is not None:
+        libro = xlsxwriter.Workbook(ruta, {'constant_memory': True})
+        formato_fecha = libro.add_format({'num_format': 'dd/mm/yyyy'})
+        for nombre, df in hojas:
+            _escribir_hoja(libro, nombre, df, formato_fecha)
+        libro.close()
+    else:
+        with pd.ExcelWriter(ruta, engine='openpyxl') as writer:
+            for nombre, df in hojas:
+                df.to_excel(writer, index=False, sheet_name=nombre)
+
+def escribir_csv(ruta, transacciones):
+    """Escribir las transacciones como CSV (el formato de exportación de la app)"""
+    transacciones.to_csv(ruta, index=False, encoding='utf-8-sig')
+
+def obtener_archivo(directorio, filas, formato='xlsx', **parametros):
+    """
+    Ruta de un archivo sintético, generándolo solo si aún no existe
+    El nombre incluye todos los parámetros, así que cambiar alguno crea otro archivo
+    """
+    os.makedirs(directorio, exist_ok=True)
+    descripcion = '_'.join(
+        f"{clave}-{'+'.join(valor) if isinstance(valor, (list, tuple)) else valor}"
+        for clave, valor in sorted(parametros.items())
+    )
+    descripcion = ''.join(c if c.isalnum() or c in '-_+.' else '' for c in descripcion)
+    ruta = os.path.join(directorio, f"sintetico_{filas}_{descripcion}.{formato}")
+    if os.path.exists(ruta):
+        return ruta
+    
+    num_metas = parametros.pop('metas', 5)
+    transacciones = generar_transacciones(filas, **parametros)
+    temporal = ruta + '.tmp'
+    if formato == 'csv':
+        escribir_csv(temporal, transacciones)
+    else:
+        escribir_libro(temporal, transacciones, metas=generar_metas(num_metas, parametros.get('semilla', 0)))
+    os.replace(temporal, ruta)
+    return ruta
@@ -0,0 +1,22 @@
+"""
+Núcleo de cálculo de la app de finanzas personales
+
+Los módulos de este paquete no importan Streamlit, así que se pueden usar
+desde procesos de trabajo o scripts en lote:
+
+    ingesta      lectura y normalización de archivos Excel
+    importadores CSV y extractos bancarios (OFX) en streaming
+    categorizacion  reglas de categorización y nombres de categoría unificados
+    lote         carga de varios archivos en paralelo
+    agregados    totales por periodo y categoría, índice para filtrar
+    insights     insights en texto a partir de los agregados y las metas
+    metas        tabla de metas y progreso de todas a la vez
+    series       series diarias: ventanas móviles, variaciones y pronósticos
+    deteccion    transacciones inusuales y pagos recurrentes
+    exportacion  generación de Excel, CSV y Parquet
+    almacen      almacén columnar local por meses
+    instrumentacion  tiempos y memoria por etapa
+    sesiones     memoria por sesión, presupuestos y derrame a disco
+
+`python -m finanzas` procesa archivos sin la interfaz (ver finanzas/__main__.py).
+"""
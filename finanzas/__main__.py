@@ -0,0 +1,14 @@
+"""
+Modo en lote: leer archivos de finanzas y emitir insights y exportaciones
+
+Uso:
+    python -m finanzas archivo_o_carpeta [...] [--exportar salida.xlsx] [--json]
+
+La línea de comandos está en finanzas.lote (ver su documentación para las opciones).
+"""
+import sys
+
+from finanzas.lote import main
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""
+Agregados por periodo y categoría, e índice temporal para filtrar
+"""
+import numpy as np
+import pandas as pd
+
+from finanzas.ingesta import a_categorica
+from finanzas.instrumentacion import medido
+
+@medido()
+def calcular_columnas_derivadas(df):
+    """
+    Claves de periodo enteras para agrupar sin convertir fechas a texto
+    dia: días desde 1970-01-01 · semana: semanas ISO (de lunes a domingo)
+    desde 1969-12-29 · mes: meses desde 1970-01 · anio: año calendario
+    """
+    fechas = df['Fecha'].to_numpy(dtype='datetime64[ns]')
+    dia = fechas.astype('datetime64[D]').astype('int64')
+    return pd.DataFrame({
+        'dia': dia.astype('int32'),
+        'semana': ((dia + 3) // 7).astype('int32'),
+        'mes': fechas.astype('datetime64[M]').astype('int64').astype('int32'),
+        'anio': (fechas.astype('datetime64[Y]').astype('int64') + 1970).astype('int16')
+    }, index=df.index)
+
+def etiquetas_periodo(claves, periodo):
+    """Convertir claves de calcular_columnas_derivadas en etiquetas legibles"""
+    claves = np.asarray(claves, dtype='int64')
+    if periodo == 'dia':
+        return pd.to_datetime(claves, unit='D')
+    if periodo == 'semana':
+        lunes = pd.to_datetime(claves * 7 - 3, unit='D').isocalendar()
+        return pd.Index([f"{anio}-S{semana:02d}" for anio, semana in zip(lunes['year'], lunes['week'])])
+    if periodo == 'mes':
+        return pd.Index([f"{1970 + k // 12:04d}-{k % 12 + 1:02d}" for k in claves])
+    return pd.Index(claves)
+
+def _agrupar_por_periodo(base, claves, periodo):
+    tabla = base.groupby(claves.to_numpy()).sum()
+    tabla.index = etiquetas_periodo(tabla.index, periodo)
+    return tabla
+
+def _base_agregados(df):
+    """Una fila por transacción con las columnas que se suman en cada tabla"""
+    monto = df['Monto'].astype('float64')
+    es_ingreso = monto > 0
+    es_gasto = monto < 0
+    return pd.DataFrame({
+        'ingresos': monto.where(es_ingreso, 0.0),
+        'gastos': (-monto).where(es_gasto, 0.0),
+        'neto': monto,
+        'n_ingresos': es_ingreso.astype('int64'),
+        'n_gastos': es_gasto.astype('int64'),
+        'n': 1
+    })
+
+def _tablas_agregados(df, derivadas):
+    base = _base_agregados(df)
+    por_mes_categoria = base.groupby([derivadas['mes'].to_numpy(), df['Categoria']], observed=True).sum()
+    por_mes_categoria.index = por_mes_categoria.index.set_levels(
+        etiquetas_periodo(por_mes_categoria.index.levels[0], 'mes'), level=0
+    )
+    return {
+        'por_categoria': base.groupby(df['Categoria'], observed=True).sum(),
+        'por_dia': _agrupar_por_periodo(base, derivadas['dia'], 'dia'),
+        'por_semana': _agrupar_por_periodo(base, derivadas['semana'], 'semana'),
+        'por_mes': _agrupar_por_periodo(base, derivadas['mes'], 'mes'),
+        'por_anio': _agrupar_por_periodo(base, derivadas['anio'], 'anio'),
+        'por_mes_categoria': por_mes_categoria
+    }
+
+def _resumir(tablas, fecha_min, fecha_max):
+    """Agregados completos a partir de las tablas (los totales salen de la tabla anual)"""
+    totales = tablas['por_anio'].sum()
+    return {
+        'total_ingresos': float(totales['ingresos']),
+        'total_gastos': float(totales['gastos']),
+        'balance': float(totales['neto']),
+        'num_transacciones': int(totales['n']),
+        'num_gastos': int(totales['n_gastos']),
+        'dias_unicos': len(tablas['por_dia']),
+        'fecha_min': fecha_min,
+        'fecha_max': fecha_max,
+        **tablas
+    }
+
+@medido()
+def calcular_agregados(df, derivadas=None):
+    """
+    Calcular de una sola pasada los totales que usan Dashboard, Insights y Metas
+    Cada tabla tiene columnas ingresos, gastos (en positivo), neto y conteos
+    """
+    if df.empty:
+        return None
+    if derivadas is None:
+        derivadas = calcular_columnas_derivadas(df)
+    return _resumir(_tablas_agregados(df, derivadas), df['Fecha'].min(), df['Fecha'].max())
+
+TABLAS_POR_CATEGORIA = ('por_categoria', 'por_mes_categoria')
+
+def _combinar_tabla(tabla, cambio, signo, ordenar=True):
+    """
+    Sumar (signo 1) o restar (signo -1) las filas de cambio a una tabla de
+    agregados; los grupos que se quedan sin transacciones desaparecen
+    """
+    combinada = pd.concat([tabla, cambio if signo > 0 else -cambio])
+    niveles = list(range(combinada.index.nlevels))
+    combinada = combinada.groupby(level=niveles, sort=ordenar, observed=True).sum()
+    return combinada[combinada['n'] > 0]
+
+@medido()
+def actualizar_agregados(agregados, df_cambio, derivadas_cambio=None, quitar=False):
+    """
+    Agregados después de agregar (o quitar, con quitar=True) las filas de
+    df_cambio, sin volver a recorrer el resto de las transacciones
+    El costo depende de las filas cambiadas y del número de grupos (días,
+    meses, categorías), no del tamaño del histórico
+    """
+    if df_cambio.empty:
+        return agregados
+    if agregados is None:
+        if quitar:
+            raise ValueError("No se pueden quitar transacciones de agregados vacíos")
+        return calcular_agregados(df_cambio, derivadas_cambio)
+    if derivadas_cambio is None:
+        derivadas_cambio = calcular_columnas_derivadas(df_cambio)
+    
+    cambio = _tablas_agregados(df_cambio, derivadas_cambio)
+    signo = -1 if quitar else 1
+    # Los periodos quedan en orden cronológico y las categorías en orden de
+    # aparición, como al calcular desde cero
+    tablas = {
+        nombre: _combinar_tabla(agregados[nombre], tabla, signo, ordenar=(nombre not in TABLAS_POR_CATEGORIA))
+        for nombre, tabla in cambio.items()
+    }
+    if tablas['por_dia'].empty:
+        return None
+    
+    # Dentro de cada mes, las categorías en el mismo orden que por_categoria
+    por_mes_categoria = tablas['por_mes_categoria']
+    posicion = pd.Index(tablas['por_categoria'].index).get_indexer(por_mes_categoria.index.get_level_values(1))
+    meses = por_mes_categoria.index.get_level_values(0).to_numpy(dtype=object)
+    tablas['por_mes_categoria'] = por_mes_categoria.iloc[np.lexsort((posicion, meses))]
+    
+    fecha_min, fecha_max = agregados['fecha_min'], agregados['fecha_max']
+    if not quitar:
+        fecha_min = min(fecha_min, df_cambio['Fecha'].min())
+        fecha_max = max(fecha_max, df_cambio['Fecha'].max())
+    else:
+        # Si se quitó un extremo, el nuevo es el primer/último día con transacciones
+        dias = tablas['por_dia'].index
+        if df_cambio['Fecha'].min() <= fecha_min:
+            fecha_min = dias[0]
+        if df_cambio['Fecha'].max() >= fecha_max:
+            fecha_max = dias[-1]
+    return _resumir(tablas, fecha_min, fecha_max)
+
+def _posiciones_por_grupo(codigos, num_grupos):
+    """Posiciones (ascendentes) de cada código de una categórica, sin máscaras por grupo"""
+    orden = np.argsort(codigos, kind='stable')
+    limites = np.searchsorted(codigos[orden], np.arange(num_grupos + 1))
+    return [orden[limites[i]:limites[i + 1]] for i in range(num_grupos)]
+
+@medido()
+def construir_indice_temporal(df):
+    """
+    Índice para filtrar sin recorrer todo el DataFrame
+    orden: posiciones de las filas ordenadas por Fecha; fechas: Fecha ordenada
+    (int64 ns) para búsqueda binaria; por_categoria / por_tipo: para cada valor,
+    las posiciones dentro del orden por fecha donde aparece
+    """
+    fechas = df['Fecha'].to_numpy(dtype='datetime64[ns]').view('int64')
+    orden = np.argsort(fechas, kind='stable')
+    indice = {'orden': orden, 'fechas': fechas[orden]}
+    for col, clave in [('Categoria', 'por_categoria'), ('Tipo', 'por_tipo')]:
+        categorica = a_categorica(df[col])
+        codigos = categorica.cat.codes.to_numpy()[orden]
+        grupos = _posiciones_por_grupo(codigos, len(categorica.cat.categories))
+        indice[clave] = {
+            valor: posiciones
+            for valor, posiciones in zip(categorica.cat.categories, grupos)
+            if len(posiciones)
+        }
+    return indice
+
+def _recortar(posiciones, inicio, fin):
+    """Posiciones ordenadas dentro de [inicio, fin) mediante búsqueda binaria"""
+    return posiciones[np.searchsorted(posiciones, inicio):np.searchsorted(posiciones, fin)]
+
+@medido()
+def filas_filtradas(indice, desde=None, hasta=None, categorias=None, tipos=None):
+    """
+    Posiciones de las filas que cumplen el filtro, ordenadas por fecha
+    El rango de fechas es inclusivo; el costo depende de las filas del
+    resultado y no del tamaño total del histórico
+    """
+    fechas = indice['fechas']
+    inicio = 0 if desde is None else np.searchsorted(fechas, pd.Timestamp(desde).value, side='left')
+    fin = len(fechas) if hasta is None else np.searchsorted(
+        fechas, (pd.Timestamp(hasta) + pd.Timedelta(days=1)).value, side='left'
+    )
+    
+    seleccion = None
+    for valores, grupos in [(categorias, indice['por_categoria']), (tipos, indice['por_tipo'])]:
+        if not valores:
+            continue
+        partes = [_recortar(grupos[valor], inicio, fin) for valor in valores if valor in grupos]
+        posiciones = np.sort(np.concatenate(partes)) if partes else np.array([], dtype='int64')
+        seleccion = posiciones if seleccion is None else np.intersect1d(seleccion, posiciones, assume_unique=True)
+    
+    if seleccion is None:
+        seleccion = np.arange(inicio, fin)
+    return indice['orden'][seleccion]
@@ -0,0 +1,141 @@
+"""
+Almacén columnar local del histórico
+
+Una partición Arrow IPC por mes (transacciones_AAAA-MM.arrow) en el directorio
+indicado por FINANZAS_ALMACEN_DIR; requiere pyarrow. Cada usuario tiene su
+propia subcarpeta (ver directorio_usuario), así que las sesiones de usuarios
+distintos no comparten ni borran el histórico de las demás.
+"""
+import hashlib
+import importlib.util
+import os
+
+import pandas as pd
+
+from finanzas.ingesta import (
+    COLUMNAS_REQUERIDAS,
+    concatenar_transacciones,
+    normalizar_tipos_transacciones,
+)
+from finanzas.instrumentacion import medido
+
+# Directorio del almacén columnar local (opcional, desactivado si no se define)
+ALMACEN_DIR = os.environ.get('FINANZAS_ALMACEN_DIR')
+# pyarrow es opcional y se importa solo al usar el almacén, no al arrancar la app
+PYARROW_DISPONIBLE = importlib.util.find_spec('pyarrow') is not None
+
+def almacen_activo():
+    """Indicar si el almacén local está configurado y pyarrow disponible"""
+    return bool(ALMACEN_DIR) and PYARROW_DISPONIBLE
+
+def directorio_usuario(usuario, base=None):
+    """
+    Subcarpeta del almacén de un usuario: el nombre es un hash del
+    identificador, así que cualquier texto da una ruta dentro de base
+    """
+    if not usuario:
+        raise ValueError("el almacén local requiere un identificador de usuario")
+    clave = hashlib.sha256(str(usuario).encode('utf-8')).hexdigest()[:32]
+    return os.path.join(base or ALMACEN_DIR, f"usuario_{clave}")
+
+def _esquema_almacen():
+    """
+    Esquema fijo de todas las particiones: con el que elige pandas, el ancho
+    del índice de las categóricas (int8, int16...) depende de cuántas
+    categorías tiene cada mes y las particiones dejan de poder concatenarse
+    """
+    import pyarrow as pa
+    return pa.schema([
+        ('Fecha', pa.timestamp('ns')),
+        ('Categoria', pa.dictionary(pa.int32(), pa.string())),
+        ('Tipo', pa.dictionary(pa.int32(), pa.string())),
+        ('Monto', pa.float64())
+    ])
+
+def _ruta_particion(directorio, mes):
+    return os.path.join(directorio, f"transacciones_{mes}.arrow")
+
+def _particiones_almacen(directorio):
+    """Mapa mes -> ruta de las particiones existentes"""
+    if not os.path.isdir(directorio):
+        return {}
+    particiones = {}
+    for nombre in sorted(os.listdir(directorio)):
+        if nombre.startswith('transacciones_') and nombre.endswith('.arrow'):
+            particiones[nombre[len('transacciones_'):-len('.arrow')]] = os.path.join(directorio, nombre)
+    return particiones
+
+def _leer_particion(ruta):
+    """Leer una partición Arrow IPC mapeada en memoria (las escritas sin el esquema fijo se convierten)"""
+    import pyarrow as pa
+    with pa.memory_map(ruta, 'r') as origen:
+        tabla = pa.ipc.open_file(origen).read_all()
+    esquema = _esquema_almacen()
+    return tabla if tabla.schema.equals(esquema) else tabla.select(esquema.names).cast(esquema)
+
+def _escribir_particion(ruta, df_mes):
+    """Escribir una partición de forma atómica (archivo temporal + reemplazo)"""
+    import pyarrow as pa
+    tabla = pa.Table.from_pandas(df_mes[COLUMNAS_REQUERIDAS], schema=_esquema_almacen(), preserve_index=False)
+    temporal = ruta + '.tmp'
+    with pa.OSFile(temporal, 'wb') as destino:
+        with pa.ipc.new_file(destino, tabla.schema) as escritor:
+            escritor.write_table(tabla)
+    os.replace(temporal, ruta)
+
+def _meses_transacciones(df):
+    """Clave entera AAAAMM de cada fila (evita formatear fechas fila a fila)"""
+    return df['Fecha'].dt.year * 100 + df['Fecha'].dt.month
+
+def _nombre_mes(clave_mes):
+    return f"{clave_mes // 100:04d}-{clave_mes % 100:02d}"
+
+@medido()
+def cargar_almacen(directorio=None):
+    """Cargar todo el histórico del almacén local como DataFrame"""
+    import pyarrow as pa
+    directorio = directorio or ALMACEN_DIR
+    particiones = _particiones_almacen(directorio)
+    if not particiones:
+        return pd.DataFrame()
+    tabla = pa.concat_tables([_leer_particion(ruta) for ruta in particiones.values()])
+    return normalizar_tipos_transacciones(tabla.to_pandas())
+
+@medido()
+def escribir_almacen(df, directorio=None):
+    """Reemplazar el contenido del almacén con df (una partición por mes)"""
+    directorio = directorio or ALMACEN_DIR
+    os.makedirs(directorio, exist_ok=True)
+    existentes = _particiones_almacen(directorio)
+    
+    meses = set()
+    if not df.empty:
+        for clave_mes, df_mes in df.groupby(_meses_transacciones(df), sort=True):
+            mes = _nombre_mes(clave_mes)
+            _escribir_particion(_ruta_particion(directorio, mes), df_mes)
+            meses.add(mes)
+    
+    # Eliminar los meses que ya no existen en los datos
+    for mes, ruta in existentes.items():
+        if mes not in meses:
+            os.remove(ruta)
+
+@medido()
+def anexar_almacen(df_nuevas, directorio=None):
+    """Agregar transacciones al almacén reescribiendo solo los meses afectados"""
+    directorio = directorio or ALMACEN_DIR
+    os.makedirs(directorio, exist_ok=True)
+    existentes = _particiones_almacen(directorio)
+    
+    for clave_mes, df_mes in df_nuevas.groupby(_meses_transacciones(df_nuevas), sort=True):
+        mes = _nombre_mes(clave_mes)
+        if mes in existentes:
+            df_previo = _leer_particion(existentes[mes]).to_pandas()
+            df_mes = concatenar_transacciones([df_previo, df_mes[COLUMNAS_REQUERIDAS]])
+        _escribir_particion(_ruta_particion(directorio, mes), df_mes)
+
+def borrar_almacen(directorio=None):
+    """Eliminar todas las particiones del almacén local"""
+    directorio = directorio or ALMACEN_DIR
+    for ruta in _particiones_almacen(directorio).values():
+        os.remove(ruta)
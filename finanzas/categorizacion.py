@@ -0,0 +1,201 @@
+"""
+Categorización automática por reglas y unificación de nombres de categoría
+
+Las reglas (palabras clave, expresión regular y rango de importe) se compilan
+en una sola expresión regular: una alternativa por regla, en orden, así que
+gana la primera regla que se cumple. El texto se compara normalizado (sin
+acentos, en minúsculas) y el resultado se memoriza por cada valor distinto,
+de modo que el costo depende de los textos distintos y no de las filas.
+
+Las reglas del usuario se leen del archivo JSON indicado por
+FINANZAS_REGLAS, una lista como:
+
+    [{"categoria": "Alimentación", "palabras": ["mercadona", "supermercado"]},
+     {"categoria": "Vivienda", "patron": "alquiler|hipoteca", "monto_min": 300}]
+
+Las palabras deben aparecer completas; palabras y patrones se comparan con
+el texto normalizado. monto_min / monto_max se comparan con el valor
+absoluto de Monto.
+"""
+import functools
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from finanzas.ingesta import a_categorica, normalizar_clave
+from finanzas.instrumentacion import medido
+
+# Archivo JSON con las reglas de categorización (opcional, sin reglas si no se define)
+RUTA_REGLAS = os.environ.get('FINANZAS_REGLAS')
+# Textos distintos que se recuerdan por categorizador antes de vaciar la memoria
+MAX_MEMORIA_TEXTOS = 200_000
+
+def compilar_regla(regla):
+    """
+    Validar una regla y dejarla lista para combinar: la condición de texto
+    (alguna palabra completa o el patrón) como una sola expresión regular
+    """
+    if not regla.get('categoria'):
+        raise ValueError(f"regla sin categoria: {regla}")
+    partes = []
+    palabras = [normalizar_clave(palabra) for palabra in regla.get('palabras', []) if str(palabra).strip()]
+    if palabras:
+        partes.append(r'\b(?:' + '|'.join(re.escape(palabra) for palabra in palabras) + r')\b')
+    if regla.get('patron'):
+        try:
+            re.compile(regla['patron'])
+        except re.error as e:
+            raise ValueError(f"patrón inválido en la regla de {regla['categoria']}: {e}") from e
+        partes.append(regla['patron'])
+    return {
+        'categoria': str(regla['categoria']),
+        'patron': '|'.join(f"(?:{parte})" for parte in partes) or None,
+        'monto_min': float(regla.get('monto_min', 0.0)),
+        'monto_max': float(regla.get('monto_max', np.inf))
+    }
+
+def cargar_reglas(ruta):
+    """Reglas de un archivo JSON (lista de diccionarios)"""
+    with open(ruta, encoding='utf-8') as archivo:
+        reglas = json.load(archivo)
+    if not isinstance(reglas, list):
+        raise ValueError("el archivo de reglas debe contener una lista")
+    return reglas
+
+class Categorizador:
+    """Reglas combinadas en una expresión regular, con memoria por texto ya visto"""
+    
+    def __init__(self, reglas):
+        self.reglas = [compilar_regla(regla) for regla in reglas]
+        self.categorias = [regla['categoria'] for regla in self.reglas]
+        self._minimos = np.array([regla['monto_min'] for regla in self.reglas])
+        self._maximos = np.array([regla['monto_max'] for regla in self.reglas])
+        self._expresiones = {}
+        self._memoria = {}
+    
+    def _expresion(self, desde):
+        """
+        Expresión con una alternativa por regla a partir de la regla desde; cada
+        alternativa es una búsqueda anticipada, así que en la posición 0 gana
+        la primera regla cuyo texto coincide (sin texto, coincide siempre)
+        """
+        if desde not in self._expresiones:
+            alternativas = [
+                f"(?P<regla_{i}>(?=.*?(?:{regla['patron']})))" if regla['patron'] else f"(?P<regla_{i}>)"
+                for i, regla in enumerate(self.reglas[desde:], desde)
+            ]
+            expresion = re.compile('|'.join(alternativas), re.DOTALL | re.IGNORECASE)
+            # Número de grupo de cada alternativa -> índice de la regla
+            grupos = {expresion.groupindex[f"regla_{i}"]: i for i in range(desde, len(self.reglas))}
+            self._expresiones[desde] = (expresion, grupos)
+        return self._expresiones[desde]
+    
+    def _primera_regla(self, texto, desde):
+        """Índice de la primera regla (desde la indicada) cuyo texto coincide, o -1"""
+        clave = (texto, desde)
+        if clave not in self._memoria:
+            if len(self._memoria) >= MAX_MEMORIA_TEXTOS:
+                self._memoria.clear()
+            expresion, grupos = self._expresion(desde)
+            coincidencia = expresion.match(normalizar_clave(texto))
+            self._memoria[clave] = grupos[coincidencia.lastindex] if coincidencia else -1
+        return self._memoria[clave]
+    
+    def asignar(self, textos, montos):
+        """
+        Índice de la primera regla que cumple cada fila (texto y rango de
+        importe), o -1; cada texto distinto se evalúa una sola vez por regla
+        de partida
+        """
+        categorica = a_categorica(pd.Series(textos))
+        codigos = categorica.cat.codes.to_numpy().astype('int64')
+        valores = categorica.cat.categories
+        monto = np.abs(np.asarray(montos, dtype='float64'))
+        resultado = np.full(len(codigos), -1, dtype='int64')
+        if not self.reglas:
+            return resultado
+        
+        desde = np.zeros(len(codigos), dtype='int64')
+        pendientes = np.flatnonzero(codigos >= 0)
+        while pendientes.size:
+            # Una evaluación por par (texto distinto, regla de partida)
+            pares, posicion = np.unique(codigos[pendientes] * (len(self.reglas) + 1) + desde[pendientes], return_inverse=True)
+            candidatas = np.array([
+                self._primera_regla(valores[par // (len(self.reglas) + 1)], int(par % (len(self.reglas) + 1)))
+                for par in pares
+            ], dtype='int64')[posicion]
+            
+            # Si el importe queda fuera del rango de la candidata, se sigue buscando desde la siguiente regla
+            con_regla = candidatas >= 0
+            filas, reglas = pendientes[con_regla], candidatas[con_regla]
+            en_rango = (monto[filas] >= self._minimos[reglas]) & (monto[filas] <= self._maximos[reglas])
+            resultado[filas[en_rango]] = reglas[en_rango]
+            pendientes = filas[~en_rango]
+            desde[pendientes] = reglas[~en_rango] + 1
+            pendientes = pendientes[desde[pendientes] < len(self.reglas)]
+        return resultado
+    
+    def categorizar(self, textos, montos, categorias=None):
+        """Categoría de la primera regla que se cumple; si ninguna, la de categorias (o NaN)"""
+        indices = self.asignar(textos, montos)
+        nombres = np.array(self.categorias + [np.nan], dtype=object)[indices]
+        base = pd.Series(categorias if categorias is not None else np.nan, index=pd.Series(textos).index, dtype=object)
+        return base.where(indices < 0, nombres)
+
+@functools.lru_cache(maxsize=1)
+def categorizador_por_defecto():
+    """Categorizador con las reglas de FINANZAS_REGLAS (se leen una vez por proceso)"""
+    return Categorizador(cargar_reglas(RUTA_REGLAS) if RUTA_REGLAS else [])
+
+@medido()
+def unificar_categorias(categorias, preferidas=()):
+    """
+    Unir los nombres que solo difieren en acentos, mayúsculas o espacios
+    ("Alimentacion", " alimentación ") en uno: el de preferidas si alguno
+    coincide (p. ej. las categorías de las reglas) o el más frecuente, sin
+    espacios sobrantes; devuelve una columna categórica en orden alfabético
+    """
+    categorica = a_categorica(categorias)
+    valores = categorica.cat.categories
+    if len(valores) == 0:
+        return categorica
+    codigos = categorica.cat.codes.to_numpy()
+    frecuencias = np.bincount(codigos[codigos >= 0], minlength=len(valores))
+    
+    tabla = pd.DataFrame({
+        'valor': np.asarray(valores, dtype=object),
+        'clave': [normalizar_clave(valor) for valor in valores],
+        'frecuencia': frecuencias,
+        # Ante un empate gana la grafía con acentos
+        'con_acentos': [not valor.isascii() for valor in valores]
+    })
+    canonicos = tabla.sort_values(['frecuencia', 'con_acentos', 'valor'], ascending=[False, False, True]).drop_duplicates('clave')
+    canonicos = dict(zip(canonicos['clave'], canonicos['valor'].map(lambda valor: ' '.join(valor.split()))))
+    canonicos.update({normalizar_clave(nombre): nombre for nombre in preferidas})
+    nombres = tabla['clave'].map(canonicos)
+    
+    # Recodificar las filas: una consulta por código, no por fila
+    finales = sorted(set(nombres))
+    nuevo_codigo = pd.Index(finales).get_indexer(nombres)
+    codigos = np.where(codigos >= 0, nuevo_codigo[np.maximum(codigos, 0)], -1)
+    return pd.Series(pd.Categorical.from_codes(codigos, categories=finales), index=categorica.index, name=categorica.name)
+
+@medido()
+def categorizar_transacciones(df, textos=None, categorizador=None):
+    """
+    Aplicar las reglas a las transacciones y unificar los nombres de categoría
+    textos: columna con la que se evalúan las reglas (por defecto la propia
+    Categoria, donde a veces se escribe la descripción del movimiento)
+    """
+    if df.empty:
+        return df
+    categorizador = categorizador or categorizador_por_defecto()
+    categorias = df['Categoria']
+    if categorizador.reglas:
+        categorias = categorizador.categorizar(
+            df['Categoria'].astype(object) if textos is None else textos, df['Monto'], df['Categoria'].astype(object)
+        )
+    return df.assign(Categoria=unificar_categorias(categorias, categorizador.categorias))
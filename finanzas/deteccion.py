@@ -0,0 +1,146 @@
+"""
+Detección de transacciones inusuales y de pagos recurrentes
+
+Las dos detecciones trabajan con los códigos de categoría y operaciones por
+grupo de pandas/numpy sobre todo el histórico a la vez, sin recorrer las
+filas en Python.
+"""
+import numpy as np
+import pandas as pd
+
+from finanzas.agregados import calcular_columnas_derivadas
+from finanzas.ingesta import a_categorica
+from finanzas.instrumentacion import medido
+
+# |z robusto| a partir del cual una transacción se considera inusual
+UMBRAL_Z = 3.5
+# Escala de la MAD a desviación estándar para datos normales
+CONSTANTE_MAD = 0.6745
+
+# Montos que difieren menos que esto (relativo) se consideran el mismo pago;
+# con 0 solo se agrupan montos idénticos al centavo
+TOLERANCIA_MONTO = 0.01
+# Un intervalo es regular si se aleja de la mediana menos que esto (relativo),
+# con un mínimo de días para absorber meses de distinto largo y fines de semana
+TOLERANCIA_INTERVALO = 0.1
+TOLERANCIA_INTERVALO_DIAS = 2
+# Proporción mínima de intervalos regulares (tolera algún pago movido o extra)
+PROPORCION_REGULAR = 0.75
+MIN_REPETICIONES = 4
+MIN_INTERVALO_DIAS = 5
+
+PERIODICIDADES = {7: 'Semanal', 14: 'Quincenal', 30: 'Mensual', 91: 'Trimestral', 182: 'Semestral', 365: 'Anual'}
+
+def _por_grupo(valores, codigos, num_grupos, funcion):
+    """Estadístico de valores por código de categoría, como array indexable por código"""
+    return pd.Series(valores).groupby(codigos).agg(funcion).reindex(np.arange(num_grupos)).to_numpy()
+
+@medido()
+def detectar_anomalias(df, umbral=UMBRAL_Z):
+    """
+    Transacciones con un monto inusual dentro de su categoría
+    z robusto = 0.6745 * (monto - mediana) / MAD, con mediana y MAD de la
+    categoría; devuelve las filas con |z| >= umbral, de más a menos inusual
+    """
+    if df.empty:
+        return pd.DataFrame(columns=['Fecha', 'Categoria', 'Monto', 'Mediana', 'Z'])
+    monto = df['Monto'].to_numpy(dtype='float64')
+    categorica = a_categorica(df['Categoria'])
+    # Las filas sin categoría (código -1) van a un grupo aparte que nunca se marca
+    num_grupos = len(categorica.cat.categories) + 1
+    codigos = np.where(categorica.cat.codes.to_numpy() < 0, num_grupos - 1, categorica.cat.codes.to_numpy())
+    
+    mediana = _por_grupo(monto, codigos, num_grupos, 'median')
+    desvio = monto - mediana[codigos]
+    mad = _por_grupo(np.abs(desvio), codigos, num_grupos, 'median')
+    # Con más de la mitad de los montos iguales la MAD es 0: se usa la
+    # desviación media absoluta, escalada para estimar la misma dispersión
+    desvio_medio = _por_grupo(np.abs(desvio), codigos, num_grupos, 'mean')
+    escala = np.where(mad > 0, mad / CONSTANTE_MAD, desvio_medio * np.sqrt(np.pi / 2))
+    escala[-1] = 0.0
+    
+    escala_filas = escala[codigos]
+    z = np.zeros(len(monto))
+    np.divide(desvio, escala_filas, out=z, where=escala_filas > 0)
+    filas = np.flatnonzero(np.abs(z) >= umbral)
+    filas = filas[np.argsort(-np.abs(z[filas]), kind='stable')]
+    return df.iloc[filas][['Fecha', 'Categoria', 'Monto']].assign(
+        Mediana=mediana[codigos[filas]],
+        Z=z[filas]
+    )
+
+def _periodo_cercano(dias):
+    """Periodo conocido más cercano a cada intervalo (en días), o 0 si ninguno se parece"""
+    periodos = np.array(list(PERIODICIDADES))
+    cercano = periodos[np.abs(np.log(dias[:, None] / periodos[None, :])).argmin(axis=1)]
+    return np.where(np.abs(dias - cercano) <= np.maximum(cercano * TOLERANCIA_INTERVALO, TOLERANCIA_INTERVALO_DIAS), cercano, 0)
+
+@medido()
+def detectar_recurrentes(df, derivadas=None, tolerancia_monto=TOLERANCIA_MONTO,
+                         tolerancia_intervalo=TOLERANCIA_INTERVALO, min_repeticiones=MIN_REPETICIONES):
+    """
+    Pagos que se repiten: misma categoría, monto parecido e intervalos regulares
+    Los montos se agrupan en tramos logarítmicos de ancho tolerancia_monto;
+    dentro de cada grupo (categoría, tramo, signo) se ordenan por fecha y el
+    grupo es recurrente si casi todos sus intervalos están cerca de la mediana
+    y esta se parece a una periodicidad conocida (PERIODICIDADES)
+    """
+    columnas = ['Categoria', 'Monto', 'Repeticiones', 'Intervalo_dias', 'Periodicidad', 'Ultima', 'Proxima']
+    if df.empty:
+        return pd.DataFrame(columns=columnas)
+    if derivadas is None:
+        derivadas = calcular_columnas_derivadas(df)
+    
+    monto = df['Monto'].to_numpy(dtype='float64')
+    categorica = a_categorica(df['Categoria'])
+    valida = (monto != 0) & (categorica.cat.codes.to_numpy() >= 0)
+    filas = np.flatnonzero(valida)
+    if filas.size == 0:
+        return pd.DataFrame(columns=columnas)
+    if tolerancia_monto > 0:
+        tramo = np.round(np.log(np.abs(monto[filas])) / np.log1p(tolerancia_monto)).astype('int64')
+    else:
+        tramo = np.round(np.abs(monto[filas]) * 100).astype('int64')
+    # Una clave entera por (categoría, tramo de monto, signo)
+    tramo -= tramo.min()
+    clave = (categorica.cat.codes.to_numpy().astype('int64')[filas] * (int(tramo.max()) + 1) + tramo) * 2 + (monto[filas] > 0)
+    dia = derivadas['dia'].to_numpy(dtype='int64')[filas]
+    
+    # Ordenar por grupo y fecha con una sola clave entera (más rápido que lexsort)
+    dia_relativo = dia - dia.min()
+    orden = np.argsort(clave * (int(dia_relativo.max()) + 1) + dia_relativo)
+    clave, dia, filas = clave[orden], dia[orden], filas[orden]
+    mismo = np.concatenate([[False], clave[1:] == clave[:-1]])
+    grupo = np.cumsum(~mismo) - 1
+    intervalos = pd.DataFrame({
+        'grupo': grupo[mismo],
+        'intervalo': (dia[1:] - dia[:-1])[mismo[1:]]
+    })
+    
+    por_grupo = intervalos.groupby('grupo')['intervalo']
+    resumen = pd.DataFrame({'mediana': por_grupo.median(), 'n': por_grupo.size()})
+    resumen = resumen[(resumen['n'] >= min_repeticiones - 1) & (resumen['mediana'] >= MIN_INTERVALO_DIAS)]
+    mediana = intervalos['grupo'].map(resumen['mediana'])
+    regular = (intervalos['intervalo'] - mediana).abs() <= np.maximum(mediana * tolerancia_intervalo, TOLERANCIA_INTERVALO_DIAS)
+    proporcion = regular.groupby(intervalos['grupo']).mean().reindex(resumen.index)
+    resumen = resumen[proporcion >= PROPORCION_REGULAR]
+    # Solo periodicidades de pagos reales (semanal, mensual, anual...)
+    periodo = _periodo_cercano(resumen['mediana'].to_numpy(dtype='float64'))
+    resumen = resumen.assign(periodo=periodo)[periodo > 0]
+    if resumen.empty:
+        return pd.DataFrame(columns=columnas)
+    
+    # Datos de cada grupo regular: la última aparición y el monto típico
+    ultima = pd.Series(filas).groupby(grupo).last().reindex(resumen.index).to_numpy()
+    monto_tipico = pd.Series(monto[filas]).groupby(grupo).median().reindex(resumen.index).to_numpy()
+    intervalo = resumen['mediana'].to_numpy(dtype='float64')
+    fecha_ultima = df['Fecha'].to_numpy()[ultima]
+    return pd.DataFrame({
+        'Categoria': df['Categoria'].to_numpy()[ultima],
+        'Monto': monto_tipico,
+        'Repeticiones': resumen['n'].to_numpy() + 1,
+        'Intervalo_dias': intervalo,
+        'Periodicidad': resumen['periodo'].map(PERIODICIDADES).to_numpy(),
+        'Ultima': fecha_ultima,
+        'Proxima': fecha_ultima + np.round(intervalo).astype('int64') * np.timedelta64(1, 'D')
+    }).sort_values('Monto', key=np.abs, ascending=False, ignore_index=True)
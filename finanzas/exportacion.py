@@ -0,0 +1,211 @@
+"""
+Exportación del histórico y las metas (Excel, CSV y Parquet)
+"""
+import importlib.util
+import io
+from datetime import datetime
+
+import pandas as pd
+
+from finanzas.ingesta import COLUMNAS_REQUERIDAS
+from finanzas.instrumentacion import medido
+from finanzas.metas import tabla_metas
+
+FORMATO_FECHA_EXCEL = 'DD/MM/YYYY'
+FECHA_BASE_EXCEL = pd.Timestamp('1899-12-30')
+
+def _instrucciones_archivo_personal(num_transacciones, num_metas):
+    return [
+        '=== TU ARCHIVO PERSONAL ===',
+        f'Archivo generado el: {datetime.now().strftime("%d/%m/%Y %H:%M")}',
+        f'Transacciones en histórico: {num_transacciones}',
+        f'Metas activas: {num_metas}',
+        '',
+        '=== CÓMO USAR ===',
+        '1. Agrega NUEVAS transacciones SOLO en la hoja "Transacciones"',
+        '2. ELIMINA el ejemplo antes de agregar tus datos',
+        '3. NO modifiques las hojas "Historico" ni "Metas"',
+        '4. La app combinará histórico + nuevos datos automáticamente',
+        '',
+        '=== FORMATO TRANSACCIONES ===',
+        'Fecha: DD/MM/YYYY (ej: 17/04/2024) - ¡MUY IMPORTANTE!',
+        'Categoria: Vivienda, Alimentación, Transporte, etc.',
+        'Tipo: Gasto o Ingreso',
+        'Monto: Negativo para gastos (-900), positivo para ingresos',
+        '',
+        '=== EJEMPLO CORRECTO ===',
+        '17/04/2024    Vivienda    Gasto    -900',
+        '18/04/2024    Salario     Ingreso   3000',
+        '',
+        '=== IMPORTANTE FECHAS ===',
+        'Excel puede cambiar formato automáticamente.',
+        'Si ves fechas raras, verifica que estén en DD/MM/YYYY'
+    ]
+
+def _escribir_hoja_xlsxwriter(libro, nombre, df, formato_fecha):
+    """Escribir un DataFrame fila a fila (requisito del modo constant_memory)"""
+    hoja = libro.add_worksheet(nombre)
+    hoja.write_row(0, 0, [str(col) for col in df.columns])
+    
+    columnas = []
+    tipos = []
+    for col in df.columns:
+        serie = df[col]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            # Fechas como número de serie de Excel con formato DD/MM/YYYY
+            columnas.append(((serie - FECHA_BASE_EXCEL) / pd.Timedelta(days=1)).tolist())
+            tipos.append('fecha')
+        elif pd.api.types.is_numeric_dtype(serie):
+            columnas.append(serie.astype('float64').tolist())
+            tipos.append('numero')
+        else:
+            columnas.append(serie.astype(object).tolist())
+            tipos.append('texto')
+    
+    for fila, valores in enumerate(zip(*columnas), start=1):
+        for col, (valor, tipo) in enumerate(zip(valores, tipos)):
+            if valor is None or valor != valor:  # Celda vacía (None/NaN/NaT)
+                continue
+            if tipo == 'fecha':
+                hoja.write_number(fila, col, valor, formato_fecha)
+            elif tipo == 'numero':
+                hoja.write_number(fila, col, valor)
+            else:
+                hoja.write_string(fila, col, str(valor))
+
+@medido()
+def _escribir_libro(hojas):
+    """
+    Crear un .xlsx en memoria a partir de una lista (nombre, DataFrame)
+    Usa xlsxwriter en modo constant_memory si está instalado y openpyxl si no;
+    en ambos casos las fechas quedan como fechas nativas DD/MM/YYYY
+    """
+    # El motor de Excel se importa solo al escribir, no al cargar la app
+    try:
+        import xlsxwriter
+    except ImportError:  # Sin xlsxwriter se exporta con openpyxl
+        xlsxwriter = None
+    
+    output = io.BytesIO()
+    
+    if xlsxwriter is not None:
+        libro = xlsxwriter.Workbook(output, {'constant_memory': True, 'in_memory': False})
+        formato_fecha = libro.add_format({'num_format': FORMATO_FECHA_EXCEL.lower()})
+        for nombre, df in hojas:
+            _escribir_hoja_xlsxwriter(libro, nombre, df, formato_fecha)
+        libro.close()
+    else:
+        with pd.ExcelWriter(
+            output, engine='openpyxl', mode='w',
+            date_format=FORMATO_FECHA_EXCEL, datetime_format=FORMATO_FECHA_EXCEL
+        ) as writer:
+            for nombre, df in hojas:
+                df.to_excel(writer, index=False, sheet_name=nombre)
+    
+    return output.getvalue()
+
+@medido()
+def crear_plantilla_excel():
+    """Crear plantilla de Excel para descargar"""
+    datos_ejemplo = {
+        'Fecha': ['15/01/2024', '16/01/2024', '17/01/2024'],
+        'Categoria': ['Alimentación', 'Transporte', 'Entretenimiento'],
+        'Tipo': ['Gasto', 'Gasto', 'Gasto'],
+        'Monto': [-150, -80, -200]
+    }
+    df_transacciones = pd.DataFrame(datos_ejemplo)
+    
+    # Crear DataFrame de metas vacío para la plantilla
+    df_metas = pd.DataFrame({
+        'Nombre_Meta': [],
+        'Monto_Objetivo': [],
+        'Fecha_Limite': [],
+        'Fecha_Creacion': []
+    })
+    
+    # Agregar instrucciones como DataFrame simple
+    instrucciones = pd.DataFrame({
+        'INSTRUCCIONES': [
+            '=== HOJA TRANSACCIONES ===',
+            '1. Llena la columna Fecha con formato DD/MM/YYYY',
+            '2. Categoria: Alimentación, Transporte, Entretenimiento, Salario, etc.',
+            '3. Tipo: Gasto (negativo) o Ingreso (positivo)',
+            '4. Monto: Usa números negativos para gastos, positivos para ingresos',
+            '5. Elimina estas filas de ejemplo antes de subir tu archivo',
+            '',
+            '=== HOJA METAS ===',
+            '6. Las metas se guardan automáticamente en esta hoja',
+            '7. NO modifiques manualmente la hoja de Metas',
+            '8. Usa la aplicación para agregar/eliminar metas',
+            '',
+            '=== IMPORTANTE ===',
+            '9. Siempre descarga tu archivo actualizado después de hacer cambios',
+            '10. Usa ese archivo actualizado para futuras cargas',
+            '11. FORMATO DE FECHA: DD/MM/YYYY (ejemplo: 15/01/2024)'
+        ]
+    })
+    
+    # Convertir a Excel en memoria
+    return _escribir_libro([
+        ('Transacciones', df_transacciones),
+        ('Metas', df_metas),
+        ('Instrucciones', instrucciones)
+    ])
+
+@medido()
+def crear_excel_con_datos_actuales(df, metas):
+    """Crear Excel con histórico y hoja de transacciones vacía para nuevos datos"""
+    # Hoja de TRANSACCIONES - SIEMPRE VACÍA para nuevos registros
+    df_transacciones_vacia = pd.DataFrame({
+        'Fecha': ['17/04/2024'],  # Ejemplo con formato DD/MM/YYYY
+        'Categoria': ['Vivienda'],
+        'Tipo': ['Gasto'],
+        'Monto': [-900]
+    })
+    
+    # Hoja de HISTORICO - Todas las transacciones previas (solo columnas persistidas)
+    if not df.empty:
+        df_historico = df[COLUMNAS_REQUERIDAS]
+    else:
+        df_historico = pd.DataFrame(columns=COLUMNAS_REQUERIDAS)
+    
+    instrucciones = pd.DataFrame({
+        'INSTRUCCIONES_ACTUALIZADAS': _instrucciones_archivo_personal(len(df), len(metas))
+    })
+    
+    return _escribir_libro([
+        ('Transacciones', df_transacciones_vacia),
+        ('Historico', df_historico),
+        ('Metas', tabla_metas(metas)),
+        ('Instrucciones', instrucciones)
+    ])
+
+@medido()
+def exportar_historico_csv(df, metas=None):
+    """Exportar el histórico como CSV (fechas DD/MM/YYYY), más rápido que Excel; no incluye metas"""
+    # Sin transacciones (solo metas) se genera el archivo con los encabezados
+    return df.reindex(columns=COLUMNAS_REQUERIDAS).to_csv(index=False, date_format='%d/%m/%Y').encode('utf-8-sig')
+
+@medido()
+def exportar_historico_parquet(df, metas=None):
+    """Exportar el histórico como Parquet (requiere pyarrow); no incluye metas"""
+    output = io.BytesIO()
+    df.reindex(columns=COLUMNAS_REQUERIDAS).to_parquet(output, index=False)
+    return output.getvalue()
+
+# Formatos de exportación: etiqueta -> (generador(df, metas), extensión, tipo MIME)
+FORMATOS_EXPORTACION = {
+    'Excel (.xlsx)': (crear_excel_con_datos_actuales, 'xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'CSV (solo histórico)': (exportar_historico_csv, 'csv', 'text/csv'),
+}
+# Parquet es opcional: se comprueba si pyarrow está instalado sin importarlo
+if importlib.util.find_spec('pyarrow') is not None:
+    FORMATOS_EXPORTACION['Parquet (solo histórico)'] = (exportar_historico_parquet, 'parquet', 'application/octet-stream')
+
+def formato_por_extension(extension):
+    """Etiqueta del formato de exportación con esa extensión, o None"""
+    extension = extension.lower().lstrip('.')
+    for formato, (_, ext, _) in FORMATOS_EXPORTACION.items():
+        if ext == extension:
+            return formato
+    return None
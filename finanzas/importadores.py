@@ -0,0 +1,435 @@
+"""
+Importadores de CSV y extractos bancarios con normalización en streaming
+
+Cada importador reconoce un formato (el CSV que exporta la app, el CSV de un
+banco, un extracto OFX) y lo lee por bloques, con las columnas como vienen en
+el archivo. Cada bloque recorre una cadena de generadores:
+
+    leer → mapear columnas → parsear fechas → signo de Monto según Tipo
+         → categorizar → validar
+
+y solo se acumulan las filas ya normalizadas, con tipos compactos: el archivo
+completo sin procesar nunca está en memoria junto con el resultado. Con
+pyarrow instalado los CSV se leen con su lector en streaming; sin él, con
+pandas por bloques de filas.
+"""
+import csv
+import importlib.util
+import io
+import re
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from finanzas.categorizacion import categorizador_por_defecto, normalizar_clave, unificar_categorias
+from finanzas.ingesta import (
+    COLUMNAS_REQUERIDAS,
+    concatenar_transacciones,
+    normalizar_tipos_transacciones,
+    parsear_fechas_columna,
+)
+from finanzas.instrumentacion import medido
+
+PYARROW_DISPONIBLE = importlib.util.find_spec('pyarrow') is not None
+
+# Tamaño de cada bloque: bytes para el lector de pyarrow, filas para el de pandas
+BYTES_BLOQUE_IMPORTACION = 4 << 20
+FILAS_BLOQUE_IMPORTACION = 50_000
+# Inicio del archivo que se usa para reconocer el formato
+BYTES_CABECERA = 64 << 10
+# Los bancos suelen poner los datos de la cuenta antes de los encabezados
+LINEAS_PREAMBULO = 20
+SEPARADORES = [',', ';', '\t', '|']
+# Solo las celdas vacías cuentan como vacías: 'NA' o 'N/A' se leen como texto,
+# igual que en una celda de Excel
+VALORES_NULOS = ['']
+
+CATEGORIA_SIN_ASIGNAR = 'Sin categoría'
+# Tipos de movimiento de los bancos (normalizados con normalizar_clave) -> Tipo de la app
+TIPOS_MOVIMIENTO = {
+    'gasto': 'Gasto', 'cargo': 'Gasto', 'debito': 'Gasto', 'debit': 'Gasto', 'retiro': 'Gasto', 'pago': 'Gasto',
+    'ingreso': 'Ingreso', 'abono': 'Ingreso', 'credito': 'Ingreso', 'credit': 'Ingreso', 'deposito': 'Ingreso',
+}
+
+PATRON_MOVIMIENTO_OFX = re.compile(r'<STMTTRN>(.*?)</STMTTRN>', re.IGNORECASE | re.DOTALL)
+PATRON_CAMPO_OFX = re.compile(r'<([A-Za-z0-9.]+)>([^<\r\n]*)')
+
+IMPORTADORES = {}
+
+def registrar_importador(nombre, columnas, lector='csv', extensiones=('.csv',), requeridas=('Fecha', 'Monto'),
+                         separador=None, decimal=None, signo=None, categoria=None, historico=False):
+    """
+    Agregar (o reemplazar) un importador; se prueban en orden de registro
+    columnas: columna de destino -> nombres posibles en el archivo, que se
+    comparan sin acentos ni mayúsculas · lector: 'csv' u 'ofx' · separador y
+    decimal: None para deducirlos del archivo · signo: None deja Monto como
+    viene; 'tipo' lo hace negativo para gastos y positivo para ingresos (sin
+    un Tipo reconocible, Tipo se deduce del signo) · categoria: la de las filas
+    sin una (None: se descartan, como en la plantilla) · historico: contar las
+    filas como históricas en lugar de nuevas
+    """
+    IMPORTADORES[nombre] = {
+        'nombre': nombre,
+        'columnas': {destino: list(origenes) for destino, origenes in columnas.items()},
+        'lector': lector,
+        'extensiones': tuple(extensiones),
+        'requeridas': list(requeridas),
+        'separador': separador,
+        'decimal': decimal,
+        'signo': signo,
+        'categoria': categoria,
+        'historico': historico
+    }
+
+# El CSV que exporta la app: mismas columnas y valores que la hoja Transacciones
+registrar_importador(
+    'finanzas', {col: [col] for col in COLUMNAS_REQUERIDAS},
+    requeridas=COLUMNAS_REQUERIDAS, separador=',', decimal='.', historico=True
+)
+registrar_importador('extracto_csv', {
+    'Fecha': ['Fecha', 'Fecha operacion', 'Fecha de operacion', 'F. operacion', 'Fecha valor', 'Fecha contable', 'Date'],
+    'Monto': ['Importe', 'Monto', 'Cantidad', 'Valor', 'Amount'],
+    'Tipo': ['Tipo', 'Tipo de movimiento', 'Movimiento', 'Type'],
+    'Categoria': ['Categoria', 'Category'],
+    'Concepto': ['Concepto', 'Descripcion', 'Detalle', 'Referencia', 'Description'],
+}, signo='tipo', categoria=CATEGORIA_SIN_ASIGNAR)
+registrar_importador('ofx', {
+    'Fecha': ['DTPOSTED'],
+    'Monto': ['TRNAMT'],
+    'Tipo': ['TRNTYPE'],
+    'Concepto': ['NAME', 'MEMO'],
+}, lector='ofx', extensiones=('.ofx', '.qfx'), decimal='.', signo='tipo', categoria=CATEGORIA_SIN_ASIGNAR)
+
+def es_importable(nombre):
+    """Indicar si algún importador admite la extensión del archivo"""
+    return any(nombre.lower().endswith(imp['extensiones']) for imp in IMPORTADORES.values())
+
+def _resolver_columnas(importador, encabezados):
+    """Mapa columna del archivo -> columna de destino, o None si faltan requeridas"""
+    por_clave = {}
+    for encabezado in encabezados:
+        por_clave.setdefault(normalizar_clave(encabezado), encabezado)
+    columnas = {}
+    for destino, origenes in importador['columnas'].items():
+        for origen in origenes:
+            encabezado = por_clave.get(normalizar_clave(origen))
+            if encabezado is not None and encabezado not in columnas:
+                columnas[encabezado] = destino
+                break
+    if not all(destino in columnas.values() for destino in importador['requeridas']):
+        return None
+    return columnas
+
+def _detectar_decimal(muestra):
+    """',' si algún monto de la muestra usa coma decimal (1.234,56 o 12,5), si no '.'"""
+    return ',' if any(re.search(r'\d,\d{1,2}$', str(valor).strip()) for valor in muestra) else '.'
+
+def _reconocer_csv(importador, texto):
+    """Separador, fila de encabezados y columnas del CSV, o None si no es de este importador"""
+    lineas = texto.splitlines()[:LINEAS_PREAMBULO]
+    separadores = [importador['separador']] if importador['separador'] else SEPARADORES
+    for numero, linea in enumerate(lineas):
+        for separador in separadores:
+            encabezados = next(csv.reader([linea], delimiter=separador), [])
+            columnas = _resolver_columnas(importador, encabezados)
+            if columnas is None:
+                continue
+            decimal = importador['decimal']
+            if decimal is None:
+                posicion = encabezados.index(next(origen for origen, destino in columnas.items() if destino == 'Monto'))
+                filas = csv.reader(lineas[numero + 1:], delimiter=separador)
+                decimal = _detectar_decimal(fila[posicion] for fila in filas if posicion < len(fila))
+            return {'separador': separador, 'saltar': numero, 'columnas': columnas, 'decimal': decimal}
+    return None
+
+def _reconocer_ofx(importador, texto):
+    """Columnas del extracto OFX (según las etiquetas del primer movimiento), o None"""
+    if '<OFX>' not in texto.upper():
+        return None
+    movimiento = PATRON_MOVIMIENTO_OFX.search(texto)
+    etiquetas = [etiqueta.upper() for etiqueta, _ in PATRON_CAMPO_OFX.findall(movimiento.group(1))] if movimiento else []
+    columnas = _resolver_columnas(importador, etiquetas)
+    if columnas is None:
+        return None
+    return {'saltar': 0, 'columnas': columnas, 'decimal': importador['decimal']}
+
+def _leer_cabecera(archivo):
+    """Inicio del archivo como texto y su codificación (UTF-8 o, si no lo es, Windows-1252)"""
+    cabecera = archivo.read(BYTES_CABECERA)
+    archivo.seek(0)
+    try:
+        texto, codificacion = cabecera.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError as error:
+        # Un carácter de varios bytes cortado al final de la cabecera no cuenta
+        if error.start >= len(cabecera) - 3:
+            texto, codificacion = cabecera[:error.start].decode('utf-8'), 'utf-8'
+        else:
+            texto, codificacion = cabecera.decode('cp1252', errors='replace'), 'cp1252'
+    return texto.lstrip('\ufeff'), codificacion
+
+@medido()
+def reconocer_formato(archivo, nombre='', importador=None):
+    """
+    Elegir el importador de un archivo abierto en binario y los detalles de su
+    formato (separador, fila de encabezados, columnas, coma decimal)
+    Devuelve (importador, formato); ValueError si ningún importador lo reconoce
+    """
+    texto, codificacion = _leer_cabecera(archivo)
+    if importador is not None:
+        candidatos = [IMPORTADORES[importador]]
+    else:
+        candidatos = [imp for imp in IMPORTADORES.values() if nombre.lower().endswith(imp['extensiones'])]
+        candidatos = candidatos or list(IMPORTADORES.values())
+    for candidato in candidatos:
+        reconocer = _reconocer_ofx if candidato['lector'] == 'ofx' else _reconocer_csv
+        formato = reconocer(candidato, texto)
+        if formato is not None:
+            return candidato, dict(formato, codificacion=codificacion)
+    raise ValueError(
+        "no se reconocen las columnas del archivo; se esperaba Fecha, Categoria, Tipo y Monto "
+        "o un extracto bancario con fecha e importe"
+    )
+
+# Aviso de pandas (on_bad_lines='warn') por cada fila con otro número de columnas
+PATRON_FILA_MALFORMADA = re.compile(r'Skipping line (\d+): expected (\d+) fields, saw (\d+)')
+
+def _indices_sin_descartadas(inicio, filas, descartadas):
+    """
+    Índices (fila del archivo - 2) de las filas de un bloque que empieza en
+    inicio, saltando los de las filas descartadas por el lector
+    """
+    saltadas = np.array(sorted(indice for indice in descartadas if indice >= inicio), dtype='int64')
+    if saltadas.size == 0:
+        return pd.RangeIndex(inicio, inicio + filas)
+    candidatos = np.arange(inicio, inicio + filas + saltadas.size, dtype='int64')
+    return pd.Index(np.setdiff1d(candidatos, saltadas)[:filas])
+
+def _bloques_csv(archivo, formato, reporte):
+    """
+    Bloques del CSV con las columnas reconocidas como texto; índice = fila del
+    archivo - 2. Las filas con otro número de columnas que los encabezados se
+    descartan y se cuentan en reporte, con su número de fila
+    """
+    origenes = list(formato['columnas'])
+    descartadas = set()
+    
+    def descartar(fila, columnas, esperadas):
+        reporte['filas_malformadas'] += 1
+        reporte['filas_problematicas'].append(f"Fila {fila or '?'}: {columnas} columnas en lugar de {esperadas}")
+        if fila is not None:
+            descartadas.add(fila - 2)
+    
+    if PYARROW_DISPONIBLE:
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+        
+        lector = pa_csv.open_csv(
+            archivo,
+            read_options=pa_csv.ReadOptions(
+                skip_rows=formato['saltar'], block_size=BYTES_BLOQUE_IMPORTACION, encoding=formato['codificacion']
+            ),
+            parse_options=pa_csv.ParseOptions(
+                delimiter=formato['separador'],
+                invalid_row_handler=lambda fila: descartar(fila.number, fila.actual_columns, fila.expected_columns) or 'skip'
+            ),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=origenes, column_types={col: pa.string() for col in origenes},
+                null_values=VALORES_NULOS, strings_can_be_null=True
+            )
+        )
+        partes = (lote.to_pandas() for lote in lector)
+    else:
+        # Sin usecols: con él, pandas acepta en silencio las filas con columnas de más
+        partes = _bloques_pandas(pd.read_csv(
+            archivo, sep=formato['separador'], skiprows=formato['saltar'], dtype=str,
+            keep_default_na=False, na_values=VALORES_NULOS, on_bad_lines='warn', chunksize=FILAS_BLOQUE_IMPORTACION,
+            encoding='utf-8-sig' if formato['codificacion'] == 'utf-8' else formato['codificacion']
+        ), descartar)
+    inicio = formato['saltar']
+    for bloque in partes:
+        bloque.index = _indices_sin_descartadas(inicio, len(bloque), descartadas)
+        if len(bloque):
+            inicio = int(bloque.index[-1]) + 1
+        yield bloque
+
+def _bloques_pandas(lector, descartar):
+    """Bloques de read_csv; las filas que pandas salta (con un aviso) se pasan a descartar"""
+    while True:
+        with warnings.catch_warnings(record=True) as avisos:
+            warnings.simplefilter('always', pd.errors.ParserWarning)
+            bloque = next(lector, None)
+        for aviso in avisos:
+            for fila, esperadas, columnas in PATRON_FILA_MALFORMADA.findall(str(aviso.message)):
+                descartar(int(fila), int(columnas), int(esperadas))
+        if bloque is None:
+            return
+        yield bloque
+
+def _bloques_ofx(archivo, formato, reporte):
+    """
+    Bloques de movimientos (<STMTTRN>) de un extracto OFX, leyendo el archivo
+    por trozos; las fechas OFX (AAAAMMDDHHMMSS...) se recortan a AAAA-MM-DD
+    (reporte no se usa: los movimientos no tienen columnas que puedan faltar)
+    """
+    etiquetas = list(formato['columnas'])
+    texto = io.TextIOWrapper(archivo, encoding=formato['codificacion'], errors='replace', newline='')
+    pendiente = ''
+    filas = []
+    inicio = 0
+    while True:
+        trozo = texto.read(BYTES_BLOQUE_IMPORTACION)
+        pendiente += trozo
+        fin = 0
+        for movimiento in PATRON_MOVIMIENTO_OFX.finditer(pendiente):
+            campos = {etiqueta.upper(): valor.strip() for etiqueta, valor in PATRON_CAMPO_OFX.findall(movimiento.group(1))}
+            filas.append([campos.get(etiqueta) or None for etiqueta in etiquetas])
+            fin = movimiento.end()
+        pendiente = pendiente[fin:]
+        
+        if filas and (len(filas) >= FILAS_BLOQUE_IMPORTACION or not trozo):
+            bloque = pd.DataFrame(filas, columns=etiquetas, index=pd.RangeIndex(inicio, inicio + len(filas)), dtype=object)
+            for etiqueta in etiquetas:
+                if etiqueta.startswith('DT'):
+                    dia = bloque[etiqueta].str.slice(0, 8)
+                    bloque[etiqueta] = dia.str.slice(0, 4) + '-' + dia.str.slice(4, 6) + '-' + dia.str.slice(6, 8)
+            inicio += len(filas)
+            filas = []
+            yield bloque
+        if not trozo:
+            break
+    # No cerrar el archivo de origen al descartar el envoltorio de texto
+    texto.detach()
+
+LECTORES = {'csv': _bloques_csv, 'ofx': _bloques_ofx}
+
+def _a_numero(texto, decimal):
+    """
+    Montos de texto a float64 (NaN si no son un número), redondeados igual que
+    float(); se quitan los separadores de miles ('.' o ',', según el decimal)
+    seguidos de grupos de tres cifras, así "1,5" con punto decimal no es 15
+    """
+    miles = re.escape(',' if decimal == '.' else '.')
+    texto = texto.str.strip().str.replace(rf'(?<=\d){miles}(?=\d{{3}}(?!\d))', '', regex=True)
+    if decimal != '.':
+        texto = texto.str.replace(decimal, '.', regex=False)
+    validos = pd.to_numeric(texto, errors='coerce').notna().to_numpy()
+    # to_numeric puede diferir de float() en el último dígito: los válidos se
+    # convierten de nuevo para obtener lo mismo que al leer la celda de Excel
+    numeros = np.full(len(texto), np.nan)
+    numeros[validos] = texto[validos].to_numpy(dtype=object).astype('float64')
+    return pd.Series(numeros, index=texto.index)
+
+def _mapear_columnas(bloques, formato):
+    """
+    Renombrar las columnas del archivo a las de la app y convertir Monto a
+    número; el texto de los montos que no se pudieron interpretar se guarda
+    aparte para informarlos al validar
+    """
+    for bloque in bloques:
+        bloque = bloque[list(formato['columnas'])].rename(columns=formato['columnas'])
+        montos = _a_numero(bloque['Monto'], formato['decimal'])
+        yield bloque.assign(Monto=montos, Monto_original=bloque['Monto'].where(montos.isna()))
+
+def _parsear_fechas(bloques):
+    """
+    Convertir Fecha a datetime64[ns]; el texto original de las fechas que no se
+    pudieron interpretar se guarda aparte para informarlas al validar
+    """
+    for bloque in bloques:
+        fechas = parsear_fechas_columna(bloque['Fecha'])
+        yield bloque.assign(Fecha=fechas, Fecha_original=bloque['Fecha'].where(fechas.isna()))
+
+def _tipo_movimiento(tipos):
+    """Tipo de la app (Gasto / Ingreso) de cada movimiento, NaN si no se reconoce"""
+    mapa = {valor: TIPOS_MOVIMIENTO.get(normalizar_clave(valor)) for valor in tipos.dropna().unique()}
+    return tipos.map(mapa)
+
+def _normalizar_signo(bloques, importador):
+    """Monto negativo para gastos y positivo para ingresos, según Tipo o, sin él, según el signo"""
+    for bloque in bloques:
+        if importador['signo'] == 'tipo':
+            monto = bloque['Monto']
+            tipo = _tipo_movimiento(bloque['Tipo']) if 'Tipo' in bloque else pd.Series(np.nan, index=bloque.index, dtype=object)
+            tipo = tipo.where(tipo.notna(), np.where(monto < 0, 'Gasto', 'Ingreso'))
+            bloque = bloque.assign(Tipo=tipo, Monto=monto.abs().where(tipo == 'Ingreso', -monto.abs()))
+        yield bloque
+
+def _categorizar(bloques, importador, categorizador):
+    """
+    Aplicar las reglas de categorización al Concepto del movimiento (o, si el
+    archivo no lo trae, a la propia Categoria); las filas que no cumplen
+    ninguna conservan su categoría o reciben la del importador
+    """
+    for bloque in bloques:
+        categoria = bloque['Categoria'] if 'Categoria' in bloque else pd.Series(np.nan, index=bloque.index, dtype=object)
+        if categorizador.reglas:
+            textos = bloque['Concepto'] if 'Concepto' in bloque else categoria
+            categoria = categorizador.categorizar(textos, bloque['Monto'], categoria)
+        if importador['categoria'] is not None:
+            categoria = categoria.fillna(importador['categoria'])
+        yield bloque.assign(Categoria=categoria)
+
+def _validar(bloques, reporte):
+    """
+    Descartar filas incompletas (igual que la hoja Transacciones) y con fecha
+    o monto inválido, que se cuentan en reporte; devuelve bloques con tipos
+    compactos
+    """
+    for bloque in bloques:
+        fecha_presente = bloque['Fecha'].notna() | bloque['Fecha_original'].notna()
+        monto_presente = bloque['Monto'].notna() | bloque['Monto_original'].notna()
+        completas = bloque[['Categoria', 'Tipo']].notna().all(axis=1) & fecha_presente & monto_presente
+        invalidas = completas & bloque['Fecha'].isna()
+        montos_invalidos = completas & ~invalidas & bloque['Monto'].isna()
+        # Mismo índice que read_excel: fila del archivo menos 2
+        if invalidas.any():
+            reporte['omitidas'] += int(invalidas.sum())
+            reporte['fechas_problematicas'].extend(
+                f"Fila {idx+2}: {valor}" for idx, valor in bloque.loc[invalidas, 'Fecha_original'].items()
+            )
+        if montos_invalidos.any():
+            reporte['montos_omitidos'] += int(montos_invalidos.sum())
+            reporte['montos_problematicos'].extend(
+                f"Fila {idx+2}: {valor}" for idx, valor in bloque.loc[montos_invalidos, 'Monto_original'].items()
+            )
+        validas = bloque.loc[completas & ~invalidas & ~montos_invalidos, COLUMNAS_REQUERIDAS]
+        reporte['filas'] += len(validas)
+        if not validas.empty:
+            yield normalizar_tipos_transacciones(validas)
+
+@medido()
+def importar_transacciones(fuente, nombre='', importador=None, categorizador=None):
+    """
+    Leer un CSV o un extracto bancario con la cadena de normalización
+    fuente: bytes del archivo o su ruta (una ruta se lee del disco por bloques)
+    importador: nombre en IMPORTADORES; por defecto se elige por la extensión
+    de nombre y los encabezados · categorizador: por defecto, el de las reglas
+    de FINANZAS_REGLAS. Devuelve un diccionario con las transacciones (None si
+    no hay ninguna válida), el importador usado, las filas válidas y las
+    omitidas por fecha o monto inválido o por tener otro número de columnas
+    """
+    categorizador = categorizador or categorizador_por_defecto()
+    reporte = {'transacciones': None, 'importador': None, 'historico': False,
+               'filas': 0, 'omitidas': 0, 'fechas_problematicas': [],
+               'montos_omitidos': 0, 'montos_problematicos': [],
+               'filas_malformadas': 0, 'filas_problematicas': []}
+    with (io.BytesIO(fuente) if isinstance(fuente, bytes) else open(fuente, 'rb')) as archivo:
+        elegido, formato = reconocer_formato(archivo, nombre or (fuente if isinstance(fuente, str) else ''), importador)
+        reporte.update(importador=elegido['nombre'], historico=elegido['historico'])
+        
+        bloques = LECTORES[elegido['lector']](archivo, formato, reporte)
+        bloques = _mapear_columnas(bloques, formato)
+        bloques = _parsear_fechas(bloques)
+        bloques = _normalizar_signo(bloques, elegido)
+        bloques = _categorizar(bloques, elegido, categorizador)
+        partes = list(_validar(bloques, reporte))
+    
+    df = concatenar_transacciones(partes)
+    if not df.empty:
+        # Una sola grafía por categoría y categorías en orden alfabético, como
+        # al convertir la hoja completa
+        df['Categoria'] = unificar_categorias(df['Categoria'], categorizador.categorias)
+        df['Tipo'] = df['Tipo'].cat.reorder_categories(sorted(df['Tipo'].cat.categories))
+        reporte['transacciones'] = df
+    return reporte
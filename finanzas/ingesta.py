@@ -0,0 +1,455 @@
+"""
+Lectura y normalización de archivos de finanzas personales
+
+Funciones puras (sin Streamlit): leen los bytes de un archivo Excel, validan
+las columnas, parsean fechas y devuelven las transacciones con tipos
+compactos; los CSV y extractos bancarios pasan por finanzas.importadores.
+Se pueden usar desde la app, desde procesos de trabajo o en lote.
+"""
+import io
+import unicodedata
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from finanzas.instrumentacion import medido
+
+# Formatos de fecha aceptados, en orden de prioridad
+FORMATOS_FECHA = [
+    '%d/%m/%Y',     # 15/01/2024
+    '%d-%m-%Y',     # 15-01-2024
+    '%Y-%m-%d',     # 2024-01-15
+    '%Y/%m/%d',     # 2024/01/15
+    '%d/%m/%y',     # 15/01/24
+    '%d-%m-%y',     # 15-01-24
+    '%m/%d/%Y',     # 01/15/2024
+    '%m-%d-%Y',     # 01-15-2024
+]
+
+# Rango válido de números de serie de Excel (1970-01-01 a 9999-12-31)
+SERIAL_EXCEL_MINIMO = 25569
+SERIAL_EXCEL_MAXIMO = 2958465
+
+COLUMNAS_REQUERIDAS = ['Fecha', 'Categoria', 'Tipo', 'Monto']
+
+def _a_datetime_ns(serie):
+    """Convertir a datetime64[ns] descartando fechas fuera de rango"""
+    fuera_de_rango = (serie < pd.Timestamp.min) | (serie > pd.Timestamp.max)
+    return serie.mask(fuera_de_rango).astype('datetime64[ns]')
+
+@medido()
+def parsear_fechas_columna(valores):
+    """
+    Parsear una columna completa de fechas de forma vectorizada
+    Acepta datetimes, números de serie de Excel y textos en FORMATOS_FECHA;
+    cada formato se prueba solo sobre las filas que siguen sin interpretar.
+    Devuelve una serie datetime64[ns] con NaT donde la fecha no es válida
+    """
+    serie = pd.Series(valores)
+    indice_original = serie.index
+    serie = serie.reset_index(drop=True)
+    resultado = pd.Series(pd.NaT, index=serie.index, dtype='datetime64[ns]')
+    
+    if serie.empty:
+        pass
+    elif pd.api.types.is_datetime64_any_dtype(serie):
+        # Columna ya tipada como fecha (caso habitual al leer Excel)
+        if getattr(serie.dt, 'tz', None) is not None:
+            serie = serie.dt.tz_localize(None)
+        resultado = _a_datetime_ns(serie)
+    else:
+        _parsear_por_clase(serie, resultado)
+    
+    resultado.index = indice_original
+    return resultado
+
+def _parsear_texto_libre(texto):
+    """Último recurso para un texto que no encaja en FORMATOS_FECHA"""
+    try:
+        fecha = pd.to_datetime(texto, dayfirst=True)
+    except (ValueError, TypeError, OverflowError):
+        return pd.NaT
+    if pd.isna(fecha) or not (pd.Timestamp.min <= fecha.replace(tzinfo=None) <= pd.Timestamp.max):
+        return pd.NaT
+    return fecha.tz_localize(None) if fecha.tzinfo is not None else fecha
+
+def _parsear_por_clase(serie, resultado):
+    """Rellenar resultado parseando cada tipo de valor en pasadas vectorizadas"""
+    # Clasificar cada valor una sola vez: 1=fecha, 2=número, 3=texto
+    if isinstance(serie.dtype, pd.StringDtype):
+        # Columna de texto (leída de un CSV): todo lo que no está vacío es texto
+        clases = np.where(serie.notna().to_numpy(), 3, 0).astype(np.int8)
+    else:
+        clases = np.fromiter(
+            (
+                1 if isinstance(v, datetime)
+                else 2 if isinstance(v, (int, float, np.number)) and not isinstance(v, (bool, np.bool_))
+                else 3 if isinstance(v, str)
+                else 0
+                for v in serie.to_numpy(dtype=object)
+            ),
+            dtype=np.int8,
+            count=len(serie)
+        )
+    
+    es_fecha = clases == 1
+    if es_fecha.any():
+        try:
+            fechas = pd.to_datetime(serie[es_fecha], errors='coerce')
+            if getattr(fechas.dt, 'tz', None) is not None:
+                fechas = fechas.dt.tz_localize(None)
+        except (ValueError, TypeError):
+            # Mezcla de fechas con y sin zona horaria
+            fechas = pd.Series(
+                [_parsear_texto_libre(v) for v in serie[es_fecha]],
+                index=serie.index[es_fecha],
+                dtype='datetime64[ns]'
+            )
+        resultado[es_fecha] = _a_datetime_ns(fechas)
+    
+    # Números de serie de Excel (Excel cuenta desde 1899-12-30)
+    es_numero = clases == 2
+    if es_numero.any():
+        numeros = pd.to_numeric(serie[es_numero], errors='coerce').astype('float64')
+        validos = numeros[(numeros > SERIAL_EXCEL_MINIMO) & (numeros <= SERIAL_EXCEL_MAXIMO)]
+        if not validos.empty:
+            resultado[validos.index] = pd.to_datetime(validos, origin='1899-12-30', unit='D')
+    
+    # Textos: probar cada formato solo sobre lo que aún no se ha interpretado
+    es_texto = clases == 3
+    if es_texto.any():
+        pendientes = serie[es_texto].astype(object).str.strip()
+        for formato in FORMATOS_FECHA:
+            if pendientes.empty:
+                break
+            parseadas = pd.to_datetime(pendientes, format=formato, errors='coerce')
+            exitosas = parseadas.notna()
+            if exitosas.any():
+                resultado[pendientes.index[exitosas]] = _a_datetime_ns(parseadas[exitosas])
+                pendientes = pendientes[~exitosas]
+        
+        # Si no funciona ningún formato específico, usar pandas elemento a elemento
+        if not pendientes.empty:
+            parseadas = pd.Series(
+                [_parsear_texto_libre(v) for v in pendientes],
+                index=pendientes.index,
+                dtype='datetime64[ns]'
+            ).dropna()
+            if not parseadas.empty:
+                resultado[parseadas.index] = parseadas
+
+@medido()
+def _normalizar_hoja_transacciones(df, fechas_problematicas=None):
+    """
+    Limpiar una hoja de transacciones y convertir su columna Fecha
+    Devuelve (filas válidas, filas omitidas por fecha inválida) o
+    (None, 0) si la hoja no tiene las columnas requeridas
+    """
+    if not all(col in df.columns for col in COLUMNAS_REQUERIDAS):
+        return None, 0
+    
+    df = df.dropna()
+    if df.empty:
+        return df, 0
+    
+    fechas = parsear_fechas_columna(df['Fecha'])
+    invalidas = fechas.isna()
+    if fechas_problematicas is not None and invalidas.any():
+        # El índice de read_excel corresponde a la fila de Excel menos 2
+        for idx, fecha_valor in df.loc[invalidas, 'Fecha'].items():
+            fechas_problematicas.append(f"Fila {idx+2}: {fecha_valor}")
+    
+    df = df.assign(Fecha=fechas)
+    df_validas = df[~invalidas]
+    return df_validas, len(df) - len(df_validas)
+
+COLUMNAS_CATEGORICAS = ['Categoria', 'Tipo']
+
+def normalizar_clave(texto):
+    """Texto sin acentos, en minúsculas y con los espacios colapsados, para comparar nombres"""
+    sin_acentos = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(sin_acentos.lower().split())
+
+def a_categorica(serie):
+    """Convertir una columna de texto a categórica con categorías de tipo str"""
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype('category')
+    categorias = serie.cat.categories
+    if not all(isinstance(c, str) for c in categorias):
+        serie = serie.astype(str).astype('category')
+    return serie
+
+@medido()
+def normalizar_tipos_transacciones(df):
+    """
+    Dejar las transacciones con tipos compactos: Categoria/Tipo categóricas,
+    Fecha datetime64[ns] y Monto float64
+    """
+    if df.empty:
+        return df
+    df = df.reset_index(drop=True)
+    df['Fecha'] = df['Fecha'].astype('datetime64[ns]')
+    df['Monto'] = pd.to_numeric(df['Monto'], errors='coerce').astype('float64')
+    for col in COLUMNAS_CATEGORICAS:
+        df[col] = a_categorica(df[col])
+    return df
+
+@medido()
+def concatenar_transacciones(partes):
+    """Concatenar DataFrames de transacciones conservando las columnas categóricas"""
+    partes = [parte for parte in partes if not parte.empty]
+    if not partes:
+        return pd.DataFrame()
+    if len(partes) == 1:
+        return partes[0].reset_index(drop=True)
+    
+    # Unificar las categorías antes de concatenar para no caer a object
+    for col in COLUMNAS_CATEGORICAS:
+        if all(col in parte.columns for parte in partes):
+            categorias = pd.api.types.union_categoricals(
+                [a_categorica(parte[col]) for parte in partes]
+            ).categories
+            partes = [
+                parte.assign(**{col: a_categorica(parte[col]).cat.set_categories(categorias)})
+                for parte in partes
+            ]
+    return pd.concat(partes, ignore_index=True)
+
+def reporte_memoria(df):
+    """Memoria ocupada por cada columna del DataFrame (en MB)"""
+    uso = df.memory_usage(deep=True, index=True) / 1024 ** 2
+    return pd.DataFrame({
+        'Tipo': [str(df.index.dtype)] + [str(t) for t in df.dtypes],
+        'MB': uso.round(3).to_numpy()
+    }, index=['(índice)'] + list(df.columns))
+
+# Hojas que la app lee y sus columnas (requeridas, opcionales); el resto se ignora
+HOJAS_ARCHIVO = {
+    'Transacciones': (COLUMNAS_REQUERIDAS, []),
+    'Historico': (COLUMNAS_REQUERIDAS, []),
+    'Metas': (['Nombre_Meta', 'Monto_Objetivo'], ['Fecha_Limite', 'Fecha_Creacion']),
+}
+COLUMNAS_NUMERICAS = {'Monto', 'Monto_Objetivo'}
+TAMANO_BLOQUE_LECTURA = 10000
+
+def _cerrar_bloque(columnas, buffers, bloque):
+    """Convertir las filas acumuladas de un bloque en arrays tipados por columna"""
+    for col, valores in zip(columnas, bloque):
+        if col in COLUMNAS_NUMERICAS:
+            buffers[col].append(pd.to_numeric(pd.Series(valores, dtype=object), errors='coerce').to_numpy(dtype='float64'))
+        else:
+            buffers[col].append(np.array(valores, dtype=object))
+        valores.clear()
+
+def _leer_hoja_streaming(hoja, requeridas, opcionales, tamano_bloque):
+    """
+    Leer una hoja en modo solo lectura, bloque a bloque
+    Valida los encabezados antes de cargar datos; si faltan columnas
+    requeridas devuelve un DataFrame vacío con los encabezados encontrados
+    """
+    filas = hoja.iter_rows(values_only=True)
+    encabezados = next(filas, None) or ()
+    encabezados = [str(e) if e is not None else '' for e in encabezados]
+    if not all(col in encabezados for col in requeridas):
+        return pd.DataFrame(columns=[e for e in encabezados if e])
+    
+    columnas = requeridas + [col for col in opcionales if col in encabezados]
+    posiciones = [encabezados.index(col) for col in columnas]
+    buffers = {col: [] for col in columnas}
+    numeros_fila = []
+    bloque = [[] for _ in columnas]
+    
+    for numero_fila, fila in enumerate(filas, start=2):
+        valores = [fila[pos] if pos < len(fila) else None for pos in posiciones]
+        if all(v is None for v in valores):
+            continue
+        for destino, valor in zip(bloque, valores):
+            destino.append(valor)
+        numeros_fila.append(numero_fila)
+        if len(bloque[0]) >= tamano_bloque:
+            _cerrar_bloque(columnas, buffers, bloque)
+    _cerrar_bloque(columnas, buffers, bloque)
+    
+    # Mismo índice que read_excel: fila de Excel menos 2
+    indice = pd.Index(np.asarray(numeros_fila, dtype='int64') - 2)
+    return pd.DataFrame(
+        {col: np.concatenate(partes) if partes else np.array([], dtype=object) for col, partes in buffers.items()},
+        index=indice
+    )
+
+@medido()
+def leer_hojas_excel(contenido, tamano_bloque=TAMANO_BLOQUE_LECTURA):
+    """
+    Leer solo las hojas de HOJAS_ARCHIVO de un archivo Excel
+    Los .xlsx se recorren en streaming con openpyxl en modo solo lectura;
+    los .xls antiguos se leen con pandas hoja por hoja
+    """
+    if not contenido.startswith(b'PK'):
+        # Formato .xls (no es un zip de Office Open XML)
+        with pd.ExcelFile(io.BytesIO(contenido)) as libro:
+            hojas = {}
+            for nombre in libro.sheet_names:
+                if nombre in HOJAS_ARCHIVO:
+                    requeridas, opcionales = HOJAS_ARCHIVO[nombre]
+                    df = libro.parse(nombre)
+                    if all(col in df.columns for col in requeridas):
+                        columnas = requeridas + [col for col in opcionales if col in df.columns]
+                        df = df[columnas]
+                        for col in COLUMNAS_NUMERICAS.intersection(columnas):
+                            df[col] = pd.to_numeric(df[col], errors='coerce')
+                    hojas[nombre] = df
+            return hojas
+    
+    from openpyxl import load_workbook
+    
+    libro = load_workbook(io.BytesIO(contenido), read_only=True, data_only=True)
+    try:
+        hojas = {}
+        for nombre in libro.sheetnames:
+            if nombre in HOJAS_ARCHIVO:
+                requeridas, opcionales = HOJAS_ARCHIVO[nombre]
+                hoja = libro[nombre]
+                hoja.reset_dimensions()
+                hojas[nombre] = _leer_hoja_streaming(hoja, requeridas, opcionales, tamano_bloque)
+        return hojas
+    finally:
+        libro.close()
+
+# Versión de la normalización; cambiarla invalida las cargas ya cacheadas
+VERSION_PARSER = 6
+
+@medido()
+def leer_archivo_financiero(contenido, nombre=''):
+    """
+    Leer y normalizar un archivo Excel (histórico + nuevas transacciones + metas),
+    CSV o extracto bancario, según la extensión de nombre
+    contenido: bytes del archivo, o None para leerlo de la ruta nombre (los CSV
+    y extractos se leen entonces del disco por bloques)
+    No muestra nada en pantalla: devuelve un diccionario con los datos y el resumen
+    """
+    # Importación diferida: importadores y categorizacion dependen de este módulo
+    from finanzas.categorizacion import categorizar_transacciones
+    from finanzas.importadores import es_importable, importar_transacciones
+    
+    resultado = {
+        'transacciones': None,
+        'metas': [],
+        'nuevas': 0,
+        'historicas': 0,
+        'omitidas': 0,
+        'fechas_problematicas': [],
+        'montos_omitidos': 0,
+        'montos_problematicos': [],
+        'filas_malformadas': 0,
+        'filas_problematicas': [],
+        'formato_anterior': False
+    }
+    
+    if es_importable(nombre):
+        importado = importar_transacciones(contenido if contenido is not None else nombre, nombre)
+        resultado['historicas' if importado['historico'] else 'nuevas'] = importado['filas']
+        resultado['omitidas'] = importado['omitidas']
+        resultado['fechas_problematicas'] = importado['fechas_problematicas']
+        resultado['montos_omitidos'] = importado['montos_omitidos']
+        resultado['montos_problematicos'] = importado['montos_problematicos']
+        resultado['filas_malformadas'] = importado['filas_malformadas']
+        resultado['filas_problematicas'] = importado['filas_problematicas']
+        resultado['transacciones'] = importado['transacciones']
+        return resultado
+    
+    if contenido is None:
+        with open(nombre, 'rb') as archivo:
+            contenido = archivo.read()
+    
+    # Leer solo las hojas que la app utiliza
+    excel_sheets = leer_hojas_excel(contenido)
+    df_todas_transacciones = pd.DataFrame()
+    
+    # Procesar hoja de NUEVAS transacciones
+    if 'Transacciones' in excel_sheets:
+        df_nuevas_validas, omitidas = _normalizar_hoja_transacciones(
+            excel_sheets['Transacciones'], resultado['fechas_problematicas']
+        )
+        
+        resultado['omitidas'] = omitidas
+        
+        if df_nuevas_validas is not None and not df_nuevas_validas.empty:
+            resultado['nuevas'] = len(df_nuevas_validas)
+            df_todas_transacciones = concatenar_transacciones([df_todas_transacciones, df_nuevas_validas])
+    
+    # Procesar hoja de HISTORICO
+    if 'Historico' in excel_sheets:
+        df_historico, _ = _normalizar_hoja_transacciones(excel_sheets['Historico'])
+        
+        if df_historico is not None and not df_historico.empty:
+            resultado['historicas'] = len(df_historico)
+            df_todas_transacciones = concatenar_transacciones([df_historico, df_todas_transacciones])
+    
+    # Si no hay hoja de histórico pero sí de transacciones (archivo viejo)
+    elif 'Transacciones' in excel_sheets and df_todas_transacciones.empty:
+        resultado['formato_anterior'] = True
+        df_transacciones_viejas, _ = _normalizar_hoja_transacciones(excel_sheets['Transacciones'])
+        
+        if df_transacciones_viejas is not None and not df_transacciones_viejas.empty:
+            resultado['historicas'] = len(df_transacciones_viejas)
+            df_todas_transacciones = df_transacciones_viejas.reset_index(drop=True)
+    
+    # Procesar hoja de metas
+    if 'Metas' in excel_sheets:
+        df_metas = excel_sheets['Metas']
+        
+        if not df_metas.empty and 'Nombre_Meta' in df_metas.columns:
+            df_metas = df_metas[df_metas['Nombre_Meta'].notna() & df_metas['Monto_Objetivo'].notna()]
+            
+            # Parsear las fechas de todas las metas de una vez
+            sin_fecha = pd.Series(pd.NaT, index=df_metas.index, dtype='datetime64[ns]')
+            fechas_creacion = parsear_fechas_columna(df_metas['Fecha_Creacion']) if 'Fecha_Creacion' in df_metas.columns else sin_fecha
+            fechas_limite = parsear_fechas_columna(df_metas['Fecha_Limite']) if 'Fecha_Limite' in df_metas.columns else sin_fecha
+            
+            for nombre_meta, monto, fecha_creacion, fecha_limite in zip(
+                df_metas['Nombre_Meta'], df_metas['Monto_Objetivo'], fechas_creacion, fechas_limite
+            ):
+                resultado['metas'].append({
+                    'nombre': str(nombre_meta),
+                    'monto': float(monto),
+                    'fecha_creacion': fecha_creacion.date() if pd.notna(fecha_creacion) else datetime.now().date(),
+                    'fecha_limite': fecha_limite.date() if pd.notna(fecha_limite) else None
+                })
+    
+    if not df_todas_transacciones.empty:
+        resultado['transacciones'] = categorizar_transacciones(normalizar_tipos_transacciones(df_todas_transacciones))
+    
+    return resultado
+
+def huellas_transacciones(df):
+    """
+    Huella de cada fila: hash de (Fecha, Categoria, Tipo, Monto, n.º de ocurrencia)
+    El número de ocurrencia distingue filas idénticas legítimas (dos cafés el
+    mismo día) de una misma fila subida dos veces. La categoría entra
+    normalizada: "Alimentación" y "alimentacion " son la misma fila aunque
+    unificar_categorias elija otra grafía
+    """
+    # Tipos canónicos para que la huella no dependa de la resolución o del dtype
+    claves = df[COLUMNAS_REQUERIDAS].astype({'Fecha': 'datetime64[ns]', 'Monto': 'float64'})
+    # Una normalización por categoría distinta, no por fila
+    categorias = a_categorica(claves['Categoria'])
+    normalizadas = pd.Index([normalizar_clave(valor) for valor in categorias.cat.categories])
+    unicas = normalizadas.unique()
+    codigos = categorias.cat.codes.to_numpy()
+    codigos = np.where(codigos >= 0, unicas.get_indexer(normalizadas)[np.maximum(codigos, 0)], -1)
+    claves['Categoria'] = pd.Categorical.from_codes(codigos, categories=unicas)
+    base = pd.util.hash_pandas_object(claves, index=False)
+    ocurrencia = base.groupby(base, sort=False).cumcount()
+    return pd.util.hash_pandas_object(
+        pd.DataFrame({'base': base.to_numpy(), 'ocurrencia': ocurrencia.to_numpy()}),
+        index=False
+    ).to_numpy()
+
+@medido()
+def filtrar_transacciones_nuevas(df_existente, df_entrante):
+    """Devolver (filas de df_entrante que no están en df_existente, n.º de duplicadas)"""
+    if df_existente.empty or df_entrante.empty:
+        return df_entrante, 0
+    vistas = np.isin(huellas_transacciones(df_entrante), huellas_transacciones(df_existente))
+    return df_entrante[~vistas], int(vistas.sum())
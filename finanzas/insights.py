@@ -0,0 +1,60 @@
+"""
+Insights financieros en texto a partir de los agregados y las metas
+"""
+from finanzas.agregados import calcular_agregados
+from finanzas.instrumentacion import medido
+from finanzas.metas import calcular_progreso_metas, tabla_metas
+
+@medido()
+def calcular_insights(df, metas, agregados=None):
+    """Calcular insights financieros"""
+    if agregados is None:
+        agregados = calcular_agregados(df)
+    return insights_transacciones(agregados) + insights_metas(metas, agregados)
+
+def insights_transacciones(agregados):
+    """Insights que dependen solo de las transacciones (no cambian al editar metas)"""
+    insights = []
+    if agregados is not None:
+        # Insights básicos
+        total_ingresos = agregados['total_ingresos']
+        total_gastos = agregados['total_gastos']
+        balance = total_ingresos - total_gastos
+        
+        insights.append(f"💰 Balance total: ${balance:,.2f}")
+        insights.append(f"📈 Ingresos totales: ${total_ingresos:,.2f}")
+        insights.append(f"📉 Gastos totales: ${total_gastos:,.2f}")
+        
+        # Categoría con más gastos
+        por_categoria = agregados['por_categoria']
+        gastos_por_categoria = por_categoria.loc[por_categoria['n_gastos'] > 0, 'gastos']
+        if not gastos_por_categoria.empty:
+            categoria_mayor_gasto = gastos_por_categoria.idxmax()
+            monto_mayor_gasto = gastos_por_categoria.max()
+            insights.append(f"🔍 Mayor gasto por categoría: {categoria_mayor_gasto} (${monto_mayor_gasto:,.2f})")
+        
+        # Promedio de gastos diarios
+        if agregados['num_gastos'] > 0:
+            dias_unicos = agregados['dias_unicos']
+            promedio_diario = total_gastos / dias_unicos if dias_unicos > 0 else 0
+            insights.append(f"📅 Promedio de gasto diario: ${promedio_diario:,.2f}")
+    return insights
+
+def insights_metas(metas, agregados):
+    """Insights de cada meta a partir del progreso calculado para todas a la vez"""
+    tabla = tabla_metas(metas)
+    progreso = calcular_progreso_metas(tabla, agregados)
+    insights = []
+    for nombre, monto, meta in zip(tabla['Nombre_Meta'], tabla['Monto_Objetivo'], progreso.itertuples()):
+        if agregados is None:
+            insights.append(f"🎯 {nombre}: Te faltan ${monto:,.2f} para tu meta")
+        elif meta.alcanzada:
+            insights.append(f"🎉 ¡Meta '{nombre}' alcanzada!")
+        elif meta.vencida:
+            insights.append(f"⏰ {nombre}: Meta vencida. Te faltan ${meta.faltante:,.2f}")
+        elif meta.dias_restantes > 0:
+            insights.append(f"🎯 {nombre}: Te faltan ${meta.faltante:,.2f}. Necesitas ahorrar ${meta.ahorro_diario:,.2f} diarios")
+        else:
+            insights.append(f"🎯 {nombre}: Te faltan ${meta.faltante:,.2f} para tu meta")
+    
+    return insights
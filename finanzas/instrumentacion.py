@@ -0,0 +1,150 @@
+"""
+Medición de tiempos y memoria por etapa
+
+Las etapas se marcan con el contexto `tramo(nombre)` o el decorador
+`@medido(nombre)`. Solo se registra algo mientras el hilo actual tiene una
+captura abierta (iniciar_captura / finalizar_captura); sin captura, cada
+tramo cuesta una consulta a una variable local del hilo.
+
+Variables de entorno:
+    FINANZAS_INSTRUMENTACION=1         capturar siempre los tiempos en la app
+    FINANZAS_INSTRUMENTACION=memoria   además, memoria asignada (tracemalloc, más lento)
+    FINANZAS_INSTRUMENTACION_LOG=ruta  agregar cada captura como una línea JSON
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+MODO_ENTORNO = os.environ.get('FINANZAS_INSTRUMENTACION', '').strip().lower()
+RUTA_LOG = os.environ.get('FINANZAS_INSTRUMENTACION_LOG')
+
+_local = threading.local()
+
+class _TramoNulo:
+    """Tramo que no mide nada (captura inactiva)"""
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+
+_TRAMO_NULO = _TramoNulo()
+
+class _Tramo:
+    """Mide una etapa y la agrega a la captura del hilo al terminar"""
+    __slots__ = ('captura', 'nombre', 'atributos', 'inicio', 'memoria_base', 'memoria_pico')
+    
+    def __init__(self, captura, nombre, atributos):
+        self.captura = captura
+        self.nombre = nombre
+        self.atributos = atributos
+    
+    def __enter__(self):
+        pila = self.captura['pila']
+        if self.captura['memoria'] and tracemalloc.is_tracing():
+            # tracemalloc tiene un único pico: se pasa al tramo padre antes de reiniciarlo
+            actual, pico = tracemalloc.get_traced_memory()
+            if pila:
+                pila[-1].memoria_pico = max(pila[-1].memoria_pico, pico)
+            tracemalloc.reset_peak()
+            self.memoria_base = self.memoria_pico = actual
+        else:
+            self.memoria_base = None
+        pila.append(self)
+        self.inicio = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        fin = time.perf_counter()
+        pila = self.captura['pila']
+        pila.pop()
+        
+        memoria_mb = None
+        if self.memoria_base is not None and tracemalloc.is_tracing():
+            self.memoria_pico = max(self.memoria_pico, tracemalloc.get_traced_memory()[1])
+            memoria_mb = round((self.memoria_pico - self.memoria_base) / 1e6, 3)
+            if pila and pila[-1].memoria_base is not None:
+                pila[-1].memoria_pico = max(pila[-1].memoria_pico, self.memoria_pico)
+        
+        registro = {
+            'nombre': self.nombre,
+            'nivel': len(pila),
+            'inicio_ms': round((self.inicio - self.captura['inicio']) * 1000, 3),
+            'ms': round((fin - self.inicio) * 1000, 3),
+            'memoria_mb': memoria_mb,
+            **self.atributos
+        }
+        if exc[0] is not None:
+            registro['error'] = exc[0].__name__
+        self.captura['tramos'].append(registro)
+        logger.debug(json.dumps(registro, ensure_ascii=False, default=str))
+        return False
+
+def iniciar_captura(memoria=False):
+    """Empezar a registrar los tramos del hilo actual (descarta una captura previa)"""
+    if memoria and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        iniciado_aqui = True
+    else:
+        iniciado_aqui = False
+    _local.captura = {
+        'inicio': time.perf_counter(),
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'memoria': memoria,
+        'tracemalloc_propio': iniciado_aqui,
+        'pila': [],
+        'tramos': []
+    }
+
+def finalizar_captura():
+    """Cerrar la captura del hilo y devolver sus tramos en orden de inicio"""
+    captura = getattr(_local, 'captura', None)
+    _local.captura = None
+    if captura is None:
+        return []
+    if captura['tracemalloc_propio']:
+        tracemalloc.stop()
+    
+    tramos = sorted(captura['tramos'], key=lambda registro: registro['inicio_ms'])
+    if RUTA_LOG:
+        guardar_tramos(tramos, RUTA_LOG, fecha=captura['fecha'])
+    return tramos
+
+def captura_activa():
+    return getattr(_local, 'captura', None) is not None
+
+def tramo(nombre, **atributos):
+    """Contexto que mide la etapa nombre si hay una captura abierta en el hilo"""
+    captura = getattr(_local, 'captura', None)
+    if captura is None:
+        return _TRAMO_NULO
+    return _Tramo(captura, nombre, atributos)
+
+def medido(nombre=None):
+    """Decorador: medir cada llamada a la función como un tramo"""
+    def decorar(funcion):
+        etiqueta = nombre or funcion.__name__
+        
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            captura = getattr(_local, 'captura', None)
+            if captura is None:
+                return funcion(*args, **kwargs)
+            with _Tramo(captura, etiqueta, {}):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorar
+
+def guardar_tramos(tramos, ruta, **contexto):
+    """Agregar una captura como una línea JSON al archivo ruta"""
+    with open(ruta, 'a', encoding='utf-8') as destino:
+        destino.write(json.dumps(dict(contexto, tramos=tramos), ensure_ascii=False, default=str) + '\n')
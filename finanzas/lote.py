@@ -0,0 +1,239 @@
+"""
+Carga de varios archivos a la vez
+
+Cada archivo se lee y normaliza en un proceso de trabajo distinto con
+leer_archivo_financiero; después los resultados se combinan quitando las
+transacciones repetidas entre archivos.
+
+Uso sin interfaz (python -m finanzas y python -m finanzas.lote son equivalentes):
+    python -m finanzas archivo_o_carpeta [...] [--exportar salida.xlsx] [--json] [--procesos N]
+
+Las extensiones de --exportar (.xlsx, .csv, .parquet) eligen el formato; se
+puede repetir para generar varios archivos en una sola ejecución. --salida es
+un alias de --exportar.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from finanzas.categorizacion import categorizador_por_defecto, unificar_categorias
+from finanzas.ingesta import (
+    concatenar_transacciones,
+    huellas_transacciones,
+    leer_archivo_financiero,
+    normalizar_tipos_transacciones,
+)
+from finanzas.instrumentacion import medido
+
+EXTENSIONES_ADMITIDAS = ('.xlsx', '.xls', '.csv', '.ofx', '.qfx')
+
+def _leer_archivo(nombre_y_contenido):
+    """Trabajo de cada proceso: leer un archivo (debe ser una función de módulo)"""
+    nombre, contenido = nombre_y_contenido
+    try:
+        return nombre, leer_archivo_financiero(contenido, nombre), None
+    except Exception as e:
+        return nombre, None, str(e)
+
+@medido()
+def combinar_resultados(resultados):
+    """
+    Unir los resultados de varios archivos en uno solo
+    Una transacción que ya apareció en un archivo anterior (misma huella) se
+    descarta; las repetidas dentro de un mismo archivo se conservan
+    """
+    combinado = {
+        'transacciones': None,
+        'metas': [],
+        'nuevas': 0,
+        'historicas': 0,
+        'omitidas': 0,
+        'fechas_problematicas': [],
+        'montos_omitidos': 0,
+        'montos_problematicos': [],
+        'filas_malformadas': 0,
+        'filas_problematicas': [],
+        'formato_anterior': False,
+        'duplicadas_entre_archivos': 0,
+        'archivos': [],
+        'errores': []
+    }
+    partes = []
+    vistas = np.array([], dtype='uint64')
+    metas_por_nombre = {}
+    
+    for nombre, resultado, error in resultados:
+        nombre_corto = os.path.basename(nombre)
+        if error is not None:
+            combinado['errores'].append(f"{nombre_corto}: {error}")
+            continue
+        
+        combinado['archivos'].append(nombre_corto)
+        for clave in ['nuevas', 'historicas', 'omitidas', 'montos_omitidos', 'filas_malformadas']:
+            combinado[clave] += resultado[clave]
+        combinado['formato_anterior'] |= resultado['formato_anterior']
+        combinado['fechas_problematicas'].extend(
+            f"{nombre_corto} · {fecha}" for fecha in resultado['fechas_problematicas']
+        )
+        combinado['montos_problematicos'].extend(
+            f"{nombre_corto} · {monto}" for monto in resultado['montos_problematicos']
+        )
+        combinado['filas_problematicas'].extend(
+            f"{nombre_corto} · {fila}" for fila in resultado['filas_problematicas']
+        )
+        # Si varias hojas traen la misma meta, gana el último archivo
+        for meta in resultado['metas']:
+            metas_por_nombre[meta['nombre']] = meta
+        
+        df = resultado['transacciones']
+        if df is None:
+            continue
+        huellas = huellas_transacciones(df)
+        repetidas = np.isin(huellas, vistas)
+        combinado['duplicadas_entre_archivos'] += int(repetidas.sum())
+        partes.append(df[~repetidas])
+        vistas = np.union1d(vistas, huellas)
+    
+    df_combinado = concatenar_transacciones(partes)
+    if not df_combinado.empty:
+        # Cada archivo puede escribir la misma categoría de otra forma
+        df_combinado = normalizar_tipos_transacciones(df_combinado)
+        combinado['transacciones'] = df_combinado.assign(
+            Categoria=unificar_categorias(df_combinado['Categoria'], categorizador_por_defecto().categorias)
+        )
+    combinado['metas'] = list(metas_por_nombre.values())
+    return combinado
+
+@medido()
+def procesar_lote(archivos, max_procesos=None, contexto=None):
+    """
+    Leer varios archivos en paralelo y combinarlos
+    archivos: lista de rutas o de pares (nombre, bytes)
+    contexto: método de arranque de los procesos ('spawn', 'fork', ...); dentro
+    de un servidor con hilos conviene 'spawn'
+    """
+    tareas = [(archivo, None) if isinstance(archivo, (str, os.PathLike)) else archivo for archivo in archivos]
+    procesos = min(len(tareas), max_procesos or os.cpu_count() or 1)
+    
+    if procesos <= 1:
+        resultados = [_leer_archivo(tarea) for tarea in tareas]
+    else:
+        mp_context = multiprocessing.get_context(contexto) if contexto else None
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=mp_context) as pool:
+            resultados = list(pool.map(_leer_archivo, tareas))
+    
+    return combinar_resultados(resultados)
+
+def listar_archivos(directorio):
+    """Archivos admitidos de un directorio, en orden alfabético"""
+    return [
+        os.path.join(directorio, nombre)
+        for nombre in sorted(os.listdir(directorio))
+        if nombre.lower().endswith(EXTENSIONES_ADMITIDAS) and not nombre.startswith('~$')
+    ]
+
+def _expandir_rutas(rutas):
+    """Rutas de archivos; las carpetas se reemplazan por sus archivos admitidos"""
+    archivos = []
+    for ruta in rutas:
+        archivos.extend(listar_archivos(ruta) if os.path.isdir(ruta) else [ruta])
+    return archivos
+
+def resumen_lote(combinado):
+    """Resumen serializable a JSON de un resultado de procesar_lote"""
+    # Solo la línea de comandos los usa: los procesos de trabajo importan este módulo
+    from finanzas.agregados import calcular_agregados
+    from finanzas.insights import calcular_insights
+    
+    df = combinado['transacciones']
+    agregados = calcular_agregados(df) if df is not None else None
+    resumen = {
+        'archivos': combinado['archivos'],
+        'errores': combinado['errores'],
+        'transacciones': 0 if df is None else len(df),
+        'duplicadas_entre_archivos': combinado['duplicadas_entre_archivos'],
+        'fechas_omitidas': combinado['omitidas'],
+        'montos_omitidos': combinado['montos_omitidos'],
+        'filas_malformadas': combinado['filas_malformadas'],
+        'metas': len(combinado['metas']),
+        'insights': calcular_insights(df, combinado['metas'], agregados)
+    }
+    if agregados is not None:
+        resumen.update({
+            'total_ingresos': agregados['total_ingresos'],
+            'total_gastos': agregados['total_gastos'],
+            'balance': agregados['balance'],
+            'desde': agregados['fecha_min'].strftime('%d/%m/%Y'),
+            'hasta': agregados['fecha_max'].strftime('%d/%m/%Y')
+        })
+    return resumen
+
+def main(argv=None):
+    """Línea de comandos del modo en lote (python -m finanzas)"""
+    from finanzas.exportacion import FORMATOS_EXPORTACION, formato_por_extension
+    from finanzas.instrumentacion import finalizar_captura, iniciar_captura
+    
+    parser = argparse.ArgumentParser(
+        prog='python -m finanzas',
+        description="Procesar archivos de finanzas sin la interfaz y emitir insights y exportaciones"
+    )
+    parser.add_argument('rutas', nargs='+', help="Archivos .xlsx, .xls, .csv u .ofx, o carpetas que los contengan")
+    parser.add_argument('--exportar', '--salida', action='append', default=[], metavar='RUTA',
+                        help="Archivo de salida; el formato se deduce de la extensión (.xlsx, .csv, .parquet)")
+    parser.add_argument('--json', action='store_true', help="Escribir el resumen como JSON en lugar de texto")
+    parser.add_argument('--procesos', type=int, default=None, help="Procesos de trabajo (por defecto, uno por núcleo)")
+    parser.add_argument('--tiempos', action='store_true', help="Mostrar en stderr el tiempo de cada etapa")
+    args = parser.parse_args(argv)
+    
+    formatos = []
+    for ruta in args.exportar:
+        formato = formato_por_extension(os.path.splitext(ruta)[1])
+        if formato is None:
+            parser.error(f"Formato de exportación no disponible para {ruta}")
+        formatos.append((ruta, formato))
+    
+    archivos = _expandir_rutas(args.rutas)
+    if not archivos:
+        print(f"No se encontraron archivos {', '.join(EXTENSIONES_ADMITIDAS)} para procesar", file=sys.stderr)
+        return 1
+    
+    if args.tiempos:
+        iniciar_captura()
+    combinado = procesar_lote(archivos, args.procesos)
+    resumen = resumen_lote(combinado)
+    df = combinado['transacciones']
+    
+    for ruta, formato in formatos:
+        if df is None:
+            print(f"Sin transacciones: no se generó {ruta}", file=sys.stderr)
+            continue
+        with open(ruta, 'wb') as destino:
+            destino.write(FORMATOS_EXPORTACION[formato][0](df, combinado['metas']))
+    
+    if args.json:
+        json.dump(resumen, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print(f"Archivos leídos: {len(resumen['archivos'])}")
+        print(f"Transacciones: {resumen['transacciones']} "
+              f"({resumen['duplicadas_entre_archivos']} duplicadas entre archivos omitidas)")
+        print(f"Metas: {resumen['metas']}")
+        for insight in resumen['insights']:
+            print(insight)
+        for ruta, _ in formatos:
+            if df is not None:
+                print(f"Exportado: {ruta}")
+    for error in resumen['errores']:
+        print(f"Error en {error}", file=sys.stderr)
+    if args.tiempos:
+        for registro in finalizar_captura():
+            print(f"{'  ' * registro['nivel']}{registro['nombre']}: {registro['ms']:,.1f} ms", file=sys.stderr)
+    return 0 if not resumen['errores'] else 2
+
+if __name__ == '__main__':
+    sys.exit(main())
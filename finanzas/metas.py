@@ -0,0 +1,91 @@
+"""
+Metas financieras como tabla columnar y su progreso calculado para todas a la vez
+
+La tabla tiene las mismas columnas que la hoja Metas del Excel. El progreso
+de cada meta es lo ahorrado desde su Fecha_Creacion: se toma del saldo
+acumulado por día con una búsqueda binaria, así que el costo casi no depende
+del número de metas ni del tamaño del histórico.
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from finanzas.instrumentacion import medido
+
+# Claves de las metas leídas de archivos -> columnas de la tabla (y de la hoja Metas)
+COLUMNAS_METAS = {
+    'nombre': 'Nombre_Meta',
+    'monto': 'Monto_Objetivo',
+    'fecha_limite': 'Fecha_Limite',
+    'fecha_creacion': 'Fecha_Creacion'
+}
+
+def tabla_metas(metas=None):
+    """
+    Tabla de metas a partir de una lista de diccionarios (como las devuelve la
+    ingesta) o de otra tabla; las fechas quedan como datetime64[ns] sin hora
+    """
+    if isinstance(metas, pd.DataFrame):
+        return metas
+    tabla = pd.DataFrame(metas or [], columns=list(COLUMNAS_METAS)).rename(columns=COLUMNAS_METAS)
+    tabla['Nombre_Meta'] = tabla['Nombre_Meta'].astype(object)
+    tabla['Monto_Objetivo'] = tabla['Monto_Objetivo'].astype('float64')
+    for col in ['Fecha_Limite', 'Fecha_Creacion']:
+        tabla[col] = pd.to_datetime(tabla[col], errors='coerce').astype('datetime64[ns]').dt.normalize()
+    return tabla
+
+def agregar_meta(tabla, nombre, monto, fecha_limite=None, fecha_creacion=None):
+    """Tabla con una meta más al final (creada hoy si no se indica otra fecha)"""
+    nueva = tabla_metas([{
+        'nombre': nombre,
+        'monto': monto,
+        'fecha_limite': fecha_limite,
+        'fecha_creacion': fecha_creacion or datetime.now().date()
+    }])
+    return pd.concat([tabla, nueva], ignore_index=True) if not tabla.empty else nueva
+
+def quitar_meta(tabla, posicion):
+    """Tabla sin la meta en la posición indicada"""
+    return tabla.drop(index=tabla.index[posicion]).reset_index(drop=True)
+
+@medido()
+def calcular_progreso_metas(metas, agregados, hoy=None):
+    """
+    Progreso de todas las metas en una sola pasada, alineado con la tabla
+    ahorro: saldo acumulado desde Fecha_Creacion (sin fecha, desde el inicio),
+    nunca negativo · progreso: porcentaje de 0 a 100 · faltante · dias_restantes
+    y ahorro_diario (NaN sin fecha límite o ya vencida) · alcanzada · vencida
+    """
+    tabla = tabla_metas(metas)
+    objetivo = tabla['Monto_Objetivo'].to_numpy(dtype='float64')
+    
+    if agregados is None:
+        ahorro = np.zeros(len(tabla))
+    else:
+        por_dia = agregados['por_dia']
+        # acumulado[i] = saldo de los i primeros días con transacciones
+        acumulado = np.concatenate([[0.0], np.cumsum(por_dia['neto'].to_numpy(dtype='float64'))])
+        creacion = tabla['Fecha_Creacion'].to_numpy(dtype='datetime64[ns]')
+        dias = por_dia.index.to_numpy(dtype='datetime64[ns]')
+        posiciones = np.where(np.isnat(creacion), 0, np.searchsorted(dias, creacion, side='left'))
+        ahorro = np.maximum(acumulado[-1] - acumulado[posiciones], 0.0)
+    
+    hoy = pd.Timestamp(hoy or datetime.now().date()).to_datetime64().astype('datetime64[ns]')
+    limite = tabla['Fecha_Limite'].to_numpy(dtype='datetime64[ns]')
+    dias_restantes = np.where(np.isnat(limite), np.nan, (limite - hoy) / np.timedelta64(1, 'D'))
+    faltante = np.maximum(objetivo - ahorro, 0.0)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        progreso = np.where(objetivo > 0, np.minimum(ahorro / objetivo * 100, 100.0), 100.0)
+        ahorro_diario = np.where(dias_restantes > 0, faltante / dias_restantes, np.nan)
+    
+    return pd.DataFrame({
+        'ahorro': ahorro,
+        'progreso': progreso,
+        'faltante': faltante,
+        'dias_restantes': dias_restantes,
+        'ahorro_diario': ahorro_diario,
+        'alcanzada': faltante <= 0,
+        'vencida': dias_restantes <= 0
+    }, index=tabla.index)
@@ -0,0 +1,177 @@
+"""
+Series temporales diarias para ventanas móviles, comparaciones y pronósticos
+
+construir_series recorre las transacciones una vez y guarda el gasto y el
+neto acumulados de cada día del rango (también los días sin movimientos),
+en total y por categoría. Con eso el gasto de cualquier ventana de fechas es
+la resta de dos posiciones: las consultas no vuelven a tocar las transacciones.
+"""
+import numpy as np
+import pandas as pd
+
+from finanzas.agregados import calcular_columnas_derivadas
+from finanzas.ingesta import a_categorica
+from finanzas.instrumentacion import medido
+from finanzas.metas import calcular_progreso_metas, tabla_metas
+
+VENTANAS_MOVILES = (7, 30, 90)
+
+# Días usados para estimar el ritmo de gasto y de ahorro de los pronósticos
+DIAS_RITMO = 30
+DIAS_RITMO_AHORRO = 90
+
+@medido()
+def construir_series(df, derivadas=None):
+    """
+    Acumulados diarios densos desde el primer hasta el último día con datos
+    gasto / neto: arrays de largo dias + 1 con gasto[i] = suma de los i
+    primeros días; gasto_categoria: lo mismo con una columna por categoría
+    """
+    if df.empty:
+        return None
+    if derivadas is None:
+        derivadas = calcular_columnas_derivadas(df)
+    
+    dia = derivadas['dia'].to_numpy(dtype='int64')
+    primero = int(dia.min())
+    dias = int(dia.max()) - primero + 1
+    posicion = dia - primero
+    
+    monto = df['Monto'].to_numpy(dtype='float64')
+    gasto = np.where(monto < 0, -monto, 0.0)
+    categorica = a_categorica(df['Categoria'])
+    num_categorias = len(categorica.cat.categories)
+    
+    # Una sola pasada con bincount: día x categoría como índice plano
+    plano = posicion * num_categorias + categorica.cat.codes.to_numpy(dtype='int64')
+    gasto_categoria = np.bincount(plano, weights=gasto, minlength=dias * num_categorias).reshape(dias, num_categorias)
+    neto_diario = np.bincount(posicion, weights=monto, minlength=dias)
+    
+    def acumular(valores):
+        ceros = np.zeros((1,) + valores.shape[1:])
+        return np.concatenate([ceros, np.cumsum(valores, axis=0)])
+    
+    return {
+        'inicio': np.datetime64(primero, 'D'),
+        'dias': dias,
+        'categorias': pd.Index(categorica.cat.categories, name='Categoria'),
+        'gasto': acumular(gasto_categoria.sum(axis=1)),
+        'neto': acumular(neto_diario),
+        'gasto_categoria': acumular(gasto_categoria)
+    }
+
+def _posicion(series, fecha):
+    """Posición del día en la serie (puede quedar fuera del rango)"""
+    return int((np.datetime64(pd.Timestamp(fecha).date(), 'D') - series['inicio']).astype('int64'))
+
+def _entre(series, clave, desde, hasta):
+    """Suma de la serie clave en las posiciones [desde, hasta], recortada al rango con datos"""
+    desde = np.clip(desde, 0, series['dias'])
+    hasta = np.clip(np.asarray(hasta) + 1, 0, series['dias'])
+    acumulado = series[clave]
+    return acumulado[np.maximum(hasta, desde)] - acumulado[desde]
+
+def _ritmo_diario(series, clave, fin, dias):
+    """Promedio diario de los últimos días hasta fin (menos días si la serie es más corta)"""
+    dias = max(min(dias, fin + 1), 1)
+    return float(_entre(series, clave, fin - dias + 1, fin)) / dias
+
+def referencia(series):
+    """Último día con datos: las consultas se calculan hasta esa fecha por defecto"""
+    return pd.Timestamp(series['inicio'] + np.timedelta64(series['dias'] - 1, 'D'))
+
+def gasto_en_ventana(series, desde, hasta, categoria=None):
+    """Gasto entre dos fechas (inclusivas), en total o de una categoría"""
+    inicio, fin = _posicion(series, desde), _posicion(series, hasta)
+    if categoria is None:
+        return float(_entre(series, 'gasto', inicio, fin))
+    columna = series['categorias'].get_loc(categoria)
+    return float(_entre(series, 'gasto_categoria', inicio, fin)[columna])
+
+def gasto_movil(series, ventanas=VENTANAS_MOVILES, hasta=None):
+    """
+    Gasto de los últimos N días hasta la fecha indicada, por categoría
+    Una columna por ventana y una fila Total al final
+    """
+    fin = _posicion(series, hasta if hasta is not None else referencia(series))
+    tabla = pd.DataFrame({
+        f"{dias} días": _entre(series, 'gasto_categoria', fin - dias + 1, fin)
+        for dias in ventanas
+    }, index=series['categorias'])
+    tabla.loc['Total'] = tabla.sum()
+    return tabla
+
+def _variacion(actual, previo):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(previo > 0, (actual - previo) / previo * 100, np.nan)
+
+def variaciones_por_categoria(series, hasta=None):
+    """
+    Gasto del mes hasta la fecha frente al mismo tramo del mes anterior (MoM)
+    y del mismo mes del año anterior (YoY), por categoría
+    Se comparan los mismos días del mes para no penalizar un mes en curso
+    """
+    fecha = pd.Timestamp(hasta if hasta is not None else referencia(series)).normalize()
+    tramos = {}
+    for clave, inicio_mes in [
+        ('mes', fecha.replace(day=1)),
+        ('mes_anterior', fecha.replace(day=1) - pd.DateOffset(months=1)),
+        ('anio_anterior', fecha.replace(day=1) - pd.DateOffset(years=1))
+    ]:
+        # Mismo número de días, sin pasar del fin de ese mes
+        fin_tramo = min(inicio_mes + pd.Timedelta(days=fecha.day - 1), inicio_mes + pd.offsets.MonthEnd(0))
+        tramos[clave] = _entre(series, 'gasto_categoria', _posicion(series, inicio_mes), _posicion(series, fin_tramo))
+    
+    tabla = pd.DataFrame({
+        'Mes actual': tramos['mes'],
+        'Mes anterior': tramos['mes_anterior'],
+        'Var. mensual %': _variacion(tramos['mes'], tramos['mes_anterior']),
+        'Año anterior': tramos['anio_anterior'],
+        'Var. anual %': _variacion(tramos['mes'], tramos['anio_anterior'])
+    }, index=series['categorias'])
+    return tabla[tabla[['Mes actual', 'Mes anterior', 'Año anterior']].sum(axis=1) > 0]
+
+def pronostico_gasto_mes(series, hasta=None, dias_ritmo=DIAS_RITMO):
+    """
+    Gasto estimado al cierre del mes: lo gastado hasta la fecha más los días
+    que faltan al ritmo diario de los últimos dias_ritmo días
+    """
+    fecha = pd.Timestamp(hasta if hasta is not None else referencia(series)).normalize()
+    fin = _posicion(series, fecha)
+    gastado = float(_entre(series, 'gasto', _posicion(series, fecha.replace(day=1)), fin))
+    ritmo = _ritmo_diario(series, 'gasto', fin, dias_ritmo)
+    dias_mes = fecha.days_in_month
+    return {
+        'mes': fecha.strftime('%Y-%m'),
+        'gastado': gastado,
+        'dias_transcurridos': fecha.day,
+        'dias_mes': dias_mes,
+        'ritmo_diario': ritmo,
+        'pronostico': gastado + ritmo * (dias_mes - fecha.day)
+    }
+
+def pronostico_metas(series, metas, agregados, hasta=None, dias_ritmo=DIAS_RITMO_AHORRO):
+    """
+    Fecha estimada en que se completa cada meta si se sigue ahorrando al ritmo
+    neto de los últimos dias_ritmo días (NaT si ese ritmo no es positivo)
+    a_tiempo indica si esa fecha llega antes de la fecha límite
+    """
+    tabla = tabla_metas(metas)
+    progreso = calcular_progreso_metas(tabla, agregados)
+    fecha = pd.Timestamp(hasta if hasta is not None else referencia(series)).normalize()
+    fin = _posicion(series, fecha)
+    ritmo = _ritmo_diario(series, 'neto', fin, dias_ritmo)
+    
+    faltante = progreso['faltante'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dias = np.where(faltante <= 0, 0.0, np.ceil(faltante / ritmo) if ritmo > 0 else np.nan)
+    estimada = pd.to_datetime(np.where(
+        np.isnan(dias), np.datetime64('NaT', 'ns'),
+        fecha.to_datetime64() + np.nan_to_num(dias).astype('int64') * np.timedelta64(1, 'D')
+    ))
+    limite = tabla['Fecha_Limite'].to_numpy(dtype='datetime64[ns]')
+    return pd.DataFrame({
+        'ritmo_diario': ritmo,
+        'fecha_estimada': estimada,
+        'a_tiempo': ~np.isnan(dias) & (np.isnat(limite) | (estimada.to_numpy() <= limite))
+    }, index=tabla.index)
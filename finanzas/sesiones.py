@@ -0,0 +1,272 @@
+"""
+Memoria de las sesiones de un servidor compartido
+
+Cada sesión guarda sus transacciones y sus cachés derivadas en un DatosSesion
+que lleva la cuenta de los bytes que ocupa. GestorMemoria registra todas las
+sesiones del proceso, aplica los presupuestos y derrama a disco las
+transacciones de las sesiones inactivas; al volver a usarlas se recargan solas.
+Las cachés compartidas entre sesiones (p. ej. la de archivos ya procesados)
+se registran en el gestor: cuentan en el consumo del proceso y se vacían antes
+de derramar sesiones, porque sus DataFrames pueden ser los mismos que usan
+las sesiones y derramar una sesión no liberaría esa memoria.
+
+Variables de entorno (los presupuestos en MB; 0 o vacío = sin límite):
+    FINANZAS_PRESUPUESTO_SESION_MB   memoria máxima de una sesión
+    FINANZAS_PRESUPUESTO_GLOBAL_MB   memoria del proceso a partir de la que se derraman sesiones
+    FINANZAS_INACTIVIDAD_S           segundos sin uso tras los que se derrama una sesión
+                                     (15 minutos por defecto; 0 = nunca)
+    FINANZAS_DERRAME_DIR             carpeta de los archivos derramados (por defecto, una
+                                     carpeta temporal propia del proceso)
+
+Los archivos derramados contienen datos de los usuarios: la carpeta se crea
+solo accesible para el usuario del proceso y los archivos, con permisos 0o600.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+
+import numpy as np
+import pandas as pd
+
+INACTIVIDAD_POR_DEFECTO_S = 15 * 60
+
+# Con el presupuesto global superado se derraman sesiones inactivas al menos este tiempo
+INACTIVIDAD_MINIMA_S = 30
+
+def _mb_entorno(variable):
+    valor = float(os.environ.get(variable) or 0)
+    return valor * 1e6 if valor > 0 else None
+
+def memoria_objeto(valor, vistos=None):
+    """
+    Bytes aproximados de un valor y lo que contiene (DataFrames, arrays,
+    diccionarios, listas...). Un mismo objeto referenciado varias veces se cuenta una vez
+    """
+    if vistos is None:
+        vistos = set()
+    if valor is None or id(valor) in vistos:
+        return 0
+    vistos.add(id(valor))
+    
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        uso = valor.memory_usage(deep=True)
+        return int(uso.sum() if isinstance(uso, pd.Series) else uso)
+    if isinstance(valor, pd.Index):
+        return int(valor.memory_usage(deep=True))
+    if isinstance(valor, np.ndarray):
+        # Una vista comparte la memoria de su base
+        return 0 if valor.base is not None and id(valor.base) in vistos else int(valor.nbytes)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(
+            memoria_objeto(clave, vistos) + memoria_objeto(elemento, vistos) for clave, elemento in valor.items()
+        )
+    if isinstance(valor, (list, tuple, set, frozenset)):
+        return sys.getsizeof(valor) + sum(memoria_objeto(elemento, vistos) for elemento in valor)
+    return sys.getsizeof(valor)
+
+def _borrar_archivo(ruta):
+    try:
+        os.remove(ruta)
+    except FileNotFoundError:
+        pass
+
+class DatosSesion:
+    """Transacciones y cachés derivadas de una sesión, con su consumo de memoria"""
+    
+    def __init__(self, directorio_derrame):
+        self.id = uuid.uuid4().hex
+        self.directorio_derrame = directorio_derrame
+        self.ultimo_acceso = time.monotonic()
+        self.derrames = 0
+        self._lock = threading.RLock()
+        self._df = pd.DataFrame()
+        self._bytes_df = 0
+        self._caches = {}
+        self._bytes_caches = {}
+        self._archivo = None
+        self._ruta_derrame = None
+    
+    @property
+    def derramada(self):
+        return self._df is None
+    
+    @property
+    def bytes(self):
+        """Memoria ocupada ahora (0 si las transacciones están en disco)"""
+        return self._bytes_df + sum(self._bytes_caches.values())
+    
+    def transacciones(self):
+        """DataFrame de la sesión, recargado desde disco si se había derramado"""
+        with self._lock:
+            self.ultimo_acceso = time.monotonic()
+            if self._df is None:
+                self._df = pd.read_pickle(self._ruta_derrame)
+                self._bytes_df = memoria_objeto(self._df)
+                self._archivo()  # El archivo ya no hace falta
+                self._archivo = None
+            return self._df
+    
+    def establecer(self, df):
+        """Reemplazar las transacciones; las cachés anteriores dejan de ser válidas"""
+        with self._lock:
+            self.ultimo_acceso = time.monotonic()
+            if self._archivo is not None:
+                self._archivo()
+                self._archivo = None
+            self._df = df
+            self._bytes_df = memoria_objeto(df)
+            self._caches.clear()
+            self._bytes_caches.clear()
+    
+    def cache(self, nombre):
+        return self._caches.get(nombre)
+    
+    def guardar_cache(self, nombre, valor):
+        with self._lock:
+            self._caches[nombre] = valor
+            self._bytes_caches[nombre] = memoria_objeto(valor)
+    
+    def liberar_caches(self, objetivo_bytes):
+        """Descartar las cachés más grandes hasta bajar de objetivo_bytes (se recalculan al usarse)"""
+        with self._lock:
+            for nombre in sorted(self._bytes_caches, key=self._bytes_caches.get, reverse=True):
+                if self.bytes <= objetivo_bytes:
+                    break
+                del self._caches[nombre]
+                del self._bytes_caches[nombre]
+    
+    def derramar(self):
+        """Escribir las transacciones a disco y soltar la memoria; devuelve los bytes liberados"""
+        with self._lock:
+            if self._df is None or self._df.empty:
+                return 0
+            liberados = self.bytes
+            os.makedirs(self.directorio_derrame, mode=0o700, exist_ok=True)
+            ruta = os.path.join(self.directorio_derrame, f"sesion_{self.id}.pkl")
+            temporal = ruta + '.tmp'
+            # Solo legible por el usuario del proceso, sin depender de la umask
+            with os.fdopen(os.open(temporal, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as archivo:
+                self._df.to_pickle(archivo, protocol=5)
+            os.replace(temporal, ruta)
+            # El archivo se borra al recargar o cuando la sesión desaparece
+            self._archivo = weakref.finalize(self, _borrar_archivo, ruta)
+            self._ruta_derrame = ruta
+            self._df = None
+            self._bytes_df = 0
+            self._caches.clear()
+            self._bytes_caches.clear()
+            self.derrames += 1
+            return liberados
+
+class GestorMemoria:
+    """Registro de las sesiones del proceso con presupuestos por sesión y global"""
+    
+    def __init__(self, presupuesto_sesion=None, presupuesto_global=None, inactividad=None, directorio=None):
+        self.presupuesto_sesion = presupuesto_sesion
+        self.presupuesto_global = presupuesto_global
+        self.inactividad = inactividad
+        if directorio is None:
+            # Carpeta propia del proceso (mkdtemp la crea con permisos 0o700), borrada al terminar
+            directorio = tempfile.mkdtemp(prefix='finanzas_sesiones_')
+            weakref.finalize(self, shutil.rmtree, directorio, ignore_errors=True)
+        self.directorio = directorio
+        self._sesiones = weakref.WeakValueDictionary()
+        self._compartidas = []
+        self._lock = threading.Lock()
+    
+    @classmethod
+    def desde_entorno(cls):
+        inactividad = float(os.environ.get('FINANZAS_INACTIVIDAD_S') or INACTIVIDAD_POR_DEFECTO_S)
+        return cls(
+            presupuesto_sesion=_mb_entorno('FINANZAS_PRESUPUESTO_SESION_MB'),
+            presupuesto_global=_mb_entorno('FINANZAS_PRESUPUESTO_GLOBAL_MB'),
+            inactividad=inactividad if inactividad > 0 else None,
+            directorio=os.environ.get('FINANZAS_DERRAME_DIR')
+        )
+    
+    def nueva_sesion(self):
+        datos = DatosSesion(self.directorio)
+        with self._lock:
+            self._sesiones[datos.id] = datos
+        return datos
+    
+    def registrar_compartida(self, cache):
+        """Registrar una caché compartida (con atributo bytes y método liberar(objetivo_bytes))"""
+        with self._lock:
+            self._compartidas.append(cache)
+    
+    def sesiones(self):
+        with self._lock:
+            return list(self._sesiones.values())
+    
+    def bytes_compartidos(self):
+        with self._lock:
+            return sum(cache.bytes for cache in self._compartidas)
+    
+    def total_bytes(self):
+        return sum(datos.bytes for datos in self.sesiones()) + self.bytes_compartidos()
+    
+    def cabe_en_sesion(self, *partes):
+        """Indicar si los DataFrames (juntos, p. ej. el actual y las filas a anexar) respetan el presupuesto por sesión"""
+        return self.presupuesto_sesion is None or sum(memoria_objeto(df) for df in partes) <= self.presupuesto_sesion
+    
+    def equilibrar(self, actual):
+        """
+        Aplicar los presupuestos después de una ejecución de la sesión actual
+        Libera cachés de la sesión si supera su presupuesto, derrama las
+        sesiones inactivas y, si el proceso sigue por encima del presupuesto
+        global, vacía las cachés compartidas y después derrama las sesiones
+        menos usadas recientemente. Devuelve los bytes liberados
+        """
+        if self.presupuesto_sesion is not None and actual.bytes > self.presupuesto_sesion:
+            actual.liberar_caches(self.presupuesto_sesion)
+        
+        ahora = time.monotonic()
+        otras = sorted(
+            (datos for datos in self.sesiones() if datos is not actual and not datos.derramada),
+            key=lambda datos: datos.ultimo_acceso
+        )
+        liberados = 0
+        if self.inactividad is not None:
+            for datos in otras:
+                if ahora - datos.ultimo_acceso >= self.inactividad:
+                    liberados += datos.derramar()
+        
+        if self.presupuesto_global is not None:
+            total = self.total_bytes()
+            # Primero las cachés compartidas: se pueden recalcular y, mientras
+            # retienen un DataFrame, derramar la sesión que lo usa no libera nada
+            with self._lock:
+                compartidas = list(self._compartidas)
+            for cache in compartidas:
+                if total <= self.presupuesto_global:
+                    break
+                liberado = cache.liberar(max(cache.bytes - (total - self.presupuesto_global), 0))
+                liberados += liberado
+                total -= liberado
+            for datos in otras:
+                if total <= self.presupuesto_global:
+                    break
+                if datos.derramada or ahora - datos.ultimo_acceso < INACTIVIDAD_MINIMA_S:
+                    continue
+                liberado = datos.derramar()
+                liberados += liberado
+                total -= liberado
+        return liberados
+    
+    def resumen(self):
+        """Totales del proceso para mostrar en la app"""
+        sesiones = self.sesiones()
+        return {
+            'sesiones': len(sesiones),
+            'derramadas': sum(datos.derramada for datos in sesiones),
+            'bytes': sum(datos.bytes for datos in sesiones) + self.bytes_compartidos(),
+            'bytes_compartidos': self.bytes_compartidos(),
+            'presupuesto_sesion': self.presupuesto_sesion,
+            'presupuesto_global': self.presupuesto_global
+        }
@@ -0,0 +1,49 @@
+import os
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from finanzas.almacen import (
+    anexar_almacen,
+    borrar_almacen,
+    cargar_almacen,
+    directorio_usuario,
+    escribir_almacen,
+)
+
+def _transacciones(fechas, categorias):
+    return pd.DataFrame({
+        'Fecha': pd.to_datetime(fechas),
+        'Categoria': pd.Categorical(categorias),
+        'Tipo': pd.Categorical(['Gasto'] * len(fechas)),
+        'Monto': [-1.0] * len(fechas)
+    })
+
+def test_anexar_mes_con_muchas_categorias(tmp_path):
+    escribir_almacen(_transacciones(['2024-01-05', '2024-02-05'], ['Comida', 'Ocio']), str(tmp_path))
+    
+    # Más de 127 categorías: pandas usaría índices int16 en lugar de int8
+    categorias = [f"Categoria {i}" for i in range(300)]
+    anexar_almacen(_transacciones(['2024-03-10'] * 300, categorias), str(tmp_path))
+    
+    df = cargar_almacen(str(tmp_path))
+    assert len(df) == 302
+    assert set(df['Categoria'].cat.categories) == set(categorias) | {'Comida', 'Ocio'}
+    
+    # El mes con muchas categorías también acepta más filas
+    anexar_almacen(_transacciones(['2024-03-11'], ['Comida']), str(tmp_path))
+    assert len(cargar_almacen(str(tmp_path))) == 303
+
+def test_almacen_por_usuario(tmp_path):
+    ana = directorio_usuario('usuario:ana@example.com', str(tmp_path))
+    otro = directorio_usuario('clave:../../etc', str(tmp_path))
+    assert ana != otro
+    assert all(os.path.dirname(ruta) == str(tmp_path) for ruta in (ana, otro))
+    
+    escribir_almacen(_transacciones(['2024-01-05'], ['Comida']), ana)
+    escribir_almacen(_transacciones(['2024-01-06', '2024-02-06'], ['Ocio', 'Ocio']), otro)
+    borrar_almacen(otro)
+    assert cargar_almacen(otro).empty
+    assert len(cargar_almacen(ana)) == 1
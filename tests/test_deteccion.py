@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+
+from finanzas.deteccion import detectar_anomalias, detectar_recurrentes
+from finanzas.ingesta import normalizar_tipos_transacciones
+
+def _transacciones(montos):
+    return normalizar_tipos_transacciones(pd.DataFrame({
+        'Fecha': pd.date_range('2024-01-01', periods=len(montos), freq='7D'),
+        'Categoria': ['Suscripciones'] * len(montos),
+        'Tipo': ['Gasto'] * len(montos),
+        'Monto': montos
+    }))
+
+def test_recurrentes_con_montos_en_cero():
+    resultado = detectar_recurrentes(_transacciones([0.0] * 10))
+    assert resultado.empty
+    assert 'Periodicidad' in resultado.columns
+
+def test_anomalias_con_montos_en_cero():
+    assert detectar_anomalias(_transacciones([0.0] * 10)).empty
+
+def test_recurrente_semanal():
+    resultado = detectar_recurrentes(_transacciones(np.full(12, -9.99)))
+    assert len(resultado) == 1
+    assert resultado.loc[0, 'Periodicidad'] == 'Semanal'
+    assert resultado.loc[0, 'Repeticiones'] == 12
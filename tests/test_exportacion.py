@@ -0,0 +1,30 @@
+import io
+
+import pandas as pd
+import pytest
+
+from finanzas.exportacion import FORMATOS_EXPORTACION, exportar_historico_csv, exportar_historico_parquet
+from finanzas.ingesta import COLUMNAS_REQUERIDAS
+from finanzas.metas import agregar_meta, tabla_metas
+
+@pytest.fixture
+def solo_metas():
+    return pd.DataFrame(), agregar_meta(tabla_metas(), 'Vacaciones', 1500.0, '2030-01-01')
+
+def test_csv_solo_metas(solo_metas):
+    df, metas = solo_metas
+    leido = pd.read_csv(io.BytesIO(exportar_historico_csv(df, metas)), encoding='utf-8-sig')
+    assert list(leido.columns) == COLUMNAS_REQUERIDAS
+    assert leido.empty
+
+def test_parquet_solo_metas(solo_metas):
+    pytest.importorskip('pyarrow')
+    df, metas = solo_metas
+    leido = pd.read_parquet(io.BytesIO(exportar_historico_parquet(df, metas)))
+    assert list(leido.columns) == COLUMNAS_REQUERIDAS
+    assert leido.empty
+
+def test_todos_los_formatos_solo_metas(solo_metas):
+    df, metas = solo_metas
+    for generar, _, _ in FORMATOS_EXPORTACION.values():
+        assert generar(df, metas)
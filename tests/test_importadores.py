@@ -0,0 +1,47 @@
+import pytest
+
+from finanzas import importadores
+from finanzas.categorizacion import Categorizador
+from finanzas.importadores import importar_transacciones
+
+def importar(texto):
+    return importar_transacciones(texto.encode('utf-8'), 'movimientos.csv', categorizador=Categorizador([]))
+
+def test_montos_con_separador_de_miles():
+    reporte = importar(
+        'Fecha,Categoria,Tipo,Monto\n'
+        '15/01/2024,Vivienda,Gasto,"-1,234.56"\n'
+        '16/01/2024,Sueldo,Ingreso,"2,500.00"\n'
+    )
+    assert reporte['filas'] == 2
+    assert reporte['transacciones']['Monto'].tolist() == [-1234.56, 2500.0]
+    assert reporte['montos_omitidos'] == 0
+
+def test_montos_invalidos_se_informan():
+    reporte = importar(
+        'Fecha,Categoria,Tipo,Monto\n'
+        '15/01/2024,Vivienda,Gasto,-50\n'
+        '16/01/2024,Ocio,Gasto,"1,5"\n'
+        '17/01/2024,Ocio,Gasto,abc\n'
+    )
+    assert reporte['filas'] == 1
+    assert reporte['montos_omitidos'] == 2
+    assert reporte['montos_problematicos'] == ['Fila 3: 1,5', 'Fila 4: abc']
+
+@pytest.mark.parametrize('pyarrow', [True, False])
+def test_filas_malformadas_se_informan(monkeypatch, pyarrow):
+    if pyarrow:
+        pytest.importorskip('pyarrow')
+    monkeypatch.setattr(importadores, 'PYARROW_DISPONIBLE', pyarrow)
+    reporte = importar(
+        'Fecha,Categoria,Tipo,Monto\n'
+        '15/01/2024,Vivienda,Gasto,-50\n'
+        '16/01/2024,Ocio,Gasto,-5,sobra\n'
+        '17/01/2024,Ocio,Gasto,-7\n'
+        '32/01/2024,Ocio,Gasto,-9\n'
+    )
+    assert reporte['filas'] == 2
+    assert reporte['filas_malformadas'] == 1
+    assert reporte['filas_problematicas'] == ['Fila 3: 5 columnas en lugar de 4']
+    # Las filas siguientes conservan su número de fila del archivo
+    assert reporte['fechas_problematicas'] == ['Fila 5: 32/01/2024']
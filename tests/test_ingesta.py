@@ -0,0 +1,29 @@
+import pandas as pd
+
+from finanzas.categorizacion import unificar_categorias
+from finanzas.ingesta import concatenar_transacciones, filtrar_transacciones_nuevas, normalizar_tipos_transacciones
+
+def _transacciones(categoria, filas):
+    return normalizar_tipos_transacciones(pd.DataFrame({
+        'Fecha': pd.date_range('2024-01-01', periods=filas),
+        'Categoria': [categoria] * filas,
+        'Tipo': ['Gasto'] * filas,
+        'Monto': [-10.0] * filas
+    }))
+
+def test_resubir_archivo_tras_unificar_categorias():
+    archivo_a = _transacciones('Alimentación', 3)
+    archivo_b = _transacciones('Alimentacion', 5).assign(Monto=-20.0)
+    sesion = concatenar_transacciones([archivo_a, archivo_b])
+    # "Alimentacion" es la grafía más frecuente: las filas de A cambian de nombre
+    sesion['Categoria'] = unificar_categorias(sesion['Categoria'])
+    assert set(sesion['Categoria']) == {'Alimentacion'}
+    
+    nuevas, duplicadas = filtrar_transacciones_nuevas(sesion, archivo_a)
+    assert nuevas.empty
+    assert duplicadas == 3
+
+def test_filas_distintas_no_son_duplicadas():
+    nuevas, duplicadas = filtrar_transacciones_nuevas(_transacciones('Ocio', 2), _transacciones('Comida', 2))
+    assert len(nuevas) == 2
+    assert duplicadas == 0
@@ -0,0 +1,33 @@
+import pandas as pd
+
+from finanzas.ingesta import normalizar_tipos_transacciones
+from finanzas.lote import combinar_resultados, main
+
+def _resultado(categoria):
+    return {
+        'transacciones': normalizar_tipos_transacciones(pd.DataFrame({
+            'Fecha': pd.to_datetime(['2024-01-15']),
+            'Categoria': [categoria],
+            'Tipo': ['Gasto'],
+            'Monto': [-42.5]
+        })),
+        'metas': [], 'nuevas': 1, 'historicas': 0, 'omitidas': 0, 'fechas_problematicas': [],
+        'montos_omitidos': 0, 'montos_problematicos': [], 'filas_malformadas': 0, 'filas_problematicas': [],
+        'formato_anterior': False
+    }
+
+def test_misma_transaccion_con_otra_grafia_entre_archivos():
+    combinado = combinar_resultados([
+        ('enero.xlsx', _resultado('Alimentación'), None),
+        ('enero.csv', _resultado('alimentacion '), None)
+    ])
+    assert len(combinado['transacciones']) == 1
+    assert combinado['duplicadas_entre_archivos'] == 1
+
+def test_linea_de_comandos_con_salida(tmp_path, capsys):
+    (tmp_path / 'enero.csv').write_text('Fecha,Categoria,Tipo,Monto\n15/01/2024,Ocio,Gasto,-42.5\n', encoding='utf-8')
+    salida = tmp_path / 'historico.csv'
+    # --salida es un alias de --exportar
+    assert main([str(tmp_path), '--salida', str(salida), '--procesos', '1']) == 0
+    assert 'Transacciones: 1' in capsys.readouterr().out
+    assert len(pd.read_csv(salida, encoding='utf-8-sig')) == 1
@@ -0,0 +1,75 @@
+import os
+import stat
+
+import numpy as np
+import pandas as pd
+
+from finanzas.sesiones import GestorMemoria, memoria_objeto
+
+def permisos(ruta):
+    return stat.S_IMODE(os.stat(ruta).st_mode)
+
+def test_derrame_solo_accesible_por_el_usuario():
+    gestor = GestorMemoria()
+    datos = gestor.nueva_sesion()
+    df = pd.DataFrame({'Monto': [1.0, -2.5]})
+    datos.establecer(df)
+    
+    anterior = os.umask(0o022)
+    try:
+        assert datos.derramar() > 0
+    finally:
+        os.umask(anterior)
+    assert permisos(gestor.directorio) == 0o700
+    ruta = os.path.join(gestor.directorio, f"sesion_{datos.id}.pkl")
+    assert permisos(ruta) == 0o600
+    
+    pd.testing.assert_frame_equal(datos.transacciones(), df)
+    assert not os.path.exists(ruta)
+
+def test_directorio_configurado(tmp_path):
+    directorio = tmp_path / 'derrame'
+    datos = GestorMemoria(directorio=str(directorio)).nueva_sesion()
+    datos.establecer(pd.DataFrame({'Monto': [3.0]}))
+    datos.derramar()
+    assert permisos(directorio) == 0o700
+    assert permisos(directorio / f"sesion_{datos.id}.pkl") == 0o600
+
+def test_presupuesto_con_las_filas_a_anexar():
+    existente = pd.DataFrame({'Monto': np.zeros(1000)})
+    nuevas = pd.DataFrame({'Monto': np.zeros(1000)})
+    gestor = GestorMemoria(presupuesto_sesion=memoria_objeto(existente) * 1.5)
+    assert gestor.cabe_en_sesion(nuevas)
+    assert not gestor.cabe_en_sesion(existente, nuevas)
+
+class CacheCompartida:
+    def __init__(self, df):
+        self.df = df
+    
+    @property
+    def bytes(self):
+        return memoria_objeto(self.df)
+    
+    def liberar(self, objetivo_bytes):
+        liberados = self.bytes if self.bytes > objetivo_bytes else 0
+        if liberados:
+            self.df = None
+        return liberados
+
+def test_cache_compartida_cuenta_y_se_vacia_antes_de_derramar():
+    df = pd.DataFrame({'Monto': np.zeros(10_000)})
+    gestor = GestorMemoria(presupuesto_global=memoria_objeto(df) * 1.5)
+    cache = CacheCompartida(df)
+    gestor.registrar_compartida(cache)
+    
+    # La sesión inactiva comparte el DataFrame de la caché
+    inactiva = gestor.nueva_sesion()
+    inactiva.establecer(df)
+    inactiva.ultimo_acceso -= 3600
+    actual = gestor.nueva_sesion()
+    assert gestor.total_bytes() == 2 * memoria_objeto(df)
+    
+    gestor.equilibrar(actual)
+    assert cache.df is None
+    assert not inactiva.derramada
+    assert gestor.total_bytes() <= gestor.presupuesto_global